@@ -0,0 +1,536 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import timing
+
+# 인덱서 처리량 benchmark
+#   합성 corpus 생성 -> initial_scan_path (scan) -> watchdog 이벤트 (modify/create/delete)
+#   로컬 stand-in 서버에 올리고 files/s, chunks/s, bytes/s, 단계별 시간, peak RSS를 JSON으로 저장
+#
+#   python indexer/bench.py --files 2000 --embed fake --out bench.json
+#
+# 단계별 시간은 여러 스레드/워커 프로세스에서 쓴 시간의 합이라 wall clock보다 클 수 있음
+
+DEFAULT_MIX = "txt=40,log=20,code=30,docx=5,pdf=5"
+EXTENSIONS = {"txt": ".txt", "log": ".log", "code": ".py", "docx": ".docx", "pdf": ".pdf"}
+FAKE_DIM = 384
+
+WORDS = (
+    "index vector chunk file path server client embedding query search version diff cache "
+    "batch upload scan watch event queue worker thread process memory disk state hash token "
+    "model score result payload collection point filter range order limit offset page group "
+    "report quarterly revenue customer contract meeting schedule budget review project team "
+    "파일 인덱스 검색 버전 변경 요약 서버 클라이언트 임베딩 캐시 작업 처리 결과 문서 회의"
+).split()
+
+# ----- 합성 corpus -----
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + "."
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(3, 8)))
+
+def fill(rng: random.Random, size: int, make) -> str:
+    parts = []
+    total = 0
+    while total < size:
+        part = make(rng)
+        parts.append(part)
+        total += len(part.encode("utf-8")) + 1
+    return "\n".join(parts)
+
+def log_line(rng: random.Random) -> str:
+    level = rng.choice(["INFO", "INFO", "INFO", "WARN", "ERROR", "DEBUG"])
+    ts = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+    return f"{ts} {level} [{rng.choice(WORDS)}] {sentence(rng)} id={rng.randint(1, 10**6)}"
+
+def code_block(rng: random.Random) -> str:
+    name = "_".join(rng.choice(WORDS[:40]) for _ in range(2))
+    args = ", ".join(rng.sample(WORDS[:40], rng.randint(1, 3)))
+    body = "\n".join(
+        f"    {rng.choice(WORDS[:40])} = {rng.choice(WORDS[:40])}({rng.randint(0, 100)})"
+        for _ in range(rng.randint(3, 12))
+    )
+    return f"def {name}({args}):\n    \"\"\"{sentence(rng)}\"\"\"\n{body}\n    return {rng.choice(WORDS[:40])}\n"
+
+def write_docx(path: str, rng: random.Random, size: int):
+    from docx import Document
+
+    doc = Document()
+    total = 0
+    while total < size:
+        text = paragraph(rng)
+        doc.add_paragraph(text)
+        total += len(text.encode("utf-8"))
+    doc.save(path)
+
+def pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, rng: random.Random, size: int, lines_per_page: int = 40):
+    """
+        reportlab 없이 직접 쓰는 최소 text PDF (Helvetica는 ASCII만이라 영어 단어만)
+    """
+    words = [w for w in WORDS if w.isascii()]
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(8, 14)))
+        lines.append(line)
+        total += len(line) + 1
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        ops += [f"({pdf_escape(line)}) '" for line in page]
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+def write_file(path: str, kind: str, rng: random.Random, size: int):
+    if kind == "docx":
+        write_docx(path, rng, size)
+    elif kind == "pdf":
+        write_pdf(path, rng, size)
+    else:
+        make = {"txt": paragraph, "log": log_line, "code": code_block}[kind]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(fill(rng, size, make))
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in EXTENSIONS:
+            raise ValueError(f"unknown file kind: {kind} (one of {', '.join(EXTENSIONS)})")
+        weights[kind] = int(weight or 1)
+    return weights
+
+def make_dirs(root: str, depth: int, width: int) -> list[str]:
+    """
+        width개씩 depth 단계로 갈라지는 디렉터리 트리 (root 포함 모든 디렉터리 반환)
+    """
+    dirs = [root]
+    level = [root]
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for w in range(width):
+                path = os.path.join(parent, f"d{d}_{w}")
+                os.makedirs(path, exist_ok=True)
+                next_level.append(path)
+        dirs.extend(next_level)
+        level = next_level
+    return dirs
+
+def generate_corpus(root: str, files: int, mix: dict[str, int], depth: int, width: int,
+                    size_kb: float, seed: int) -> dict:
+    """
+        seed가 같으면 같은 트리/내용 (docx/pdf 메타데이터 시간은 제외)
+        파일 크기는 size_kb의 0.5~1.5배
+    """
+    rng = random.Random(seed)
+    dirs = make_dirs(root, depth, width)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+
+    stats = {"files": 0, "bytes": 0, "dirs": len(dirs), "by_kind": {k: 0 for k in kinds}}
+    for i in range(files):
+        kind = rng.choices(kinds, weights)[0]
+        size = int(size_kb * 1024 * rng.uniform(0.5, 1.5))
+        path = os.path.join(rng.choice(dirs), f"f{i:06d}{EXTENSIONS[kind]}")
+        write_file(path, kind, rng, size)
+
+        stats["files"] += 1
+        stats["bytes"] += os.path.getsize(path)
+        stats["by_kind"][kind] += 1
+    return stats
+
+def corpus_files(root: str) -> list[str]:
+    return sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+    )
+
+# ----- stand-in 서버 -----
+
+def fake_vector(text: str, dim: int = FAKE_DIM) -> list[float]:
+    # 내용 hash로 만드는 결정적 단위 벡터 (모델 없이 파이프라인만 잴 때)
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+class FakeModel:
+    """SentenceTransformer.encode 대신 (embed=fake)"""
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        import numpy as np
+        return np.asarray([fake_vector(t) for t in texts], dtype=np.float32)
+
+class StandInServer:
+    """
+        인덱서가 부르는 API만 흉내내는 로컬 HTTP 서버
+        요청 수 / 받은 bytes / upsert된 point 수만 세고 저장은 하지 않음
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # keep-alive에서 작은 응답이 delayed ACK에 걸리지 않게
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                server.record(path, 0, 0)
+                if path == "/api/watch-paths":
+                    self._reply([])
+                else:
+                    self._reply({"status": "ok"})
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                body = json.loads(raw) if raw else {}
+
+                points = 0
+                if path == "/api/chunks/upsert-batch":
+                    points = len(body.get("points", []))
+                elif path == "/api/chunks/upsert":
+                    points = 1
+                server.record(path, length, points)
+
+                if path == "/api/embed":
+                    self._reply({"model": "fake", "vectors": [fake_vector(t) for t in body.get("texts", [])]})
+                else:
+                    self._reply({"ok": True})
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.bytes_in = 0
+            self.points = 0
+
+    def record(self, path: str, size: int, points: int):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bytes_in += size
+            self.points += points
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.requests), "bytes_in": self.bytes_in, "points": self.points}
+
+# ----- 측정 -----
+
+def peak_rss_mb() -> dict:
+    """
+        ru_maxrss (linux KB, macOS bytes)
+        children은 종료(wait)된 워커 프로세스 중 최대값
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {"self": None, "children": None}
+
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+def rates(elapsed: float, files: int, chunks: int, size: int) -> dict:
+    per_sec = (lambda n: n / elapsed) if elapsed > 0 else (lambda n: 0.0)
+    return {
+        "seconds": elapsed,
+        "files": files,
+        "chunks": chunks,
+        "bytes": size,
+        "files_per_sec": per_sec(files),
+        "chunks_per_sec": per_sec(chunks),
+        "bytes_per_sec": per_sec(size),
+    }
+
+def run_scan(main, server: StandInServer, corpus: str, corpus_stats: dict) -> dict:
+    timing.reset()
+    server.reset()
+
+    start = time.perf_counter()
+    main.initial_scan_path(corpus)
+    elapsed = time.perf_counter() - start
+
+    sent = server.snapshot()
+    result = rates(elapsed, corpus_stats["files"], sent["points"], corpus_stats["bytes"])
+    result["stages"] = timing.snapshot()
+    result["server"] = sent
+    return result
+
+def wait_idle(main, settle: float, timeout: float) -> float:
+    """
+        scheduler에 대기/실행 중인 작업이 settle 초 동안 없으면 idle
+        마지막으로 바빴던 시각 반환
+    """
+    scheduler = main.scheduler
+    deadline = time.monotonic() + timeout
+    last_busy = time.monotonic()
+    while time.monotonic() < deadline:
+        if scheduler.pending_count() or scheduler.running_count():
+            last_busy = time.monotonic()
+        elif time.monotonic() - last_busy >= settle:
+            return last_busy
+        time.sleep(0.02)
+    raise TimeoutError(f"indexer not idle after {timeout}s")
+
+def run_watch(main, server: StandInServer, corpus: str, rng: random.Random, mix: dict[str, int],
+              size_kb: float, modify: int, create: int, delete: int, timeout: float) -> dict:
+    """
+        watchdog observer를 붙이고 파일을 수정/생성/삭제한 뒤 scheduler가 빌 때까지 대기
+        시간에는 debounce (INDEX_DELAY / DELETE_DELAY) 대기가 포함됨
+    """
+    from watchdog.observers import Observer
+
+    existing = corpus_files(corpus)
+    targets = rng.sample(existing, min(len(existing), modify + delete))
+    to_modify, to_delete = targets[:modify], targets[modify:]
+    dirs = sorted({os.path.dirname(p) for p in existing}) or [corpus]
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+
+    observer = Observer()
+    observer.schedule(main.handler, corpus, recursive=True)
+    observer.start()
+    time.sleep(0.5)  # observer가 감시를 시작할 때까지
+
+    timing.reset()
+    server.reset()
+    touched = 0
+    try:
+        start = time.perf_counter()
+        for path in to_modify:
+            ext = os.path.splitext(path)[1]
+            if ext in (".docx", ".pdf"):
+                kind = "docx" if ext == ".docx" else "pdf"
+                write_file(path, kind, rng, int(size_kb * 1024))
+            else:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n" + fill(rng, int(size_kb * 256), paragraph))
+            touched += os.path.getsize(path)
+
+        for i in range(create):
+            kind = rng.choices(kinds, weights)[0]
+            path = os.path.join(rng.choice(dirs), f"new{i:06d}{EXTENSIONS[kind]}")
+            write_file(path, kind, rng, int(size_kb * 1024 * rng.uniform(0.5, 1.5)))
+            touched += os.path.getsize(path)
+
+        for path in to_delete:
+            os.remove(path)
+
+        mutated = time.perf_counter()
+        settle = max(main.INDEX_DELAY, main.DELETE_DELAY) + 0.5
+        last_busy = wait_idle(main, settle, timeout)
+        elapsed = time.perf_counter() - start - (time.monotonic() - last_busy)
+    finally:
+        observer.stop()
+        observer.join()
+
+    sent = server.snapshot()
+    result = rates(elapsed, modify + create + delete, sent["points"], touched)
+    result.update({
+        "modified": len(to_modify),
+        "created": create,
+        "deleted": len(to_delete),
+        "mutate_seconds": mutated - start,
+        "debounce_seconds": {"index": main.INDEX_DELAY, "delete": main.DELETE_DELAY},
+        "stages": timing.snapshot(),
+        "server": sent,
+    })
+    return result
+
+def setup_workdir(workdir: str, server_url: str, embed: str) -> dict:
+    """
+        workdir/indexer/config.json (repo 설정 + stand-in 서버 주소)
+        인덱서 모듈들이 cwd 기준으로 config / state db / 임베딩 캐시를 쓰므로 workdir로 chdir 해서 격리
+    """
+    repo_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+    with open(repo_config) as f:
+        config = json.load(f)
+
+    config["scan_paths"] = []
+    config["server_url"] = server_url
+    config["embed_mode"] = "server" if embed == "server" else "local"
+
+    os.makedirs(os.path.join(workdir, "indexer"), exist_ok=True)
+    with open(os.path.join(workdir, "indexer", "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+def print_summary(name: str, result: dict):
+    print(
+        f"{name:>5}: {result['seconds']:7.2f}s  {result['files_per_sec']:8.1f} files/s  "
+        f"{result['chunks_per_sec']:8.1f} chunks/s  {result['bytes_per_sec'] / 1024 / 1024:6.2f} MB/s",
+        flush=True
+    )
+    for stage, entry in sorted(result["stages"].items()):
+        print(f"       {stage:>8} {entry['seconds']:8.3f}s  x{entry['count']}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="indexer throughput benchmark (repo root에서 실행)")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="종류=비율 (txt, log, code, docx, pdf)")
+    parser.add_argument("--depth", type=int, default=3, help="디렉터리 깊이")
+    parser.add_argument("--width", type=int, default=4, help="디렉터리당 하위 디렉터리 수")
+    parser.add_argument("--size-kb", type=float, default=8, help="평균 파일 크기")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed", choices=["fake", "local", "server"], default="fake",
+                        help="fake: hash 벡터 (모델 없음) / local: embed_backend 모델 / server: stand-in /api/embed")
+    parser.add_argument("--modify", type=int, default=50, help="watch 단계에서 수정할 파일 수")
+    parser.add_argument("--create", type=int, default=50, help="watch 단계에서 만들 파일 수")
+    parser.add_argument("--delete", type=int, default=20, help="watch 단계에서 지울 파일 수")
+    parser.add_argument("--skip-watch", action="store_true")
+    parser.add_argument("--watch-timeout", type=float, default=300)
+    parser.add_argument("--workdir", help="corpus / state / 캐시 위치 (없으면 임시 디렉터리, 끝나면 삭제)")
+    parser.add_argument("--out", default="bench.json")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    mix = parse_mix(args.mix)
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="indexer-bench-")
+    corpus = os.path.join(workdir, "corpus")
+    if os.path.exists(corpus):
+        shutil.rmtree(corpus)
+    for name in (".local_index_state.db", ".embedding_cache.db"):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(os.path.join(workdir, name + suffix)):
+                os.remove(os.path.join(workdir, name + suffix))
+
+    server = StandInServer().start()
+    try:
+        config = setup_workdir(workdir, server.url, args.embed)
+
+        start = time.perf_counter()
+        corpus_stats = generate_corpus(corpus, args.files, mix, args.depth, args.width, args.size_kb, args.seed)
+        corpus_stats["generate_seconds"] = time.perf_counter() - start
+        print("corpus:", corpus_stats, flush=True)
+
+        os.chdir(workdir)
+        import main as indexer
+        import embedder
+        import pipeline
+
+        if args.embed == "fake":
+            embedder.model = FakeModel()
+
+        indexer.ensure_state_file()
+        indexer.wait_for_server()
+
+        scan = run_scan(indexer, server, corpus, corpus_stats)
+        print_summary("scan", scan)
+
+        watch = None
+        if not args.skip_watch:
+            watch = run_watch(
+                indexer, server, corpus, random.Random(args.seed + 1), mix, args.size_kb,
+                args.modify, args.create, args.delete, args.watch_timeout
+            )
+            print_summary("watch", watch)
+
+        # 워커 프로세스를 정리해야 RUSAGE_CHILDREN에 잡힘
+        if pipeline._process_pool is not None:
+            pipeline._process_pool.shutdown(wait=True)
+
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+            "config": {k: v for k, v in config.items() if k != "server_url"},
+            "corpus": corpus_stats,
+            "scan": scan,
+            "watch": watch,
+            "embed_cache": embedder.cache_stats(),
+            "peak_rss_mb": peak_rss_mb(),
+            "platform": {
+                "python": platform.python_version(),
+                "system": platform.system(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+            },
+        }
+    finally:
+        server.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print("peak RSS (MB):", report["peak_rss_mb"], flush=True)
+    print("saved:", out, flush=True)
+
+if __name__ == "__main__":
+    # scan process pool이 spawn으로 이 파일을 다시 import 하므로 main() 안에서만 실행
+    main()
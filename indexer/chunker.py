@@ -1,14 +1,237 @@
-def chunk_text(text: str, max_words=400):
-    words = text.split()
-    chunks, buf = [], []
+import json
+import os
+import re
+import zlib
+from typing import NamedTuple
 
-    for w in words:
-        buf.append(w)
-        if len(buf) >= max_words:
-            chunks.append(" ".join(buf))
-            buf = []
+import numpy as np
 
-    if buf:
-        chunks.append(" ".join(buf))
+from embed_runtime import model_dir
 
-    return chunks
+BASE_PATH = os.getcwd()
+
+with open(f"{BASE_PATH}/indexer/config.json") as f:
+    config = json.load(f)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+TOKENIZER_NAME = f"sentence-transformers/{MODEL_NAME}"
+
+# all-MiniLM-L6-v2는 256 word-piece에서 잘림 ([CLS], [SEP] 2개 제외)
+MAX_TOKENS = config.get("chunk_max_tokens", 254)
+MIN_TOKENS = config.get("chunk_min_tokens", 64)
+OVERLAP_TOKENS = config.get("chunk_overlap_tokens", 32)
+BOUNDARY_MOD = config.get("chunk_boundary_mod", 64)
+# tokenizer가 없을 때 공백 단어 하나를 word-piece 몇 개로 칠지 (보수적으로, 임베딩 때 잘리지 않게)
+FALLBACK_TOKENS_PER_WORD = 2
+
+_WORD_RE = re.compile(r"\S+")
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # 문서 전체 기준 char offset
+    end: int
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+def _tokenizer_file() -> str | None:
+    """
+        로컬에 있는 tokenizer.json (hub에 접속하지 않음)
+        .model_cache (onnx backend / ensure_tokenizer) -> huggingface hub 캐시 -> 예전 sentence-transformers 캐시
+    """
+    candidates = [os.path.join(model_dir(MODEL_NAME), "tokenizer.json")]
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        cached = try_to_load_from_cache(TOKENIZER_NAME, "tokenizer.json")
+        if isinstance(cached, str):
+            candidates.append(cached)
+    except Exception:
+        pass
+    st_home = os.environ.get(
+        "SENTENCE_TRANSFORMERS_HOME", os.path.join(os.path.expanduser("~"), ".cache", "torch", "sentence_transformers")
+    )
+    candidates.append(os.path.join(st_home, TOKENIZER_NAME.replace("/", "_"), "tokenizer.json"))
+    return next((p for p in candidates if os.path.exists(p)), None)
+
+def ensure_tokenizer():
+    """
+        indexer 시작할 때 (main 프로세스에서) 한 번: 로컬에 없으면 .model_cache로 받아둠
+        scan 워커는 get_tokenizer()로 로컬 파일만 읽으므로 프로세스마다 hub를 기다리지 않음
+    """
+    if _tokenizer_file() is not None:
+        return
+    try:
+        from huggingface_hub import hf_hub_download
+        hf_hub_download(TOKENIZER_NAME, "tokenizer.json", local_dir=model_dir(MODEL_NAME))
+    except Exception as e:
+        print("tokenizer download failed:", e, flush=True)
+
+def get_tokenizer():
+    """
+        모델과 같은 word-piece tokenizer (tokenizers 라이브러리, sentence_transformers 없이 로드)
+        로컬 tokenizer.json이 없으면 None -> 공백 단위 fallback (chunk 크기는 FALLBACK_TOKENS_PER_WORD로 줄임)
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        path = _tokenizer_file()
+        try:
+            if path is None:
+                raise FileNotFoundError(f"tokenizer.json for {TOKENIZER_NAME} (run ensure_tokenizer() once online)")
+            from tokenizers import Tokenizer
+            tok = Tokenizer.from_file(path)
+            tok.no_truncation()
+            tok.no_padding()
+            _tokenizer = tok
+        except Exception as e:
+            print(
+                f"WARNING tokenizer load failed, chunking by whitespace words "
+                f"(max {MAX_TOKENS // FALLBACK_TOKENS_PER_WORD} words per chunk; "
+                f"chunk ids change once the tokenizer is available): {e}",
+                flush=True
+            )
+    return _tokenizer
+
+def _encode(text: str):
+    """
+        (token id 배열, token 시작 char 배열, token 끝 char 배열)
+    """
+    tok = get_tokenizer()
+    if tok is not None:
+        enc = tok.encode(text, add_special_tokens=False)
+        offsets = np.asarray(enc.offsets, dtype=np.int64).reshape(-1, 2)
+        return np.asarray(enc.ids, dtype=np.uint64), offsets[:, 0], offsets[:, 1]
+
+    spans = [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+    ids = [zlib.crc32(text[s:e].encode("utf-8")) for s, e in spans]
+    offsets = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+    return np.asarray(ids, dtype=np.uint64), offsets[:, 0], offsets[:, 1]
+
+def _word_ends(starts, ends):
+    """
+        다음 token이 새 단어로 시작하는 token 위치 (word-piece 중간에서 자르지 않도록)
+    """
+    word_end = np.ones(len(starts), dtype=bool)
+    word_end[:-1] = starts[1:] > ends[:-1]
+    return word_end
+
+def _boundary_candidates(ids, word_end, boundary_mod):
+    """
+        content-defined 경계 후보 (vectorized)
+        직전 3개 token id의 hash가 boundary_mod로 나눠떨어지는 단어 끝 = 그 token 뒤에서 자를 수 있음
+    """
+    h = ids * np.uint64(0x9E3779B1)
+    h[1:] ^= ids[:-1] * np.uint64(0x85EBCA77)
+    h[2:] ^= ids[:-2] * np.uint64(0xC2B2AE3D)
+    h ^= h >> np.uint64(29)
+    return np.flatnonzero((h % np.uint64(boundary_mod) == 0) & word_end)
+
+def _cut(n, candidates, word_end_idx, core_start, final, max_core, min_tokens):
+    """
+        token [core_start, n) 을 chunk 구간으로 나눔
+        반환: ([(시작 token, 끝 token)], 아직 chunk가 안 된 부분의 시작 token)
+    """
+    spans = []
+    start = core_start
+
+    while start < n:
+        lo = start + min_tokens - 1
+        hi = start + max_core - 1
+
+        j = np.searchsorted(candidates, lo)
+        natural = int(candidates[j]) if j < len(candidates) else None
+
+        if natural is not None and natural <= hi:
+            cut = natural
+        elif hi < n:
+            # 경계 후보가 없으면 max 안쪽의 마지막 단어 끝에서 강제로 자름
+            k = np.searchsorted(word_end_idx, hi, side="right") - 1
+            cut = int(word_end_idx[k]) if k >= 0 and word_end_idx[k] >= start else hi
+        elif final:
+            cut = n - 1
+        else:
+            break  # 다음 segment가 와야 경계가 정해짐
+
+        spans.append((start, cut))
+        start = cut + 1
+
+    return spans, start
+
+def chunk_text(text: str):
+    return [c.text for c in stream_chunks([text])]
+
+def stream_chunks(
+    segments,
+    max_tokens=MAX_TOKENS,
+    min_tokens=MIN_TOKENS,
+    overlap=OVERLAP_TOKENS,
+    boundary_mod=BOUNDARY_MOD
+):
+    """
+        tokenizer 기반 content-defined chunking (streaming)
+
+        - chunk 크기는 모델 tokenizer 기준 (max_tokens를 넘지 않아서 임베딩 때 잘리는 부분이 없음)
+        - 경계는 token hash로 정해서 중간에 글자를 넣어도 그 근처 chunk만 바뀜
+        - 각 chunk 앞에 직전 chunk 끝 overlap 개 token을 붙임
+        - segment 단위로 tokenize 하고 chunk가 찰 때마다 yield (Chunk(text, start, end))
+    """
+    if get_tokenizer() is None:
+        # 공백 단어는 word-piece보다 적게 셈 -> 모델에서 잘리지 않도록 예산을 줄임
+        max_tokens //= FALLBACK_TOKENS_PER_WORD
+        min_tokens //= FALLBACK_TOKENS_PER_WORD
+        overlap //= FALLBACK_TOKENS_PER_WORD
+
+    overlap = min(overlap, max_tokens // 2)
+    max_core = max_tokens - overlap
+    min_tokens = min(min_tokens, max_core)
+
+    carry = ""      # 아직 chunk로 안 나간 텍스트 (앞에 overlap 문맥 포함)
+    carry_core = 0  # carry 안에서 core(새 내용)가 시작하는 char 위치
+    base = 0        # carry[0]의 문서 기준 char offset
+
+    segments = iter(segments)
+    segment = next(segments, None)
+
+    while segment is not None:
+        following = next(segments, None)
+        final = following is None
+
+        if carry and segment and not carry[-1].isspace() and not segment[0].isspace():
+            segment = "\n" + segment  # page/paragraph 경계에서 단어가 붙지 않게
+        text = carry + segment
+
+        ids, starts, ends = _encode(text)
+        n = len(ids)
+
+        core_start = int(np.searchsorted(starts, carry_core))
+        word_end = _word_ends(starts, ends)
+        word_end_idx = np.flatnonzero(word_end)
+        word_start_idx = word_end_idx + 1  # 단어 끝 다음 token = 단어 시작
+
+        def context_start(core):
+            # core 앞 overlap 개 token 범위 안에서 단어 시작 위치로 맞춤
+            if core <= 0:
+                return 0
+            k = np.searchsorted(word_start_idx, core - overlap)
+            first = int(word_start_idx[k]) if k < len(word_start_idx) else core
+            return 0 if core - overlap <= 0 else min(first, core)
+
+        candidates = _boundary_candidates(ids, word_end, boundary_mod)
+        spans, pending = _cut(n, candidates, word_end_idx, core_start, final, max_core, min_tokens)
+
+        for s, e in spans:
+            s = context_start(s)
+            yield Chunk(text[starts[s]:ends[e]], base + int(starts[s]), base + int(ends[e]))
+
+        # 다음 segment로 넘길 부분 (다음 chunk의 overlap 문맥 + 아직 안 끝난 core)
+        ctx = context_start(pending)
+        if ctx < n:
+            keep_from = int(starts[ctx])
+            carry_core = (int(starts[pending]) if pending < n else len(text)) - keep_from
+        else:
+            keep_from = len(text)
+            carry_core = 0
+
+        carry = text[keep_from:]
+        base += keep_from
+        segment = following
@@ -1,20 +1,34 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import os
 
+import metrics
+from timing import timed
+
 BASE_PATH = os.getcwd()
 
 with open(f"{BASE_PATH}/indexer/config.json") as f:
     config = json.load(f)
 
 SERVER_URL = config["server_url"]
+UPLOAD_BATCH_SIZE = config.get("upload_batch_size", 256)
+HTTP_POOL_SIZE = config.get("http_pool_size", 8)
+
+# keep-alive 커넥션을 재사용하는 공용 세션 (요청마다 TCP 연결 새로 안 맺도록)
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+CHUNKS_UPLOADED = metrics.counter("indexer_chunks_uploaded_total", "Chunks upserted to the server")
 
 def wait_for_server(url=f"{SERVER_URL}/api/health", timeout=10):
     start = time.time()
     while time.time() - start < timeout:
         try:
-            r = requests.get(url, timeout=1)
+            r = session.get(url, timeout=1)
             if r.status_code == 200:
                 print("API server is ready")
                 return True
@@ -27,47 +41,62 @@ def wait_for_server(url=f"{SERVER_URL}/api/health", timeout=10):
     raise RuntimeError("API server not ready")
 
 def fetch_watch_paths():
-    res = requests.get(f"{SERVER_URL}/api/watch-paths")
+    res = session.get(f"{SERVER_URL}/api/watch-paths")
     return res.json()
 
-def upload_file(path, summary, embedding, hash):
-    payload = {
-        "path": path,
-        "summary": summary,
-        "embedding": embedding,
-        "hash": hash
-    }
-
-    try:
-        res = requests.post(f"{SERVER_URL}/api/files/index", json=payload)
-        print("Uploaded:", path, res.status_code)
-    except Exception as e:
-        print("Upload failed:", path, "reason: ", e)
-
+@timed("upload")
 def delete_chunks(chunk_ids):
-    requests.post(
+    # 실패하면 raise -> state를 쓰지 않아서 다음에 다시 시도
+    res = session.post(
         f"{SERVER_URL}/api/delete",
-        json=chunk_ids
+        json=chunk_ids,
+        timeout=30
     )
+    res.raise_for_status()
 
-def upload_chunk(
-    chunk_id: str,
-    vector: list[float],
-    payload: dict
-):
-    res = requests.post(
-        f"{SERVER_URL}/api/chunks/upsert",
-        json={
-            "id": chunk_id,
-            "vector": vector,
-            "payload": payload
-        },
-        timeout=10
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """
+        서버 모델로 임베딩 (/api/embed)
+    """
+    res = session.post(
+        f"{SERVER_URL}/api/embed",
+        json={"texts": texts},
+        timeout=120
+    )
+    res.raise_for_status()
+    return res.json()["vectors"]
+
+@timed("upload")
+def update_file_vector(path: str):
+    """
+        chunk를 올리고/지운 뒤 서버에 파일 단위 벡터(chunk 평균) 재계산 요청
+    """
+    res = session.post(
+        f"{SERVER_URL}/api/files/vector",
+        json={"path": path},
+        timeout=30
     )
     res.raise_for_status()
 
+@timed("upload")
+def upload_chunks(points: list[dict], batch_size: int = UPLOAD_BATCH_SIZE):
+    """
+        chunk 여러 개를 batch upsert ({"id", "vector", "sparse", "payload"} 리스트)
+        batch 하나라도 실패하면 raise (호출한 쪽은 그 파일의 state를 쓰지 않음)
+    """
+    for i in range(0, len(points), batch_size):
+        batch = points[i:i + batch_size]
+        res = session.post(
+            f"{SERVER_URL}/api/chunks/upsert-batch",
+            json={"points": batch},
+            timeout=30
+        )
+        res.raise_for_status()
+        CHUNKS_UPLOADED.inc(len(batch))
+
+@timed("upload")
 def send_diff(path: str, old_text: str, new_text: str):
-    res = requests.post(
+    res = session.post(
         f"{SERVER_URL}/api/diff",
         json={
             "path": path,
@@ -89,6 +118,7 @@ def build_node(path: str):
         "modified": stat.st_mtime
     }
 
+@timed("upload")
 def send_file_change(path, status):
     payload = {
         "path": path,
@@ -99,12 +129,13 @@ def send_file_change(path, status):
     if status != "deleted":
         payload["node"] = build_node(path)
 
-    requests.post(
+    session.post(
         f"{SERVER_URL}/api/file-change",
         json=payload,
         timeout=5
     )
 
+@timed("upload")
 def save_file_change(path, version, diff, summary, vector, _hash, change_type):
     payload = {
         "path": path,
@@ -115,7 +146,7 @@ def save_file_change(path, version, diff, summary, vector, _hash, change_type):
         "hash": _hash,
         "change_type": change_type
     }
-    requests.post(
+    session.post(
         f"{SERVER_URL}/api/save-file-version",
         json=payload,
         timeout=5
@@ -0,0 +1,170 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_DB = ".embedding_cache.db"
+
+class EmbeddingCache:
+    """
+        (모델 이름, 텍스트 hash) -> 벡터 캐시
+        메모리 LRU 위에 SQLite(WAL) 디스크 저장소, indexer와 server가 같은 파일을 같이 씀
+
+        - memory_size: 메모리 LRU 항목 수
+        - max_entries: 디스크 항목 수 상한 (넘으면 오래 안 쓴 것부터 삭제)
+        - 메모리 LRU에는 float32 배열로 두고 (float list는 항목당 몇 배 큼) 돌려줄 때만 list로
+    """
+
+    def __init__(self, model_name: str, path: str = CACHE_DB,
+                 memory_size: int = 10_000, max_entries: int = 1_000_000):
+        self.model_name = model_name
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings(used)")
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: list[str]) -> list:
+        """
+            캐시에 없는 텍스트 자리는 None
+        """
+        keys = [self.key(t) for t in texts]
+        found = {}
+
+        with self._lock:
+            missing = []
+            for k in keys:
+                if k in self._memory:
+                    self._memory.move_to_end(k)
+                    found[k] = self._memory[k]
+                    self.memory_hits += 1
+                elif k not in found:
+                    missing.append(k)
+
+            if missing:
+                conn = self._connect()
+                missing = list(dict.fromkeys(missing))
+                for i in range(0, len(missing), 500):
+                    part = missing[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    for k, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[k] = vector
+                        self._remember(k, vector)
+
+                hit_keys = [k for k in missing if k in found]
+                self.disk_hits += len(hit_keys)
+                self.misses += len(missing) - len(hit_keys)
+
+                if hit_keys:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET used = ? WHERE key = ?",
+                        [(now, k) for k in hit_keys]
+                    )
+                    conn.commit()
+
+        return [found[k].tolist() if k in found else None for k in keys]
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]):
+        now = time.time()
+        rows = []
+
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                k = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(k, vector)
+                rows.append((k, vector.tobytes(), now))
+
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._disk_count += len(rows)
+
+            # 상한의 10% 정도 여유를 두고 한 번에 정리
+            if self._disk_count > self.max_entries:
+                self._disk_count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                overflow = self._disk_count - int(self.max_entries * 0.9)
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._disk_count -= overflow
+                    self.evictions += overflow
+            conn.commit()
+
+    def encode(self, texts: list[str], encode_fn) -> list[list[float]]:
+        """
+            캐시에 없는 텍스트만 (중복 제거해서) encode_fn 으로 임베딩
+        """
+        if not texts:
+            return []
+
+        vectors = self.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+
+        if missing:
+            computed = dict(zip(missing, encode_fn(missing)))
+            self.put_many(missing, [computed[t] for t in missing])
+            vectors = [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "model": self.model_name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "evictions": self.evictions,
+            }
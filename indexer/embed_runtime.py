@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+# 임베딩 추론 backend
+#   torch     : sentence_transformers (PyTorch)
+#   onnx      : onnxruntime + tokenizers (torch를 import 하지 않음)
+#   onnx-int8 : onnx 모델을 dynamic int8 양자화한 것
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "torch"
+
+MODEL_REPO = "sentence-transformers/{name}"
+MODEL_CACHE_DIR = ".model_cache"
+
+# onnx backend에 필요한 파일 (hub 모델 repo 기준 경로)
+ONNX_FILES = [
+    "onnx/model.onnx",
+    "tokenizer.json",
+    "modules.json",
+    "sentence_bert_config.json",
+    "1_Pooling/config.json",
+]
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """
+        임베딩 캐시 key에 쓰는 모델 이름 (backend마다 벡터가 조금씩 달라서 따로 캐시)
+        torch는 예전 캐시를 그대로 쓰도록 모델 이름만
+    """
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def model_dir(model_name: str, cache_dir: str = MODEL_CACHE_DIR) -> str:
+    return os.path.join(cache_dir, model_name)
+
+def ensure_onnx_model(model_name: str, cache_dir: str = MODEL_CACHE_DIR) -> str:
+    """
+        onnx 모델 파일을 cache_dir에 한 번만 받아둠
+        hub repo에 onnx가 없으면 sentence_transformers로 export (이때만 torch/optimum 필요)
+    """
+    target = model_dir(model_name, cache_dir)
+    if all(os.path.exists(os.path.join(target, f)) for f in ONNX_FILES):
+        return target
+
+    os.makedirs(target, exist_ok=True)
+    try:
+        from huggingface_hub import hf_hub_download
+        for f in ONNX_FILES:
+            hf_hub_download(MODEL_REPO.format(name=model_name), f, local_dir=target)
+    except Exception as e:
+        print("onnx download failed, exporting with sentence_transformers:", e, flush=True)
+        from sentence_transformers import SentenceTransformer
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(target)
+
+    return target
+
+def ensure_int8_model(model_dir_path: str) -> str:
+    """
+        onnx/model.onnx -> onnx/model_qint8.onnx (dynamic quantization, weight int8) 한 번만
+    """
+    source = os.path.join(model_dir_path, "onnx", "model.onnx")
+    target = os.path.join(model_dir_path, "onnx", "model_qint8.onnx")
+    if os.path.exists(target):
+        return target
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    tmp = target + ".tmp"
+    quantize_dynamic(source, tmp, weight_type=QuantType.QInt8)
+    os.replace(tmp, target)
+    return target
+
+class OnnxEncoder:
+    """
+        SentenceTransformer.encode 와 같은 모양으로 쓰는 onnxruntime encoder
+        tokenize -> onnx forward -> pooling (-> normalize), 설정은 모델 폴더의 sentence-transformers 파일을 따름
+    """
+
+    def __init__(self, model_dir_path: str, onnx_file: str, threads: int | None = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir_path, "sentence_bert_config.json")) as f:
+            self.max_length = json.load(f).get("max_seq_length", 256)
+        with open(os.path.join(model_dir_path, "1_Pooling", "config.json")) as f:
+            pooling = json.load(f)
+        with open(os.path.join(model_dir_path, "modules.json")) as f:
+            modules = json.load(f)
+
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _forward(self, texts: list[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in encoded], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encoded], dtype=np.int64)
+
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encoded], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            m = mask[..., None].astype(np.float32)
+            pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # 길이순으로 묶어서 padding 낭비를 줄이고 원래 순서로 되돌림
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = [None] * len(texts)
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            vectors = self._forward([texts[j] for j in idx])
+            for j, v in zip(idx, vectors):
+                out[j] = v
+
+        result = np.stack(out)
+        return result[0] if single else result
+
+def load_model(model_name: str, backend: str = DEFAULT_BACKEND, cache_dir: str = MODEL_CACHE_DIR,
+               threads: int | None = None):
+    """
+        backend에 맞는 encoder (모두 .encode(texts, batch_size=...) -> np.ndarray)
+    """
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown embed backend: {backend} (one of {', '.join(BACKENDS)})")
+
+    path = ensure_onnx_model(model_name, cache_dir)
+    onnx_file = os.path.join(path, "onnx", "model.onnx")
+    if backend == "onnx-int8":
+        onnx_file = ensure_int8_model(path)
+
+    return OnnxEncoder(path, onnx_file, threads=threads)
+
+# ----- parity / 속도 비교 -----
+
+SAMPLE_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "def get_embeddings(texts: list[str], batch_size: int = 64) -> list[list[float]]:",
+    "ERROR 2024-05-01 12:00:03 connection reset by peer (ECONNRESET) while uploading chunk",
+    "파일이 수정되면 바뀐 chunk만 다시 임베딩해서 서버에 올린다.",
+    "Quarterly revenue grew 12% year over year, driven by subscription renewals.",
+    "SELECT path, version FROM file_versions WHERE path = ? ORDER BY version DESC LIMIT 1",
+    "A watched directory can contain millions of files across nested folders.",
+    "import numpy as np\nscores = vectors @ query\ntop = np.argpartition(-scores, k)[:k]",
+]
+
+def _measure(model_name, backend, texts, batch_size, cache_dir, result_queue):
+    import resource
+
+    start = time.perf_counter()
+    model = load_model(model_name, backend, cache_dir)
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warmup
+    load_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    encode_sec = time.perf_counter() - start
+
+    # ru_maxrss: linux KB, macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+    result_queue.put({
+        "backend": backend,
+        "vectors": vectors,
+        "load_sec": load_sec,
+        "texts_per_sec": len(texts) / encode_sec if encode_sec else float("inf"),
+        "peak_rss_mb": rss_mb,
+    })
+
+def parity(model_name, backends, texts, batch_size=64, tolerance=0.99, cache_dir=MODEL_CACHE_DIR) -> bool:
+    """
+        backend마다 별도 프로세스에서 (RSS가 섞이지 않게) 같은 텍스트를 임베딩하고
+        첫 번째 backend 기준으로 텍스트별 cosine similarity 비교
+    """
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for backend in backends:
+        q = ctx.Queue()
+        p = ctx.Process(target=_measure, args=(model_name, backend, texts, batch_size, cache_dir, q))
+        p.start()
+        results.append(q.get())
+        p.join()
+
+    reference = results[0]["vectors"]
+    ok = True
+    for r in results:
+        a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        b = r["vectors"] / np.linalg.norm(r["vectors"], axis=1, keepdims=True)
+        cos = (a * b).sum(axis=1)
+        passed = bool(cos.min() >= tolerance)
+        ok = ok and passed
+        print(
+            f"{r['backend']:>10}  load {r['load_sec']:6.2f}s  {r['texts_per_sec']:8.1f} texts/s  "
+            f"peak RSS {r['peak_rss_mb']:7.1f} MB  cos min {cos.min():.4f} mean {cos.mean():.4f}  "
+            f"{'OK' if passed else 'FAIL'}",
+            flush=True
+        )
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding backend parity / throughput check")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="첫 번째가 기준 backend")
+    parser.add_argument("--texts", help="한 줄에 텍스트 하나인 파일 (없으면 내장 샘플)")
+    parser.add_argument("--repeat", type=int, default=64, help="샘플 텍스트 반복 횟수 (throughput 측정용)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--tolerance", type=float, default=0.99, help="기준 대비 최소 cosine similarity")
+    parser.add_argument("--cache-dir", default=MODEL_CACHE_DIR)
+    parser.add_argument("--clear-cache", action="store_true", help="cache-dir의 export/양자화 모델을 지우고 다시 만듦")
+    args = parser.parse_args()
+
+    if args.clear_cache:
+        shutil.rmtree(model_dir(args.model, args.cache_dir), ignore_errors=True)
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8", errors="ignore") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = [f"{t} ({i})" for i in range(args.repeat) for t in SAMPLE_TEXTS]
+
+    ok = parity(args.model, args.backends.split(","), texts, args.batch_size, args.tolerance, args.cache_dir)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,68 @@
-from sentence_transformers import SentenceTransformer
+import json
+import os
+import threading
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from embed_cache import EmbeddingCache
+from embed_runtime import load_model, cache_model_name
+from client import embed_texts
+from timing import timed
+
+BASE_PATH = os.getcwd()
+
+with open(f"{BASE_PATH}/indexer/config.json") as f:
+    config = json.load(f)
+
+EMBED_BATCH_SIZE = config.get("embed_batch_size", 64)
+MODEL_NAME = "all-MiniLM-L6-v2"
+# torch | onnx | onnx-int8 (indexer/embed_runtime.py)
+EMBED_BACKEND = config.get("embed_backend", "torch")
+# local: 이 프로세스에서 모델 로드 / server: 서버의 /api/embed 사용 (모델을 올리지 않음)
+EMBED_MODE = config.get("embed_mode", "local")
+
+cache = EmbeddingCache(
+    cache_model_name(MODEL_NAME, EMBED_BACKEND),
+    memory_size=config.get("embed_cache_memory_size", 10_000),
+    max_entries=config.get("embed_cache_max_entries", 1_000_000),
+)
+
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+        처음 쓸 때 로드 (scan용 process pool 워커가 main을 import 해도 모델은 안 올라가게)
+    """
+    global model
+    with _model_lock:
+        if model is None:
+            model = load_model(MODEL_NAME, EMBED_BACKEND)
+    return model
 
 def get_embedding(text):
-    return model.encode(text).tolist()
+    return get_embeddings([text])[0]
+
+@timed("embed")
+def get_embeddings(texts: list[str], batch_size: int = EMBED_BATCH_SIZE) -> list[list[float]]:
+    """
+        여러 텍스트를 한 번의 encode 호출로 임베딩 (batch_size 단위로 forward)
+        캐시에 있는 텍스트는 모델을 거치지 않음
+    """
+    if not texts:
+        return []
+
+    if EMBED_MODE == "server":
+        # 캐시는 서버 쪽 (.embedding_cache.db를 서버가 관리)
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(embed_texts(texts[i:i + batch_size]))
+        return vectors
+
+    return cache.encode(
+        texts,
+        lambda missing: get_model().encode(missing, batch_size=batch_size).tolist()
+    )
+
+def cache_stats() -> dict:
+    if EMBED_MODE == "server":
+        return {"mode": "server"}
+    return cache.stats()
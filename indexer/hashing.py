@@ -0,0 +1,30 @@
+import hashlib
+import mmap
+import os
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+def _new_hasher():
+    # xxhash가 있으면 xxh3 (훨씬 빠름), 없으면 blake2b (md5보다 빠르고 안전)
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+def file_hash(path):
+    h = _new_hasher()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()
+
+        # 파일 전체를 mmap으로 한 번에 hash (read 버퍼 복사 없음)
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+        except (OSError, ValueError):
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    return h.hexdigest()
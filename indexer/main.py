@@ -1,4 +1,3 @@
-import hashlib
 import json
 import os
 import time
@@ -11,33 +10,36 @@ with open(f"{BASE_PATH}/indexer/config.json") as f:
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
-from chunker import chunk_text
-from client import upload_chunk, delete_chunks, upload_file, send_diff, send_file_change, wait_for_server, \
-    fetch_watch_paths, save_file_change
-from embedder import get_embedding
-from text_extractor import extract_text
-from utils import load_state, save_state, update_state, handle_deleted_files, chunk_id_to_uuid, compute_diff, \
-    is_temp_file, ensure_state_file
+from client import upload_chunks, delete_chunks, send_diff, send_file_change, wait_for_server, \
+    fetch_watch_paths, save_file_change, update_file_vector
+from embedder import get_embeddings, cache_stats, EMBED_BATCH_SIZE
+from chunker import Chunk, stream_chunks, ensure_tokenizer
+from sparse import sparse_vector
+from hashing import file_hash
+from text_extractor import iter_text, is_supported
+from utils import handle_deleted_files, chunk_content_id, compute_diff, is_temp_file
+from state import ensure_state_file, get_state, get_fingerprint, state_fingerprints, update_state, touch_state, \
+    delete_state, state_paths, state_batch
+from pipeline import ScanPipeline, extract_file
 
 import threading
 
-DELETE_DELAY = 1.0  # seconds
-pending_deletes = {}
+from scheduler import EventScheduler
+import metrics
+import timing
 
-def cancel_pending_delete(path: str):
-    t = pending_deletes.pop(path, None)
-    if t:
-        t.cancel()
+DELETE_DELAY = 1.0  # seconds
+INDEX_DELAY = config.get("event_debounce_sec", 0.3)
+EVENT_WORKERS = config.get("event_workers", 4)
+# 계속 바뀌는 파일도 첫 이벤트부터 이 시간 안에는 인덱싱 (debounce 최대 대기)
+EVENT_MAX_DELAY = config.get("event_max_delay_sec", 5.0)
+# 로컬 Prometheus endpoint (http://127.0.0.1:<port>/metrics), 0이면 끔
+METRICS_PORT = config.get("metrics_port", 0)
 
 # SCAN_PATHS = config["scan_paths"]
 MAX_SIZE = config["max_file_size_mb"] * 1024 * 1024
-
-def file_hash(path):
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# 이보다 큰 파일은 전체 텍스트를 메모리에 올리지 않고 streaming으로 인덱싱 (diff 생략)
+STREAM_THRESHOLD = config.get("stream_threshold_mb", 2) * 1024 * 1024
 
 INFLIGHT = set()
 INFLIGHT_LOCK = threading.Lock()
@@ -62,11 +64,14 @@ def save_file_version(
     path: str,
     version: int,
     diff: list[str],
-    summary: str, # -> list[float]
+    summary: str,
     _hash: str,
-    change_type: str
+    change_type: str,
+    vector: list[float] = None
 ):
-    save_file_change(path, version, diff, summary, get_embedding(summary), _hash, change_type)
+    if vector is None:
+        vector = get_embeddings([summary])[0]
+    save_file_change(path, version, diff, summary, vector, _hash, change_type)
 
 def record_delete_version(path, prev_state):
     save_file_version(
@@ -78,122 +83,409 @@ def record_delete_version(path, prev_state):
         change_type="deleted"
     )
 
+def release_inflight(path: str):
+    with INFLIGHT_LOCK:
+        INFLIGHT.discard(path)
 
-def index_file(path, from_scan=False):
-    if is_temp_file(path):
-        return
-    
-    if not os.path.exists(path):
-        return
+def is_unchanged(stat, fingerprint) -> bool:
+    """
+        mtime/size/inode가 state와 같으면 파일을 읽지 않고 skip
+    """
+    if fingerprint is None:
+        return False
+
+    mtime, size, inode, _ = fingerprint
+    return (
+        mtime == stat.st_mtime
+        and size == stat.st_size
+        and (inode is None or inode == stat.st_ino)
+    )
+
+def claim_file(path, from_scan=False, fingerprints=None):
+    """
+        인덱싱 대상인지 확인하고 INFLIGHT에 등록
+        대상이면 (stat, 이전 hash) 반환, fingerprints는 scan 때 미리 로드한 state_fingerprints
+    """
+    if is_temp_file(path) or not is_supported(path):
+        return None
 
     try:
         stat = os.stat(path)
-    except FileNotFoundError:
-        return
-    
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
     if stat.st_size > MAX_SIZE:
-        return
+        return None
 
     if not from_scan:
         for scanning_path in SCANNING_PATHS:
             if path.startswith(scanning_path):
-                return
+                return None
+
+    if fingerprints is not None:
+        fingerprint = fingerprints.get(path)
+    else:
+        fingerprint = get_fingerprint(path)
+
+    if is_unchanged(stat, fingerprint):
+        return None
 
     with INFLIGHT_LOCK:
         if path in INFLIGHT:
-            return
+            return None
         INFLIGHT.add(path)
 
+    prev_hash = fingerprint[3] if fingerprint else None
+    return stat, prev_hash
+
+def build_job(path, stat, current_hash, text, chunks):
+    """
+        hash/extract/chunk 결과와 이전 state로 job 구성 (인덱싱할 게 없으면 INFLIGHT 해제 후 None)
+    """
     try:
-        current_hash = file_hash(path)
-        prev_state = load_state().get(path)
+        if current_hash is None:
+            # 지원하지 않는 확장자
+            release_inflight(path)
+            return None
+
+        prev_state = get_state(path)
 
-        is_new = prev_state is None # .local_index_state에서 가져옴
+        if prev_state is not None and prev_state["hash"] == current_hash:
+            # 내용 동일 (extract_file이 추출도 건너뜀) -> stat만 갱신
+            touch_state(path, stat)
+            release_inflight(path)
+            return None
+
+        # 빈 파일이라 fingerprint만 남겨둔 state (version 없음) -> 처음 내용이 생기면 added
+        is_new = prev_state is None or (not prev_state["chunks"] and "version" not in prev_state)
         is_modified = (
             prev_state is not None
             and prev_state["hash"] != current_hash
         )
 
-        old_text = prev_state.get("text") if prev_state else ""
-        text = extract_text(path)
+        # streaming으로 인덱싱된 파일은 state에 text가 없음 (None) -> 빈 텍스트 기준으로 diff
+        old_text = (prev_state.get("text") if prev_state else None) or ""
 
         if not text:
-            return
+            old_chunks = prev_state.get("chunks", []) if prev_state else []
+            if old_chunks:
+                # 인덱싱됐던 파일이 비었으면 예전 chunk도 서버에서 지움 (index_large_file과 같이)
+                delete_chunks(old_chunks)
+                update_file_vector(path)
+            # 빈 파일 / 추출 실패도 fingerprint를 남겨서 다음 scan에서 다시 읽지 않게
+            update_state(path, current_hash, [], stat, None)
+            release_inflight(path)
+            return None
+
+        if is_modified and text == old_text:
+            # 바이트는 바뀌었지만 추출 텍스트는 같음 (hash 알고리즘 변경, 메타데이터만 수정 등)
+            update_state(
+                path=path,
+                file_hash=current_hash,
+                chunk_ids=prev_state.get("chunks", []),
+                stat=stat,
+                text=text,
+            )
+            release_inflight(path)
+            return None
+
+        if is_new:
+            summary = "Initial version"
+        elif is_modified:
+            summary = summarize_diff(text)
+        else:
+            summary = None
+
+        job = {
+            "path": path,
+            "stat": stat,
+            "hash": current_hash,
+            "prev_state": prev_state,
+            "is_new": is_new,
+            "is_modified": is_modified,
+            "old_text": old_text,
+            "text": text,
+            "summary": summary,
+        }
+        job.update(plan_chunks(path, chunks, prev_state))
+        return job
+    except Exception:
+        release_inflight(path)
+        raise
+
+def prepare_index(path, from_scan=False):
+    """
+        임베딩 전 단계 (hash, extract, chunk)
+        인덱싱할 필요가 있으면 job dict를 반환하고, INFLIGHT는 finish 쪽에서 해제
+    """
+    claimed = claim_file(path, from_scan)
+    if claimed is None:
+        return None
 
-        chunks = chunk_text(text)
+    stat, prev_hash = claimed
+    if stat.st_size > STREAM_THRESHOLD:
+        index_large_file(path, stat, prev_hash)
+        return None
 
-        chunk_ids = []
+    try:
+        current_hash, text, chunks = extract_file(path, prev_hash)
+    except Exception:
+        release_inflight(path)
+        raise
 
-        for i, chunk in enumerate(chunks):
-            emb = get_embedding(chunk)
-            logical_id = f"{file_hash(path)}_{i}"
-            chunk_id = chunk_id_to_uuid(logical_id)
-            chunk_ids.append(chunk_id)
-
-            # ✅ 서버 API 호출
-            upload_chunk(
-                chunk_id=chunk_id,
-                vector=emb,
-                payload={
-                    "path": path,
-                    "chunk_index": i,
-                    "text": chunk[:300]
-                }
-            )
+    return build_job(path, stat, current_hash, text, chunks)
 
-        diff = compute_diff(old_text, text)
-        prev_version = prev_state.get("version", 0) if prev_state else 0
-        new_version = prev_version + 1
+def plan_chunks(path: str, chunks: list[Chunk], prev_state):
+    """
+        chunk ID는 (path, chunk 내용) hash 기반이라
+        이전 state에 없는 chunk만 임베딩/업로드하고, 사라진 chunk만 삭제하면 됨
+    """
+    known = set(prev_state.get("chunks", [])) if prev_state else set()
 
-        update_state(
+    chunk_ids = []
+    current = set()
+    new_chunks = []  # (chunk_id, chunk_index, chunk)
+
+    for i, chunk in enumerate(chunks):
+        chunk_id = chunk_content_id(path, chunk.text)
+        if chunk_id in current:
+            continue  # 같은 파일 안의 중복 chunk
+
+        chunk_ids.append(chunk_id)
+        current.add(chunk_id)
+        if chunk_id not in known:
+            new_chunks.append((chunk_id, i, chunk))
+
+    return {
+        "chunk_ids": chunk_ids,
+        "new_chunks": new_chunks,
+        "removed_chunks": [c for c in known if c not in current],
+    }
+
+def job_texts(job) -> list[str]:
+    """
+        job 하나에서 임베딩이 필요한 텍스트 (새 chunk들 + version summary)
+    """
+    texts = [chunk.text for _, _, chunk in job["new_chunks"]]
+    if job["summary"] is not None:
+        texts.append(job["summary"])
+    return texts
+
+def chunk_points(path: str, new_chunks, vectors):
+    # lexical vector에는 파일 이름도 넣어서 파일명 검색이 되게
+    name = os.path.basename(path)
+    return [
+        {
+            "id": chunk_id,
+            "vector": emb,
+            "sparse": sparse_vector(f"{name}\n{chunk.text}"),
+            "payload": {
+                "path": path,
+                "chunk_index": i,
+                "text": chunk.text[:300],
+                "start": chunk.start,
+                "end": chunk.end
+            }
+        }
+        for (chunk_id, i, chunk), emb in zip(new_chunks, vectors)
+    ]
+
+def finish_index(job, vectors: list[list[float]]):
+    """
+        임베딩 이후 단계 (upload, state 갱신, 버전 기록)
+    """
+    path = job["path"]
+    new_chunks = job["new_chunks"]
+    current_hash = job["hash"]
+    prev_state = job["prev_state"]
+    old_text = job["old_text"]
+    text = job["text"]
+
+    chunk_vectors = vectors[:len(new_chunks)]
+    summary_vector = vectors[len(new_chunks)] if job["summary"] is not None else None
+
+    # ✅ 서버 API 호출 (파일 단위 batch upsert, 바뀐 chunk만)
+    if new_chunks:
+        upload_chunks(chunk_points(path, new_chunks, chunk_vectors))
+
+    if job["removed_chunks"]:
+        delete_chunks(job["removed_chunks"])
+
+    if new_chunks or job["removed_chunks"]:
+        update_file_vector(path)
+
+    diff = compute_diff(old_text, text)
+    prev_version = prev_state.get("version", 0) if prev_state else 0
+    new_version = prev_version + 1
+
+    update_state(
+        path=path,
+        file_hash=current_hash,
+        chunk_ids=job["chunk_ids"],
+        stat=job["stat"],
+        text=text,
+        version=new_version,   # ⭐ 추가
+    )
+
+    if job["is_new"]:
+        send_file_change(path, "added")
+
+        save_file_version(
             path=path,
-            file_hash=current_hash,
-            chunk_ids=chunk_ids,
-            stat=stat,
-            text=text,
-            version=new_version,   # ⭐ 추가
+            version=new_version,
+            diff=diff,
+            summary=job["summary"],
+            _hash=current_hash,
+            change_type="added",
+            vector=summary_vector
         )
 
-        if is_new:
-            send_file_change(path, "added")
+    elif job["is_modified"]:
+        send_file_change(path, "modified")
 
+        if diff:
             save_file_version(
                 path=path,
                 version=new_version,
                 diff=diff,
-                summary="Initial version",
+                summary=job["summary"],
                 _hash=current_hash,
-                change_type="added"
+                change_type="modified",
+                vector=summary_vector
             )
 
-        elif is_modified:
-            send_file_change(path, "modified")
-
-            if diff:
-                summary = summarize_diff(text)
-
-                save_file_version(
-                    path=path,
-                    version=new_version,
-                    diff=diff,
-                    summary=summary,
-                    _hash=current_hash,
-                    change_type="modified"
-                )
-
-                send_diff(
-                    path=path,
-                    old_text=old_text or "",
-                    new_text=text
-                )
+            send_diff(
+                path=path,
+                old_text=old_text or "",
+                new_text=text
+            )
 
+def index_jobs(jobs):
+    """
+        여러 파일의 job을 모아서 한 번에 임베딩 (scan 시 파일 간 batching)
+    """
+    try:
+        texts = [t for job in jobs for t in job_texts(job)]
+        vectors = get_embeddings(texts)
+
+        offset = 0
+        for job in jobs:
+            n = len(job_texts(job))
+            finish_index(job, vectors[offset:offset + n])
+            offset += n
     finally:
-        with INFLIGHT_LOCK:
-            INFLIGHT.discard(path)
+        for job in jobs:
+            release_inflight(job["path"])
+
+def index_large_file(path, stat, prev_hash):
+    """
+        큰 파일: segment -> chunk -> 임베딩 -> 업로드를 EMBED_BATCH_SIZE 단위로 흘려보냄
+        텍스트 전체를 들고 있지 않으므로 state에 text를 저장하지 않고 diff도 만들지 않음
+    """
+    try:
+        with timing.stage("hash"):
+            current_hash = file_hash(path)
+        if current_hash == prev_hash:
+            touch_state(path, stat)
+            return
+
+        segments = iter_text(path)
+        if segments is None:
+            return
+
+        prev_state = get_state(path)
+        known = set(prev_state.get("chunks", [])) if prev_state else set()
+
+        chunk_ids = []
+        current = set()
+        batch = []  # (chunk_id, chunk_index, chunk)
+        new_count = 0
+
+        def flush():
+            vectors = get_embeddings([chunk.text for _, _, chunk in batch])
+            upload_chunks(chunk_points(path, batch, vectors))
+
+        try:
+            for i, chunk in enumerate(stream_chunks(segments)):
+                chunk_id = chunk_content_id(path, chunk.text)
+                if chunk_id in current:
+                    continue
+
+                chunk_ids.append(chunk_id)
+                current.add(chunk_id)
+                if chunk_id in known:
+                    continue
+
+                batch.append((chunk_id, i, chunk))
+                new_count += 1
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    flush()
+                    batch = []
+
+            if batch:
+                flush()
+        except Exception as e:
+            print("stream index failed:", path, e, flush=True)
+            return
+
+        if not chunk_ids:
+            # 파일이 비었으면 예전 chunk도 서버에서 지움, fingerprint는 남김
+            if known:
+                delete_chunks(list(known))
+                update_file_vector(path)
+            update_state(path, current_hash, [], stat, None)
+            return
+
+        removed = [c for c in known if c not in current]
+        if removed:
+            delete_chunks(removed)
+
+        if new_count or removed:
+            update_file_vector(path)
+
+        is_new = prev_state is None or (not known and "version" not in prev_state)
+        if not is_new and not new_count and not removed:
+            # 바이트만 바뀌고 chunk는 그대로
+            update_state(path, current_hash, chunk_ids, stat, None)
+            return
+
+        new_version = (prev_state.get("version", 0) if prev_state else 0) + 1
+        update_state(
+            path=path,
+            file_hash=current_hash,
+            chunk_ids=chunk_ids,
+            stat=stat,
+            text=None,
+            version=new_version,
+        )
+
+        change_type = "added" if is_new else "modified"
+        summary = (
+            "Initial version" if is_new
+            else f"Large file updated: {new_count} chunks added, {len(removed)} chunks removed"
+        )
+
+        send_file_change(path, change_type)
+        save_file_version(
+            path=path,
+            version=new_version,
+            diff=[],
+            summary=summary,
+            _hash=current_hash,
+            change_type=change_type
+        )
+    finally:
+        release_inflight(path)
+
+def index_file(path, from_scan=False):
+    job = prepare_index(path, from_scan)
+    if job is None:
+        return
+
+    index_jobs([job])
 
 def handle_file_delete(path: str):
-    state = load_state()
-    info = state.get(path)
+    info = get_state(path)
 
     # 이미 인덱싱된 적 없는 파일이면 무시
     if not info:
@@ -205,8 +497,7 @@ def handle_file_delete(path: str):
         print(f"Deleted chunks for: {path}")
 
     # 로컬 상태에서도 제거
-    state.pop(path, None)
-    save_state(state)
+    delete_state(path)
 
     send_file_change(path, "deleted")
 
@@ -216,13 +507,29 @@ def finalize_delete(path):
         return
 
     handle_file_delete(path)
-    pending_deletes.pop(path, None)
 
-def delayed_index(path, delay=0.3):
-    def _run():
-        if os.path.exists(path):
-            index_file(path)
-    threading.Timer(delay, _run).start()
+def is_busy(path: str) -> bool:
+    """
+        scan 중인 경로이거나 다른 곳에서 인덱싱 중이면 나중에 다시 시도
+    """
+    with INFLIGHT_LOCK:
+        if path in INFLIGHT:
+            return True
+
+    with SCANNING_LOCK:
+        return any(path.startswith(p) for p in SCANNING_PATHS)
+
+def handle_event(path: str, action: str):
+    if is_busy(path):
+        return False
+
+    if action == "delete":
+        finalize_delete(path)
+    elif os.path.exists(path):
+        index_file(path)
+    return True
+
+scheduler = EventScheduler(handle_event, workers=EVENT_WORKERS, max_delay=EVENT_MAX_DELAY)
 
 class FileChangeHandler(FileSystemEventHandler):
     def on_created(self, event):
@@ -231,8 +538,8 @@ class FileChangeHandler(FileSystemEventHandler):
         if is_temp_file(event.src_path):
             return
         print("[EVT created]", event.src_path, "is_dir=", event.is_directory, flush=True)
-        cancel_pending_delete(event.src_path)
-        delayed_index(event.src_path)
+        # 같은 path에 대기 중인 delete는 이 이벤트로 대체됨
+        scheduler.schedule(event.src_path, "index", INDEX_DELAY)
 
     def on_modified(self, event):
         if event.is_directory:
@@ -240,8 +547,7 @@ class FileChangeHandler(FileSystemEventHandler):
         if is_temp_file(event.src_path):
             return
         print("[EVT modified]", event.src_path, "is_dir=", event.is_directory, flush=True)
-        cancel_pending_delete(event.src_path)
-        delayed_index(event.src_path)
+        scheduler.schedule(event.src_path, "index", INDEX_DELAY)
 
     # def on_deleted(self, event):
     #     if event.is_directory:
@@ -252,16 +558,8 @@ class FileChangeHandler(FileSystemEventHandler):
         if event.is_directory:
             return
 
-        path = event.src_path
-
-        # delete를 바로 처리하지 않음
-        timer = threading.Timer(
-            DELETE_DELAY,
-            lambda: finalize_delete(path)
-        )
-
-        pending_deletes[path] = timer
-        timer.start()
+        # delete를 바로 처리하지 않음 (Mac은 저장할 때 delete -> create 순으로 옴)
+        scheduler.schedule(event.src_path, "delete", DELETE_DELAY)
 
 observer = None
 current_paths: set[str] = set()
@@ -270,28 +568,33 @@ handler = FileChangeHandler()
 SCANNING_PATHS: set[str] = set()
 SCANNING_LOCK = threading.Lock()
 
+# 큐 길이 / 진행 중 개수는 scrape 할 때만 읽음
+metrics.gauge("indexer_inflight_files", "Files currently being indexed", lambda: len(INFLIGHT))
+metrics.gauge("indexer_pending_events", "Debounced events waiting in the scheduler", scheduler.pending_count)
+metrics.gauge("indexer_running_events", "Events being handled by scheduler workers", scheduler.running_count)
+metrics.gauge("indexer_scanning_paths", "Watch paths in initial scan", lambda: len(SCANNING_PATHS))
+
 def initial_scan_path(path: str):
     print("initial scan:", path, flush=True)
 
-    # ✅ 스캔 전에 prev 스냅샷
-    state_before = load_state()
-    prev_state = {k: v for k, v in state_before.items() if k.startswith(path)}
+    # ✅ 스캔 전에 prev 스냅샷 (경로만)
+    prev_paths = state_paths(path)
 
     with SCANNING_LOCK:
         SCANNING_PATHS.add(path)
     try:
-        scan_directory(path)  # 내부에서 update_state로 state를 갱신함
+        with state_batch() as batch:
+            # 파이프라인 워커 스레드도 batch에 합류 (watchdog 스레드의 쓰기는 그대로 바로 commit)
+            scan_directory(path, init_thread=batch.join)  # 내부에서 update_state로 state를 갱신함
     finally:
         with SCANNING_LOCK:
             if path in SCANNING_PATHS:
                 SCANNING_PATHS.remove(path)
 
-    # ✅ 스캔 후 최신 state 로드
-    state_after = load_state()
+    # ✅ 삭제 반영 (스캔 전에 있었는데 디스크에서 사라진 파일)
+    handle_deleted_files(prev_paths)
 
-    # ✅ 삭제 반영 (prev_state vs state_after)
-    handle_deleted_files(prev_state, state_after)
-    save_state(state_after)
+    print("initial scan done:", path, "embedding cache:", cache_stats(), flush=True)
 
 def restart_watchdog(new_paths: set[str]):
     global observer, current_paths
@@ -330,12 +633,23 @@ def watch_path_watcher(interval=5):
         time.sleep(interval)
 
 def scan_directory(
-    base: str
+    base: str,
+    init_thread=None
 ):
-    for root, _, files in os.walk(base):
-        for file in files:
-            full_path = os.path.join(root, file)
-            index_file(full_path, from_scan=True)
+    # walk -> (process pool) hash/extract/chunk -> 파일 간 batch 임베딩 -> 병렬 upload
+    fingerprints = state_fingerprints(base)
+
+    ScanPipeline(
+        claim=lambda p: claim_file(p, from_scan=True, fingerprints=fingerprints),
+        build_job=build_job,
+        job_texts=job_texts,
+        embed=get_embeddings,
+        finish=finish_index,
+        release=release_inflight,
+        index_large=index_large_file,
+        stream_threshold=STREAM_THRESHOLD,
+        init_thread=init_thread,
+    ).run(base)
 
 def scan():
     paths = fetch_watch_paths()
@@ -345,8 +659,16 @@ def scan():
 
 if __name__ == "__main__":
     ensure_state_file()
+    ensure_tokenizer()  # scan 워커가 hub를 기다리지 않고 같은 tokenizer를 쓰도록 먼저 받아둠
     wait_for_server()
 
+    if METRICS_PORT:
+        try:
+            metrics.serve(METRICS_PORT)
+            print(f"metrics: http://127.0.0.1:{METRICS_PORT}/metrics", flush=True)
+        except OSError as e:
+            print("metrics server failed:", e, flush=True)
+
     # 초기 scan
     threading.Thread(target=scan, daemon=True).start()
 
@@ -0,0 +1,289 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from chunker import stream_chunks
+from hashing import file_hash
+from text_extractor import extract_text, is_supported
+import timing
+
+BASE_PATH = os.getcwd()
+
+with open(f"{BASE_PATH}/indexer/config.json") as f:
+    config = json.load(f)
+
+EXTRACT_WORKERS = config.get("scan_extract_workers") or os.cpu_count() or 1
+UPLOAD_WORKERS = config.get("scan_upload_workers", 4)
+QUEUE_SIZE = config.get("scan_queue_size", 256)
+EMBED_BATCH_SIZE = config.get("embed_batch_size", 64)
+
+_DONE = object()
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """
+        hash/extract 용 process pool (여러 scan이 같이 씀)
+        spawn으로 띄워야 모델/스레드 상태가 fork로 복사되지 않음
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+def reset_process_pool(broken):
+    """
+        워커가 죽으면 (segfault, OOM 등) pool 전체가 BrokenProcessPool 상태로 남음
+        -> 버리고 다음 get_process_pool()에서 새로 만듦
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is broken:
+            _process_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def submit_extract(path: str, prev_hash: str):
+    """(future, 제출한 pool) - pool이 이미 깨져 있으면 새로 만들어서 한 번 더"""
+    pool = get_process_pool()
+    try:
+        return pool.submit(extract_file_timed, path, prev_hash), pool
+    except BrokenProcessPool:
+        reset_process_pool(pool)
+        pool = get_process_pool()
+        return pool.submit(extract_file_timed, path, prev_hash), pool
+
+def walk_files(base: str):
+    """
+        os.scandir 기반 walker (DirEntry 캐시 덕분에 os.walk보다 stat 호출이 적음)
+    """
+    stack = [base]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path
+                except OSError:
+                    continue
+
+def extract_file(path: str, prev_hash: str = None):
+    """
+        CPU 작업 (process pool 에서도 실행됨): hash, 텍스트 추출, chunk 분할
+        hash가 이전과 같으면 추출/분할은 건너뜀, 지원하지 않는 확장자면 hash도 안 함 (None, None, [])
+    """
+    if not is_supported(path):
+        return None, None, []
+
+    with timing.stage("hash"):
+        current_hash = file_hash(path)
+    if current_hash == prev_hash:
+        return current_hash, None, []
+
+    with timing.stage("extract"):
+        text = extract_text(path)
+    with timing.stage("chunk"):
+        chunks = list(stream_chunks([text])) if text else []
+    return current_hash, text, chunks
+
+def extract_file_timed(path: str, prev_hash: str = None):
+    """
+        process pool 용: 워커에서 잰 단계별 시간을 결과와 같이 돌려줌
+    """
+    timing.reset()
+    result = extract_file(path, prev_hash)
+    return result, timing.snapshot()
+
+class ScanPipeline:
+    """
+        initial scan 파이프라인
+
+        walker -> [path_q] -> extract(process pool) -> [future_q] -> build_job -> [job_q]
+        -> embed(파일 간 batch) -> upload(thread pool)
+
+        stream_threshold 보다 큰 파일은 [large_q] -> index_large (streaming, 별도 스레드)
+
+        queue가 모두 bounded라 뒤 단계가 밀리면 앞 단계가 기다림 (backpressure)
+        init_thread는 stage / upload 스레드가 시작할 때 한 번 호출 (예: state batch 합류)
+    """
+
+    def __init__(self, claim, build_job, job_texts, embed, finish, release,
+                 index_large=None, stream_threshold=None, init_thread=None):
+        self.claim = claim
+        self.build_job = build_job
+        self.job_texts = job_texts
+        self.embed = embed
+        self.finish = finish
+        self.release = release
+        self.index_large = index_large
+        self.stream_threshold = stream_threshold
+        self.init_thread = init_thread
+
+        self.path_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self.future_q = queue.Queue(maxsize=EXTRACT_WORKERS * 2)
+        self.job_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self.large_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self.upload_slots = threading.BoundedSemaphore(UPLOAD_WORKERS * 2)
+
+    def run(self, base: str):
+        stages = [
+            self._thread(self._walk, base),
+            self._thread(self._extract),
+            self._thread(self._collect),
+            self._thread(self._large),
+        ]
+        for t in stages:
+            t.start()
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, initializer=self.init_thread) as uploader:
+            self._embed(uploader)
+
+        for t in stages:
+            t.join()
+
+    def _thread(self, target, *args):
+        def run():
+            if self.init_thread is not None:
+                self.init_thread()
+            target(*args)
+        return threading.Thread(target=run, daemon=True)
+
+    def _walk(self, base):
+        try:
+            for path in walk_files(base):
+                claimed = self.claim(path)
+                if claimed is not None:
+                    stat, prev_hash = claimed
+                    self.path_q.put((path, stat, prev_hash))
+        finally:
+            self.path_q.put(_DONE)
+
+    def _extract(self):
+        # 어떤 경우에도 _DONE은 넘겨야 뒤 단계가 끝남
+        try:
+            while True:
+                item = self.path_q.get()
+                if item is _DONE:
+                    return
+
+                path, stat, prev_hash = item
+                if self.index_large is not None and stat.st_size > self.stream_threshold:
+                    self.large_q.put(item)
+                    continue
+
+                try:
+                    future, pool = submit_extract(path, prev_hash)
+                except Exception as e:
+                    print("scan extract submit failed:", path, e, flush=True)
+                    self.release(path)
+                    continue
+
+                self.future_q.put((path, stat, future, pool))
+        finally:
+            self.future_q.put(_DONE)
+            self.large_q.put(_DONE)
+
+    def _collect(self):
+        try:
+            while True:
+                item = self.future_q.get()
+                if item is _DONE:
+                    return
+
+                path, stat, future, pool = item
+                try:
+                    (current_hash, text, chunks), stages = future.result()
+                    timing.merge(stages)
+                    job = self.build_job(path, stat, current_hash, text, chunks)
+                except BrokenProcessPool as e:
+                    # 같은 pool에 있던 나머지 future도 전부 실패 -> 각각 release, pool은 새로
+                    print("scan extract worker died:", path, e, flush=True)
+                    reset_process_pool(pool)
+                    self.release(path)
+                    continue
+                except Exception as e:
+                    print("scan extract failed:", path, e, flush=True)
+                    self.release(path)
+                    continue
+
+                if job is not None:
+                    self.job_q.put(job)
+        finally:
+            self.job_q.put(_DONE)
+
+    def _large(self):
+        while True:
+            item = self.large_q.get()
+            if item is _DONE:
+                return
+
+            path, stat, prev_hash = item
+            try:
+                self.index_large(path, stat, prev_hash)
+            except Exception as e:
+                print("scan stream index failed:", path, e, flush=True)
+
+    def _embed(self, uploader):
+        pending, pending_texts = [], 0
+        done = False
+
+        while not done:
+            # batch가 찼거나 더 들어올 job이 당장 없으면 flush
+            try:
+                item = self.job_q.get(timeout=0.05 if pending else None)
+            except queue.Empty:
+                item = None
+
+            if item is _DONE:
+                done = True
+            elif item is not None:
+                pending.append(item)
+                pending_texts += len(self.job_texts(item))
+                if pending_texts < EMBED_BATCH_SIZE:
+                    continue
+
+            if pending:
+                self._flush(pending, uploader)
+                pending, pending_texts = [], 0
+
+    def _flush(self, jobs, uploader):
+        try:
+            texts = [t for job in jobs for t in self.job_texts(job)]
+            vectors = self.embed(texts)
+        except Exception as e:
+            print("scan embed failed:", e, flush=True)
+            for job in jobs:
+                self.release(job["path"])
+            return
+
+        offset = 0
+        for job in jobs:
+            n = len(self.job_texts(job))
+            self.upload_slots.acquire()
+            uploader.submit(self._upload, job, vectors[offset:offset + n])
+            offset += n
+
+    def _upload(self, job, vectors):
+        try:
+            self.finish(job, vectors)
+        except Exception as e:
+            print("scan upload failed:", job["path"], e, flush=True)
+        finally:
+            self.release(job["path"])
+            self.upload_slots.release()
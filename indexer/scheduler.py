@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+RETRY_DELAY = 1.0  # seconds
+
+EVENTS = metrics.counter("indexer_events_total", "Scheduled watchdog events", ("action",))
+
+class EventScheduler:
+    """
+        watchdog 이벤트 스케줄러 (이벤트마다 threading.Timer 스레드 만들지 않음)
+
+        - path별 debounce: 같은 path 이벤트가 연속으로 오면 마지막 것 하나만 실행
+          (계속 바뀌는 파일도 첫 이벤트부터 max_delay 안에는 실행)
+        - 시간순 heap + dispatcher 스레드 하나 + 크기 제한된 worker pool
+        - 같은 path는 동시에 하나만 실행, 실행 중에 들어온 이벤트는 끝난 뒤 반드시 실행
+        - handler가 False를 반환하면 (다른 작업이 잡고 있음 등) RETRY_DELAY 뒤 재시도
+    """
+
+    def __init__(self, handler, workers: int = 4, max_delay: float | None = None):
+        self.handler = handler  # handler(path, action) -> bool | None
+        self.workers = workers
+        self.max_delay = max_delay
+
+        self._heap = []      # (due, seq, path)
+        self._pending = {}   # path -> (due, action, seq, first)  path별 마지막 이벤트, first는 첫 이벤트 시각
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def schedule(self, path: str, action: str, delay: float):
+        EVENTS.labels(action).inc()
+        with self._cond:
+            now = time.monotonic()
+            entry = self._pending.get(path)
+            first = entry[3] if entry is not None else now
+            due = now + delay
+            if self.max_delay is not None:
+                due = min(due, first + self.max_delay)
+            self._push(path, action, due, first)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def running_count(self) -> int:
+        with self._cond:
+            return len(self._running)
+
+    def _push(self, path, action, due, first=None):
+        seq = next(self._seq)
+        self._pending[path] = (due, action, seq, due if first is None else first)
+        heapq.heappush(self._heap, (due, seq, path))
+        self._cond.notify()
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due, seq, path = self._heap[0]
+                entry = self._pending.get(path)
+
+                # 더 최근 이벤트로 덮어써진 항목
+                if entry is None or entry[2] != seq:
+                    heapq.heappop(self._heap)
+                    continue
+
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+
+                # 같은 path가 실행 중이면 pending에 남겨두고 끝난 뒤 다시 넣음
+                if path in self._running:
+                    heapq.heappop(self._heap)
+                    continue
+
+                if len(self._running) >= self.workers:
+                    self._cond.wait()
+                    continue
+
+                heapq.heappop(self._heap)
+                del self._pending[path]
+                self._running.add(path)
+                self._pool.submit(self._run, path, entry[1])
+
+    def _run(self, path, action):
+        done = True
+        try:
+            done = self.handler(path, action) is not False
+        except Exception as e:
+            print("event handler failed:", action, path, e, flush=True)
+        finally:
+            with self._cond:
+                self._running.discard(path)
+
+                entry = self._pending.get(path)
+                if entry is not None:
+                    # 실행 중에 새 이벤트가 들어옴 -> 다시 heap에
+                    due, pending_action, _, first = entry
+                    self._push(path, pending_action, due, first)
+                elif not done:
+                    self._push(path, action, time.monotonic() + RETRY_DELAY)
+                else:
+                    self._cond.notify()
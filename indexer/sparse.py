@@ -0,0 +1,56 @@
+import re
+import zlib
+from collections import Counter
+
+# BM25 term frequency 파라미터 (IDF는 Qdrant 쪽 modifier=IDF 로 계산)
+K1 = 1.2
+B = 0.75
+AVG_DOC_TERMS = 200  # chunk 하나의 평균 term 수 (chunk_max_tokens 기준 대략값)
+
+# 식별자/에러코드/파일이름은 통째로 (config.json, ERR_CONN_RESET, 0x80070005, foo::bar)
+_COMPOUND_RE = re.compile(r"\w+(?:[.\-:/]+\w+)*")
+_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+|[^\W\d_a-zA-Z]+")
+
+def terms(text: str) -> list[str]:
+    """
+        lexical term 목록 (중복 포함)
+        통째로 한 번 + 구분자/camelCase/snake_case로 나눈 조각도 같이 넣음
+        예) "getUserName()" -> getusername, get, user, name
+    """
+    out = []
+    for m in _COMPOUND_RE.finditer(text):
+        compound = m.group()
+        out.append(compound.lower())
+
+        parts = _PART_RE.findall(compound)
+        if len(parts) > 1:
+            out.extend(p.lower() for p in parts)
+    return out
+
+def term_id(term: str) -> int:
+    # sparse vector index (uint32), 충돌은 드물고 검색 품질에 거의 영향 없음
+    return zlib.crc32(term.encode("utf-8"))
+
+def sparse_vector(text: str) -> dict:
+    """
+        문서(chunk)용 BM25 tf 가중치 sparse vector  {"indices": [...], "values": [...]}
+    """
+    counts = Counter(term_id(t) for t in terms(text))
+    doc_len = sum(counts.values())
+    norm = K1 * (1 - B + B * doc_len / AVG_DOC_TERMS)
+
+    indices = sorted(counts)
+    return {
+        "indices": indices,
+        "values": [counts[i] * (K1 + 1) / (counts[i] + norm) for i in indices]
+    }
+
+def query_sparse_vector(text: str) -> dict:
+    """
+        검색어용 sparse vector (term마다 1.0, 점수는 문서 쪽 tf * IDF)
+    """
+    indices = sorted({term_id(t) for t in terms(text)})
+    return {
+        "indices": indices,
+        "values": [1.0] * len(indices)
+    }
@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from timing import timed
+
+STATE_DB = ".local_index_state.db"
+LEGACY_STATE_FILE = ".local_index_state.json"
+
+# scan 중에는 매 파일마다 commit 하지 않고 이 개수마다 commit
+COMMIT_EVERY = 500
+
+_conn = None
+_lock = threading.RLock()
+# batch 깊이는 스레드별 (scan이 묶는 동안에도 watchdog 스레드의 쓰기는 바로 commit)
+_batch = threading.local()
+_pending_writes = 0
+
+class BatchScope:
+    """state_batch() 하나 - 다른 스레드(scan 파이프라인 워커)는 join()으로 합류"""
+
+    def __init__(self):
+        self.active = True
+
+    def join(self):
+        _batch.joined = self
+
+def _batched() -> bool:
+    if getattr(_batch, "depth", 0):
+        return True
+    joined = getattr(_batch, "joined", None)
+    return joined is not None and joined.active
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(STATE_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_state (
+                path TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                mtime REAL,
+                size INTEGER,
+                text TEXT,
+                version INTEGER
+            )
+            """
+        )
+        columns = {r[1] for r in _conn.execute("PRAGMA table_info(file_state)")}
+        if "inode" not in columns:
+            _conn.execute("ALTER TABLE file_state ADD COLUMN inode INTEGER")
+        _conn.commit()
+    return _conn
+
+def _row_to_entry(row):
+    _, file_hash, chunks, mtime, size, text, version, inode = row
+    entry = {
+        "hash": file_hash,
+        "chunks": json.loads(chunks),
+        "mtime": mtime,
+        "size": size,
+        "text": text,
+        "inode": inode,
+    }
+    if version is not None:
+        entry["version"] = version
+    return entry
+
+def _written():
+    """
+        batch 밖이면 바로 commit, batch 안이면 COMMIT_EVERY 마다 commit
+        (연결이 하나라 commit하면 다른 스레드의 batch에 쌓인 쓰기도 같이 commit 됨)
+    """
+    global _pending_writes
+    _pending_writes += 1
+    if not _batched() or _pending_writes >= COMMIT_EVERY:
+        _conn.commit()
+        _pending_writes = 0
+
+def _migrate_legacy_state(conn):
+    """
+        예전 .local_index_state.json 이 있으면 한 번만 옮기고 .migrated 로 이름 변경
+    """
+    if not os.path.exists(LEGACY_STATE_FILE):
+        return
+
+    try:
+        with open(LEGACY_STATE_FILE, "r") as f:
+            legacy = json.load(f)
+    except json.JSONDecodeError:
+        legacy = {}
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO file_state VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+        [
+            (
+                path,
+                entry.get("hash", ""),
+                json.dumps(entry.get("chunks", [])),
+                entry.get("mtime"),
+                entry.get("size"),
+                entry.get("text"),
+                entry.get("version"),
+            )
+            for path, entry in legacy.items()
+        ]
+    )
+    conn.commit()
+    os.replace(LEGACY_STATE_FILE, LEGACY_STATE_FILE + ".migrated")
+    print(f"Migrated {len(legacy)} entries from {LEGACY_STATE_FILE}", flush=True)
+
+def ensure_state_file():
+    with _lock:
+        _migrate_legacy_state(_connect())
+
+def get_state(path: str):
+    with _lock:
+        row = _connect().execute(
+            "SELECT * FROM file_state WHERE path = ?", (path,)
+        ).fetchone()
+    return _row_to_entry(row) if row else None
+
+def get_fingerprint(path: str):
+    """
+        (mtime, size, inode, hash) 만 조회 (text/chunks는 안 읽음)
+    """
+    with _lock:
+        return _connect().execute(
+            "SELECT mtime, size, inode, hash FROM file_state WHERE path = ?", (path,)
+        ).fetchone()
+
+def state_fingerprints(prefix: str) -> dict:
+    """
+        scan 시작할 때 prefix 아래 전체 fingerprint를 한 번에 로드
+    """
+    with _lock:
+        rows = _connect().execute(
+            "SELECT path, mtime, size, inode, hash FROM file_state WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix)
+        ).fetchall()
+    return {r[0]: r[1:] for r in rows}
+
+def state_paths(prefix: str) -> set[str]:
+    with _lock:
+        rows = _connect().execute(
+            "SELECT path FROM file_state WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix)
+        ).fetchall()
+    return {r[0] for r in rows}
+
+@timed("state")
+def update_state(
+    path: str,
+    file_hash: str,
+    chunk_ids: list[str],
+    stat,
+    text: str,
+    version: int = None
+):
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            """
+            INSERT INTO file_state (path, hash, chunks, mtime, size, text, version, inode)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                hash = excluded.hash,
+                chunks = excluded.chunks,
+                mtime = excluded.mtime,
+                size = excluded.size,
+                text = excluded.text,
+                version = COALESCE(excluded.version, file_state.version),
+                inode = excluded.inode
+            """,
+            (path, file_hash, json.dumps(chunk_ids), stat.st_mtime, stat.st_size, text, version, stat.st_ino)
+        )
+        _written()
+
+@timed("state")
+def touch_state(path: str, stat):
+    """
+        내용은 그대로인데 stat만 바뀐 경우 (touch, 복사 등) fingerprint만 갱신
+    """
+    with _lock:
+        _connect().execute(
+            "UPDATE file_state SET mtime = ?, size = ?, inode = ? WHERE path = ?",
+            (stat.st_mtime, stat.st_size, stat.st_ino, path)
+        )
+        _written()
+
+@timed("state")
+def delete_state(path: str):
+    with _lock:
+        _connect().execute("DELETE FROM file_state WHERE path = ?", (path,))
+        _written()
+
+@contextmanager
+def state_batch():
+    """
+        scan 처럼 많이 쓰는 구간을 묶어서 commit 횟수 줄이기 (BatchScope를 돌려줌)
+        이 스레드와 scope.join()한 스레드의 쓰기만 묶임
+    """
+    global _pending_writes
+    with _lock:
+        _connect()
+        depth = getattr(_batch, "depth", 0)
+        if depth == 0:
+            _batch.scope = BatchScope()
+        _batch.depth = depth + 1
+        scope = _batch.scope
+    try:
+        yield scope
+    finally:
+        with _lock:
+            _batch.depth -= 1
+            if _batch.depth == 0:
+                scope.active = False
+                _conn.commit()
+                _pending_writes = 0
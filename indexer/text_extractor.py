@@ -2,14 +2,28 @@ import os
 from PyPDF2 import PdfReader
 from docx import Document
 
+TEXT_EXTENSIONS = [".txt", ".md", ".log"]
+CODE_EXTENSIONS = [".py", ".js", ".ts", ".java"]
+SUPPORTED_EXTENSIONS = set(TEXT_EXTENSIONS + CODE_EXTENSIONS + [".pdf", ".docx"])
+
+READ_BLOCK_SIZE = 1024 * 1024
+DOCX_PARAGRAPHS_PER_SEGMENT = 200
+# 공백 없는 입력(minified, binary 섞인 로그)에서 carry가 이 크기를 넘으면 강제로 자름
+MAX_CARRY_SIZE = 4 * READ_BLOCK_SIZE
+CODE_HEAD_LINES = 50
+
+def is_supported(path) -> bool:
+    """추출할 수 있는 확장자인지 (아니면 hash도 할 필요 없음)"""
+    return os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+
 def extract_text(path):
     ext = os.path.splitext(path)[1].lower()
     
     try:
-        if ext in [".txt", ".md", ".log"]:
+        if ext in TEXT_EXTENSIONS:
             return open(path, "r", encoding="utf-8", errors="ignore").read()
 
-        elif ext in [".py", ".js", ".ts", ".java"]:
+        elif ext in CODE_EXTENSIONS:
             return extract_code(path)
 
         elif ext == ".pdf":
@@ -23,22 +37,108 @@ def extract_text(path):
     except:
         return None
 
+def iter_text(path):
+    """
+        텍스트를 조각(segment) 단위로 yield 하는 generator
+        (pdf는 page, docx는 paragraph 묶음, txt/log는 고정 크기 read)
+        지원하지 않는 확장자면 None
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in TEXT_EXTENSIONS:
+        return iter_plain(path)
+
+    elif ext in CODE_EXTENSIONS:
+        return iter_code(path)
+
+    elif ext == ".pdf":
+        return iter_pdf(path)
+
+    elif ext == ".docx":
+        return iter_docx(path)
+
+    else:
+        return None
+
+def iter_plain(path, block_size=READ_BLOCK_SIZE, max_carry=MAX_CARRY_SIZE):
+    """
+        block_size 씩 읽되 단어가 중간에 잘리지 않게 마지막 공백까지만 yield
+        공백이 max_carry 넘게 안 나오면 그 자리에서 자름
+    """
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        carry = ""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+
+            block = carry + block
+            cut = max(block.rfind("\n"), block.rfind(" "))
+            if cut < 0:
+                if len(block) >= max_carry:
+                    yield block
+                    carry = ""
+                else:
+                    carry = block
+                continue
+
+            carry = block[cut + 1:]
+            yield block[:cut + 1]
+
+        if carry:
+            yield carry
+
+
+def iter_code(path):
+    yield extract_code(path)
+
+def _split_lines(f):
+    # str.split("\n")와 같은 결과 (끝이 개행이면 마지막에 빈 줄) 를 한 줄씩
+    last = None
+    for line in f:
+        last = line
+        yield line[:-1] if line.endswith("\n") else line
+    if last is None or last.endswith("\n"):
+        yield ""
 
 def extract_code(path):
+    """
+        함수 정의 줄 + 앞부분 CODE_HEAD_LINES 줄 (파일 전체를 메모리에 올리지 않고 줄 단위로)
+    """
+    funcs = []
+    head = []
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        code = f.read()
+        for i, line in enumerate(_split_lines(f)):
+            if "def " in line or "function" in line:
+                funcs.append(line)
+            if i < CODE_HEAD_LINES:
+                head.append(line)
 
-    lines = code.split("\n")
-    funcs = [l for l in lines if "def " in l or "function" in l]
-    return "\n".join(funcs + lines[:50])  
+    return "\n".join(funcs + head)
 
 
 def extract_pdf(path):
+    return "\n".join(iter_pdf(path))
+
+def iter_pdf(path):
     reader = PdfReader(path)
-    texts = [page.extract_text() for page in reader.pages]
-    return "\n".join([t for t in texts if t])
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text
 
 
 def extract_docx(path):
+    return "\n".join(iter_docx(path))
+
+def iter_docx(path, per_segment=DOCX_PARAGRAPHS_PER_SEGMENT):
     doc = Document(path)
-    return "\n".join([p.text for p in doc.paragraphs])
+    buf = []
+    for p in doc.paragraphs:
+        buf.append(p.text)
+        if len(buf) >= per_segment:
+            yield "\n".join(buf)
+            buf = []
+
+    if buf:
+        yield "\n".join(buf)
@@ -0,0 +1,41 @@
+import functools
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# 단계별 시간 (hash, extract, chunk, embed, upload, state) histogram
+# 여러 스레드/프로세스에서 같이 쌓이므로 합계는 wall clock이 아니라 단계별 작업 시간의 합
+STAGE_SECONDS = metrics.histogram("indexer_stage_seconds", "Time spent per indexer stage call", ("stage",))
+
+def add(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+
+def timed(name: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> dict:
+    """{stage: {"seconds", "count", "buckets"}}"""
+    return {key[0]: child.snapshot() for key, child in STAGE_SECONDS.items()}
+
+def merge(other: dict):
+    """process pool 워커에서 돌려받은 snapshot 합치기"""
+    for name, snap in other.items():
+        STAGE_SECONDS.labels(name).merge(snap)
+
+def reset():
+    STAGE_SECONDS.clear()
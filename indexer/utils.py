@@ -1,76 +1,45 @@
 import os
-import json
 from client import delete_chunks
+from state import get_state, delete_state
 import uuid
+import hashlib
 import difflib
 
-STATE_FILE = ".local_index_state.json"
-
 NAMESPACE = uuid.UUID("20b57fa4-ec8b-4ce0-b0d5-7b56a25385db")
 # ← 아무 UUID 하나 고정으로 써도 됨 (프로젝트 고유)
 
 TEMP_PREFIXES = ("~",)
 TEMP_EXTENSIONS = (".tmp",)
 
-def ensure_state_file():
-    if not os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "w") as f:
-            json.dump({}, f)
-
 def chunk_id_to_uuid(chunk_id: str) -> str:
     return str(uuid.uuid5(NAMESPACE, chunk_id))
 
-def load_state():
-    if not os.path.exists(STATE_FILE):
-        save_state({})
-        return {}
-
-    try:
-        with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        save_state({})
-        return {}
-
-def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
-
-def update_state(
-    path: str,
-    file_hash: str,
-    chunk_ids: list[str],
-    stat,
-    text: str,
-    version: int = None
-):
-    state = load_state()
-
-    entry = state.get(path, {})
-
-    entry.update({
-        "hash": file_hash,
-        "chunks": chunk_ids,
-        "mtime": stat.st_mtime,
-        "size": stat.st_size,
-        "text": text,
-    })
-
-    if version is not None:
-        entry["version"] = version  # ⭐ 여기
-
-    state[path] = entry
-    save_state(state)
-
-def handle_deleted_files(prev_state, new_state):
-    deleted_paths = set(prev_state.keys()) - set(new_state.keys())
-
-    for path in deleted_paths:
-        chunks = prev_state[path].get("chunks", [])
+def chunk_content_id(path: str, chunk: str) -> str:
+    """
+        chunk 내용 기반 ID (위치가 아니라 내용이 같으면 같은 ID)
+    """
+    digest = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+    return chunk_id_to_uuid(f"{path}:{digest}")
+
+def handle_deleted_files(prev_paths):
+    """
+        scan 전에 state에 있던 경로 중 디스크에서 사라진 것 정리
+    """
+    for path in prev_paths:
+        if os.path.exists(path):
+            continue
+
+        info = get_state(path)
+        if not info:
+            continue
+
+        chunks = info.get("chunks", [])
         if chunks:
             delete_chunks(chunks)
             print(f"Deleted: {path}")
 
+        delete_state(path)
+
 def compute_diff(old: str, new: str):
     old_lines = old.splitlines()
     new_lines = new.splitlines()
@@ -0,0 +1,119 @@
+import asyncio
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+        여러 요청의 텍스트를 모아서 한 번에 임베딩 (모델 encode는 항상 하나씩, thread에서)
+
+        - 첫 요청이 들어오면 max_wait 동안 또는 max_batch 개가 찰 때까지 더 모음
+        - encode 하는 동안 들어온 요청은 다음 batch로
+        - close()는 그때까지 들어온 요청을 다 처리한 뒤 멈춤
+    """
+
+    def __init__(self, encode, max_batch: int = 64, max_wait: float = 0.005):
+        self.encode = encode  # encode(texts) -> vectors (blocking)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue = None
+        self._task = None
+
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self._queue.put((texts, future))
+        return await future
+
+    async def close(self):
+        """남은 요청까지 처리하고 batch task 종료 (서버 종료 때, 이후 submit하면 다시 시작)"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+
+    async def _collect(self):
+        """(batch, 멈출지)"""
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        count = len(first[0])
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while count < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            count += len(item[0])
+
+        # 기다리는 사이 쌓인 것까지
+        while count < self.max_batch and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            count += len(item[0])
+
+        return batch, False
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._encode_batch(batch)
+            if stopping:
+                return
+
+    async def _encode_batch(self, batch):
+        texts = [t for item_texts, _ in batch for t in item_texts]
+
+        try:
+            vectors = await asyncio.to_thread(self.encode, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(texts)
+
+        offset = 0
+        for item_texts, future in batch:
+            n = len(item_texts)
+            if not future.done():  # 요청이 취소됐으면 결과만 버림
+                future.set_result(vectors[offset:offset + n])
+            offset += n
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,1097 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from uuid import UUID
+
+import numpy as np
+from qdrant_client.http.models import Record, ScoredPoint, PointGroup, GroupsResult, QueryResponse, \
+    CollectionsResponse, CollectionDescription, CountResult, UpdateResult, UpdateStatus, VectorParams, \
+    SparseVectorParams, SparseVector, Distance, Modifier, Filter, FieldCondition, MatchValue, MatchAny, \
+    IsEmptyCondition, IsNullCondition, HasIdCondition, OrderBy, Direction, FusionQuery, Fusion, \
+    PointIdsList, FilterSelector, PayloadSelectorInclude, PayloadSchemaType
+
+RRF_K = 2  # Qdrant RRF와 같은 상수 (0부터 센 rank에 더함)
+INITIAL_CAPACITY = 1024
+COMPACT_BLOCK = 4096  # 압축할 때 한 번에 옮기는 row 수
+FLUSH_INTERVAL = 5.0  # memmap msync 간격 (초)
+RESIDENT_VALUE_SIZE = 256  # 이보다 긴 payload 값은 메모리에 두지 않고 SQLite에서 읽음
+
+_LAZY = object()
+
+class _LazyValue(Exception):
+    """메모리에 없는 payload 값을 봐야 함"""
+
+class _RWLock:
+    """검색은 여러 스레드에서 같이, 쓰기는 혼자 (쓰기가 기다리는 중이면 새 검색은 그 뒤로)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+def normalize_id(point_id):
+    if isinstance(point_id, int):
+        return point_id
+    return str(UUID(str(point_id)))
+
+class _Collection:
+    """
+        컬렉션 하나 = row 번호로 맞춘 배열들
+        - vectors: (capacity, dim) float32 (디스크 모드면 memmap), cosine이면 정규화해서 저장
+        - payloads / sparse: row -> dict (삭제된 row는 None)
+          디스크 모드면 payload의 긴 값은 _LAZY로 두고 필요할 때 load_payload(id)로 읽음
+        - 인덱스: keyword payload -> rows, 숫자 payload -> float64 열 (없으면 NaN), sparse term -> {row: weight}
+    """
+
+    def __init__(self, name, dim, distance, sparse_names, sparse_idf=None, vectors_path=None, load_payload=None):
+        self.name = name
+        self.dim = dim
+        self.distance = distance
+        self.sparse_names = list(sparse_names)
+        self.sparse_idf = sparse_idf or {}
+        self.vectors_path = vectors_path
+        self.load_payload = load_payload
+        self.payload_schema = {}
+
+        self.size = 0
+        self.ids = []
+        self.id_rows = {}
+        self.payloads = []
+        self.pending = {}  # row -> 전체 payload (SQLite에 아직 안 쓴 것)
+        self.sparse = {n: [] for n in self.sparse_names}
+        self.postings = {n: {} for n in self.sparse_names}
+        self.sparse_docs = {n: 0 for n in self.sparse_names}
+        self.keyword_index = {}
+        self.numeric_index = {}
+        self.numeric_exact = {}  # field -> 모든 row가 숫자 하나(또는 없음)인지, 아니면 row별 비교로
+        self.alive = np.zeros(0, dtype=bool)
+        self.vectors = None
+        self.dirty = False
+        self._open_vectors(0)
+
+    # ----- 저장 공간 -----
+
+    def _open_vectors(self, capacity):
+        if self.dim is None:
+            return
+        if self.vectors_path is None:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.vectors is not None:
+                grown[:len(self.vectors)] = self.vectors
+            self.vectors = grown
+            return
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        # 파일은 줄이지 않음 (다시 열 때 저장된 벡터를 그대로 씀)
+        with open(self.vectors_path, "ab") as f:
+            rows = max(capacity, 1, f.tell() // (self.dim * 4))
+            f.truncate(rows * self.dim * 4)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _ensure_capacity(self, rows):
+        capacity = len(self.alive)
+        if rows <= capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, capacity)
+        while capacity < rows:
+            capacity *= 2
+        self._open_vectors(capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        for field, column in self.numeric_index.items():
+            grown = np.full(capacity, np.nan)
+            grown[:len(column)] = column
+            self.numeric_index[field] = grown
+
+    def flush(self):
+        vectors = self.vectors
+        if isinstance(vectors, np.memmap):
+            vectors.flush()
+
+    # ----- 쓰기 -----
+
+    def prepare_vector(self, vector):
+        v = np.asarray(vector, dtype=np.float32)
+        if self.distance == Distance.COSINE:
+            norm = np.linalg.norm(v)
+            if norm:
+                v = v / norm
+        return v
+
+    def _resident(self, payload):
+        if self.load_payload is None or not payload:
+            return payload
+        resident = None
+        for key, value in payload.items():
+            if isinstance(value, (str, list, dict)) and len(json.dumps(value)) > RESIDENT_VALUE_SIZE:
+                if resident is None:
+                    resident = dict(payload)
+                resident[key] = _LAZY
+        return payload if resident is None else resident
+
+    def _row_for(self, point_id):
+        row = self.id_rows.get(point_id)
+        if row is None:
+            row = self.size
+            self._ensure_capacity(row + 1)
+            self.size += 1
+            self.ids.append(point_id)
+            self.payloads.append(None)
+            for n in self.sparse_names:
+                self.sparse[n].append(None)
+            self.id_rows[point_id] = row
+        else:
+            self._unindex(row)
+        return row
+
+    def _set(self, row, sparse, payload):
+        self.payloads[row] = self._resident(payload)
+        for n in self.sparse_names:
+            self.sparse[n][row] = sparse.get(n)
+        self.alive[row] = True
+        self._index(row, payload)
+
+    def put(self, point_id, dense, sparse, payload):
+        row = self._row_for(point_id)
+        if self.dim is not None:
+            self.vectors[row] = self.prepare_vector(dense) if dense is not None else 0.0
+            self.dirty = True
+        self._set(row, sparse, payload)
+        if self.payloads[row] is not payload:
+            self.pending[row] = payload
+        else:
+            self.pending.pop(row, None)
+        return row
+
+    def restore(self, point_id, sparse, payload):
+        """다시 열 때: 벡터는 파일의 같은 row에 이미 있음"""
+        self._set(self._row_for(point_id), sparse, payload)
+
+    def remove(self, point_id):
+        row = self.id_rows.pop(point_id, None)
+        if row is None:
+            return False
+        self._unindex(row)
+        self.alive[row] = False
+        self.ids[row] = None
+        self.payloads[row] = None
+        self.pending.pop(row, None)
+        for n in self.sparse_names:
+            self.sparse[n][row] = None
+        return True
+
+    def _index(self, row, payload):
+        for field, index in self.keyword_index.items():
+            for value in _values(payload, field):
+                index.setdefault(value, set()).add(row)
+        for field in self.numeric_index:
+            self._set_numeric(field, row, _values(payload, field))
+
+        for n in self.sparse_names:
+            vec = self.sparse[n][row]
+            if vec:
+                self.sparse_docs[n] += 1
+                postings = self.postings[n]
+                for i, v in vec.items():
+                    postings.setdefault(i, {})[row] = v
+
+    def _unindex(self, row):
+        for field, index in self.keyword_index.items():
+            for value in self.values(row, field):
+                rows = index.get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del index[value]
+        for column in self.numeric_index.values():
+            column[row] = np.nan
+
+        for n in self.sparse_names:
+            vec = self.sparse[n][row]
+            if vec:
+                self.sparse_docs[n] -= 1
+                postings = self.postings[n]
+                for i in vec:
+                    entry = postings.get(i)
+                    if entry is not None:
+                        entry.pop(row, None)
+                        if not entry:
+                            del postings[i]
+
+    def add_index(self, field, schema):
+        self.payload_schema[field] = schema
+        if schema == PayloadSchemaType.KEYWORD.value:
+            self.add_keyword_index(field)
+        elif schema in (PayloadSchemaType.INTEGER.value, PayloadSchemaType.FLOAT.value):
+            self.add_numeric_index(field)
+
+    def add_keyword_index(self, field):
+        index = self.keyword_index[field] = {}
+        for row in np.flatnonzero(self.alive[:self.size]).tolist():
+            for value in self.values(row, field):
+                index.setdefault(value, set()).add(row)
+
+    def add_numeric_index(self, field):
+        self.numeric_index[field] = np.full(len(self.alive), np.nan)
+        self.numeric_exact[field] = True
+        for row in np.flatnonzero(self.alive[:self.size]).tolist():
+            self._set_numeric(field, row, self.values(row, field))
+
+    def _set_numeric(self, field, row, values):
+        number = values[0] if values and isinstance(values[0], (int, float)) and not isinstance(values[0], bool) \
+            else None
+        if len(values) > 1 or (values and number is None):
+            self.numeric_exact[field] = False  # 여러 값 / 숫자 아닌 값이 섞이면 range, order_by는 row별로
+        self.numeric_index[field][row] = np.nan if number is None else number
+
+    # ----- payload -----
+
+    def payload(self, row):
+        """row의 전체 payload"""
+        resident = self.payloads[row]
+        if not resident or not any(v is _LAZY for v in resident.values()):
+            return resident
+        full = self.pending.get(row)
+        return full if full is not None else self.load_payload(self.ids[row])
+
+    def values(self, row, key):
+        resident = self.payloads[row]
+        if resident and resident.get(key) is _LAZY:
+            return _values(self.payload(row), key)
+        return _values(resident, key)
+
+    def select_payload(self, row, with_payload):
+        if not with_payload:
+            return None
+        if with_payload is not True:
+            keys = with_payload.include if isinstance(with_payload, PayloadSelectorInclude) else with_payload
+            resident = self.payloads[row] or {}
+            if not any(resident.get(k) is _LAZY for k in keys):
+                return _select_payload(resident, with_payload)
+        return _select_payload(self.payload(row), with_payload)
+
+    def check(self, flt, row) -> bool:
+        try:
+            return _check(flt, self.payloads[row], self.ids[row])
+        except _LazyValue:
+            return _check(flt, self.payload(row), self.ids[row])
+
+    # ----- 읽기 -----
+
+    def _mask(self, cond) -> np.ndarray | None:
+        """payload index만으로 계산한 조건 mask (size,), index로 못 하면 None"""
+        n = self.size
+        if isinstance(cond, Filter):
+            mask = self.alive[:n].copy()
+            for c in _as_list(cond.must):
+                m = self._mask(c)
+                if m is None:
+                    return None
+                mask &= m
+            should = _as_list(cond.should)
+            if should:
+                any_mask = np.zeros(n, dtype=bool)
+                for c in should:
+                    m = self._mask(c)
+                    if m is None:
+                        return None
+                    any_mask |= m
+                mask &= any_mask
+            for c in _as_list(cond.must_not):
+                m = self._mask(c)
+                if m is None:
+                    return None
+                mask &= ~m
+            return mask
+
+        if isinstance(cond, FieldCondition):
+            if isinstance(cond.match, (MatchValue, MatchAny)) and cond.key in self.keyword_index:
+                index = self.keyword_index[cond.key]
+                wanted = [cond.match.value] if isinstance(cond.match, MatchValue) else cond.match.any
+                mask = np.zeros(n, dtype=bool)
+                for value in wanted:
+                    rows = index.get(value)
+                    if rows:
+                        mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+                return mask
+            if cond.match is None and cond.range is not None and self.numeric_exact.get(cond.key):
+                column = self.numeric_index[cond.key][:n]
+                r = cond.range
+                mask = ~np.isnan(column)
+                with np.errstate(invalid="ignore"):
+                    if r.lt is not None:
+                        mask &= column < r.lt
+                    if r.lte is not None:
+                        mask &= column <= r.lte
+                    if r.gt is not None:
+                        mask &= column > r.gt
+                    if r.gte is not None:
+                        mask &= column >= r.gte
+                return mask
+            return None
+
+        if isinstance(cond, IsEmptyCondition) and self.numeric_exact.get(cond.is_empty.key):
+            return np.isnan(self.numeric_index[cond.is_empty.key][:n])
+
+        if isinstance(cond, HasIdCondition):
+            mask = np.zeros(n, dtype=bool)
+            rows = [self.id_rows.get(normalize_id(i)) for i in cond.has_id]
+            mask[[r for r in rows if r is not None]] = True
+            return mask
+
+        return None
+
+    def match_rows(self, flt: Filter | None) -> np.ndarray:
+        """
+            filter를 만족하는 row (오름차순)
+            전부 payload index로 되는 조건이면 mask만으로, 아니면 index로 되는 must 조건으로 후보를 좁히고 row별 확인
+        """
+        if flt is None:
+            return np.flatnonzero(self.alive[:self.size])
+
+        mask = self._mask(flt)
+        if mask is not None:
+            return np.flatnonzero(mask)
+
+        mask = self.alive[:self.size].copy()
+        for cond in _as_list(flt.must):
+            m = self._mask(cond)
+            if m is not None:
+                mask &= m
+        return np.asarray(
+            [r for r in np.flatnonzero(mask).tolist() if self.check(flt, r)],
+            dtype=np.int64
+        )
+
+    def order_rows(self, rows, key, descending, limit):
+        """rows를 payload key 값 순서로 limit개 -> [(값, row)]"""
+        if self.numeric_exact.get(key):
+            values = self.numeric_index[key][rows]
+            keep = ~np.isnan(values)
+            rows, values = rows[keep], values[keep]
+            order = np.argsort(-values if descending else values, kind="stable")[:limit]
+            return [(self.values(r, key)[0], r) for r in rows[order].tolist()]
+
+        keyed = ((v, r) for r in rows.tolist() for v in self.values(r, key)[:1])
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(limit, keyed, key=lambda x: x[0])
+
+    def dense_scores(self, query, rows):
+        q = self.prepare_vector(query)
+        if self.distance == Distance.EUCLID:
+            return -np.linalg.norm(self.vectors[rows] - q, axis=1)
+
+        if len(rows) * 4 > self.size:
+            # 후보가 많으면 행렬 전체에 한 번 곱하는 게 fancy indexing 복사보다 빠름
+            return (self.vectors[:self.size] @ q)[rows]
+        return self.vectors[rows] @ q
+
+    def sparse_scores(self, name, query: SparseVector, rows):
+        postings = self.postings[name]
+        total = self.sparse_docs[name]
+        idf = self.sparse_idf.get(name, False)
+
+        acc = {}
+        for i, qv in zip(query.indices, query.values):
+            entry = postings.get(i)
+            if not entry:
+                continue
+            weight = qv
+            if idf:
+                n = len(entry)
+                weight *= math.log(1 + (total - n + 0.5) / (n + 0.5))
+            for row, v in entry.items():
+                acc[row] = acc.get(row, 0.0) + weight * v
+
+        hit_rows = np.fromiter(acc, dtype=np.int64, count=len(acc))
+        scores = np.fromiter(acc.values(), dtype=np.float32, count=len(acc))
+
+        allowed = np.zeros(self.size, dtype=bool)
+        allowed[rows] = True
+        keep = allowed[hit_rows]
+        return hit_rows[keep], scores[keep]
+
+    def vector_of(self, row):
+        dense = self.vectors[row].tolist() if self.dim is not None else None
+        if not self.sparse_names:
+            return dense
+
+        out = {} if dense is None else {"": dense}
+        for n in self.sparse_names:
+            vec = self.sparse[n][row]
+            if vec:
+                out[n] = SparseVector(indices=list(vec), values=list(vec.values()))
+        return out
+
+def _as_list(conditions):
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+def _values(payload, key):
+    if not payload:
+        return []
+    value = payload.get(key)
+    if value is None:
+        return []
+    if value is _LAZY:
+        raise _LazyValue(key)
+    return value if isinstance(value, list) else [value]
+
+def _check(cond, payload, point_id) -> bool:
+    if isinstance(cond, Filter):
+        should = _as_list(cond.should)
+        return (
+            all(_check(c, payload, point_id) for c in _as_list(cond.must))
+            and (not should or any(_check(c, payload, point_id) for c in should))
+            and not any(_check(c, payload, point_id) for c in _as_list(cond.must_not))
+        )
+
+    if isinstance(cond, FieldCondition):
+        values = _values(payload, cond.key)
+        if cond.match is not None:
+            if isinstance(cond.match, MatchValue):
+                return cond.match.value in values
+            if isinstance(cond.match, MatchAny):
+                return any(v in cond.match.any for v in values)
+            raise NotImplementedError(f"match {type(cond.match).__name__}")
+        if cond.range is not None:
+            r = cond.range
+            return any(
+                isinstance(v, (int, float))
+                and (r.lt is None or v < r.lt) and (r.lte is None or v <= r.lte)
+                and (r.gt is None or v > r.gt) and (r.gte is None or v >= r.gte)
+                for v in values
+            )
+        raise NotImplementedError(f"condition on {cond.key}")
+
+    if isinstance(cond, IsEmptyCondition):
+        return not _values(payload, cond.is_empty.key)
+
+    if isinstance(cond, IsNullCondition):
+        return payload is not None and cond.is_null.key in payload and payload[cond.is_null.key] is None
+
+    if isinstance(cond, HasIdCondition):
+        return point_id in {normalize_id(i) for i in cond.has_id}
+
+    raise NotImplementedError(type(cond).__name__)
+
+def _select_payload(payload, with_payload):
+    if not with_payload:
+        return None
+    payload = payload or {}
+    if with_payload is True:
+        return payload
+    keys = with_payload.include if isinstance(with_payload, PayloadSelectorInclude) else with_payload
+    return {k: payload[k] for k in keys if k in payload}
+
+def _fill_groups(coll, rows, scores, group_by, limit, group_size):
+    """점수 순 rows로 group 채우기 -> ({key: [(row, score)]}, limit개 group이 다 찼는지), 다 차면 바로 멈춤"""
+    groups = {}
+    full = 0
+    for r, s in zip(rows.tolist(), scores.tolist()):
+        for key in coll.values(r, group_by)[:1]:
+            hits = groups.get(key)
+            if hits is None:
+                if len(groups) >= limit:
+                    continue
+                hits = groups[key] = []
+            if len(hits) < group_size:
+                hits.append((r, s))
+                if len(hits) == group_size:
+                    full += 1
+        if full >= limit:
+            return groups, True
+    return groups, False
+
+def _top(rows, scores, limit):
+    if limit <= 0:
+        return rows[:0], scores[:0]
+    if len(rows) > limit:
+        part = np.argpartition(-scores, limit - 1)[:limit]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+class FlatVectorStore:
+    """
+        NumPy 기반 로컬 벡터 저장소 (AsyncQdrantClient 중 server/main.py가 쓰는 부분만 같은 시그니처로)
+
+        - dense 검색: 정규화된 float32 행렬에 행렬곱 한 번 + argpartition top-k (brute force, 정확)
+        - sparse 검색: term -> {row: weight} inverted index (modifier=IDF 지원)
+        - path 디렉터리를 주면 벡터는 컬렉션별 memmap 파일, payload/sparse는 SQLite side table
+          path가 None이면 전부 메모리 (테스트용)
+        - 검색(행렬곱, 순위, filter)은 asyncio.to_thread에서, 쓰기(메모리 반영 + SQLite)는 writer 스레드 하나에서
+          순서대로 -> event loop를 막지 않음, 둘 사이는 _RWLock
+          memmap은 MAP_SHARED라 프로세스가 죽어도 page cache에 남으므로 msync는 FLUSH_INTERVAL마다 모아서
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._collections = {}
+        self._conn = None
+        self._db_path = None
+        self._readers = threading.local()
+        self._reader_conns = []
+        self._lock = _RWLock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="flat-store")
+        self._flushed_at = time.monotonic()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._db_path = os.path.join(path, "store.db")
+            self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS collections (name TEXT PRIMARY KEY, config TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS points (
+                    collection TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    payload TEXT,
+                    sparse TEXT,
+                    PRIMARY KEY (collection, id)
+                )
+                """
+            )
+            self._conn.commit()
+            self._load()
+
+    # ----- 영속화 -----
+
+    def _vectors_path(self, name):
+        return os.path.join(self.path, f"{name}.f32") if self.path is not None else None
+
+    def _new_collection(self, name, config, vectors_path):
+        coll = _Collection(
+            name,
+            config["dim"],
+            Distance(config["distance"]) if config["distance"] else None,
+            config["sparse"],
+            config.get("sparse_idf"),
+            vectors_path,
+            (lambda point_id: self._read_payload(name, point_id)) if self.path is not None else None
+        )
+        for field, schema in config.get("payload_schema", {}).items():
+            coll.add_index(field, schema)
+        return coll
+
+    def _load(self):
+        """저장된 컬렉션 열기, 삭제로 생긴 빈 row가 있으면 먼저 압축"""
+        for name, raw in self._conn.execute("SELECT name, config FROM collections").fetchall():
+            config = json.loads(raw)
+            self._finish_compaction(name, config)
+
+            old_rows = np.fromiter(
+                (r for (r,) in self._conn.execute(
+                    "SELECT row FROM points WHERE collection = ? ORDER BY row", (name,)
+                )),
+                dtype=np.int64
+            )
+            if np.any(old_rows != np.arange(len(old_rows))):
+                self._compact(name, config, old_rows)
+
+            schema = config.get("payload_schema", {})
+            coll = self._new_collection(name, {**config, "payload_schema": {}}, self._vectors_path(name))
+            coll._ensure_capacity(len(old_rows))
+            points = self._conn.execute(
+                "SELECT id, payload, sparse FROM points WHERE collection = ? ORDER BY row", (name,)
+            )
+            for point_id, payload, sparse in points:
+                sparse = {
+                    n: dict(zip(*v)) for n, v in (json.loads(sparse) if sparse else {}).items()
+                }
+                coll.restore(json.loads(point_id), sparse, json.loads(payload) if payload else None)
+
+            for field, s in schema.items():
+                coll.add_index(field, s)
+            self._collections[name] = coll
+
+    def _compact(self, name, config, old_rows):
+        """
+            살아 있는 row만 앞으로 모은 벡터 파일을 .tmp에 쓰고
+            row 번호 갱신 + compacting 표시를 한 트랜잭션으로 commit 한 뒤 os.replace
+            중간에 죽으면 다음 _load의 _finish_compaction이 이어서 하거나 버림
+        """
+        vectors_path = self._vectors_path(name)
+        tmp_path = vectors_path + ".tmp"
+        dim = config["dim"]
+
+        written = False
+        if dim is not None and len(old_rows) and os.path.exists(vectors_path):
+            count = os.path.getsize(vectors_path) // (dim * 4)
+            if count:
+                old = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, dim))
+                new = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(len(old_rows), dim))
+                for start in range(0, len(old_rows), COMPACT_BLOCK):
+                    block = old_rows[start:start + COMPACT_BLOCK]
+                    valid = np.flatnonzero(block < count)
+                    new[start + valid] = old[block[valid]]
+                new.flush()
+                del old, new
+                written = True
+
+        ids = self._conn.execute(
+            "SELECT id, row FROM points WHERE collection = ? ORDER BY row", (name,)
+        ).fetchall()
+        if written:
+            config["compacting"] = True
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE points SET row = ? WHERE collection = ? AND id = ?",
+                [(new_row, name, point_id) for new_row, (point_id, old_row) in enumerate(ids) if new_row != old_row]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO collections VALUES (?, ?)", (name, json.dumps(config)))
+        self._finish_compaction(name, config)
+
+    def _finish_compaction(self, name, config):
+        vectors_path = self._vectors_path(name)
+        tmp_path = vectors_path + ".tmp"
+        if config.pop("compacting", False):
+            # row 번호는 이미 commit 됨 -> 새 파일로 교체 (이미 교체했으면 .tmp가 없음)
+            if os.path.exists(tmp_path):
+                os.replace(tmp_path, vectors_path)
+            self._store_config(name, json.dumps(config))
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)  # commit 전에 멈춘 압축
+
+    def _reader(self):
+        """검색 스레드마다 읽기 전용 연결 (WAL이라 writer와 따로 읽음)"""
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._reader_conns.append(conn)
+        return conn
+
+    def _read_payload(self, name, point_id):
+        row = self._reader().execute(
+            "SELECT payload FROM points WHERE collection = ? AND id = ?", (name, json.dumps(point_id))
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def _config_of(self, coll):
+        return json.dumps({
+            "dim": coll.dim,
+            "distance": coll.distance.value if coll.distance else None,
+            "sparse": coll.sparse_names,
+            "sparse_idf": coll.sparse_idf,
+            "payload_schema": coll.payload_schema,
+        })
+
+    # writer 스레드에서 실행
+
+    def _store_config(self, name, config):
+        if self._conn is None:
+            return
+        self._conn.execute("INSERT OR REPLACE INTO collections VALUES (?, ?)", (name, config))
+        self._conn.commit()
+
+    def _apply_upsert(self, coll, points):
+        rows = []
+        written = []
+        with self._lock.write():
+            for point_id, dense, sparse, payload in points:
+                row = coll.put(point_id, dense, sparse, payload)
+                written.append((row, payload))
+                rows.append((point_id, row, payload, sparse))
+
+        if self._conn is None:
+            return
+        self._conn.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?)", [
+            (
+                coll.name,
+                json.dumps(point_id),
+                row,
+                json.dumps(payload) if payload is not None else None,
+                json.dumps({n: [list(v), list(v.values())] for n, v in sparse.items()}) if sparse else None,
+            )
+            for point_id, row, payload, sparse in rows
+        ])
+        self._conn.commit()
+        # 이제 SQLite에서 읽을 수 있음
+        for row, payload in written:
+            if coll.pending.get(row) is payload:
+                del coll.pending[row]
+        self._flush_due()
+
+    def _apply_delete(self, coll, points_selector):
+        with self._lock.write():
+            if isinstance(points_selector, PointIdsList):
+                ids = points_selector.points
+            elif isinstance(points_selector, (FilterSelector, Filter)):
+                flt = points_selector.filter if isinstance(points_selector, FilterSelector) else points_selector
+                ids = [coll.ids[r] for r in coll.match_rows(flt).tolist()]
+            else:
+                ids = points_selector
+            removed = [json.dumps(i) for i in map(normalize_id, ids) if coll.remove(i)]
+
+        if self._conn is not None and removed:
+            self._conn.executemany(
+                "DELETE FROM points WHERE collection = ? AND id = ?", [(coll.name, i) for i in removed]
+            )
+            self._conn.commit()
+
+    def _apply_index(self, coll, field, schema):
+        with self._lock.write():
+            coll.add_index(field, schema)
+        self._store_config(coll.name, self._config_of(coll))
+
+    def _apply_drop(self, coll):
+        with self._lock.write():
+            coll.vectors = None
+        # 같은 이름으로 바로 다시 만들 수 있게 파일도 지금 지움
+        if coll.vectors_path and os.path.exists(coll.vectors_path):
+            os.remove(coll.vectors_path)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM collections WHERE name = ?", (coll.name,))
+            self._conn.execute("DELETE FROM points WHERE collection = ?", (coll.name,))
+            self._conn.commit()
+
+    def _flush_due(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed_at < FLUSH_INTERVAL:
+            return
+        self._flushed_at = now
+        for coll in list(self._collections.values()):
+            if coll.dirty:
+                coll.dirty = False
+                coll.flush()
+
+    def _shutdown(self):
+        if self._conn is None:
+            return
+        self._flush_due(force=True)
+        self._conn.close()
+
+    async def _write(self, fn, *args):
+        """fn을 writer 스레드에서 (요청 순서대로) 실행하고 끝날 때까지 기다림"""
+        future = asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+        # 호출한 task가 취소돼도 쓰기는 끝까지
+        return await asyncio.shield(future)
+
+    async def _read(self, fn, *args):
+        """검색/조회는 다른 스레드에서 (행렬곱, 순위, filter가 event loop를 막지 않게)"""
+        def run():
+            with self._lock.read():
+                return fn(*args)
+        return await asyncio.to_thread(run)
+
+    async def _save_config(self, coll):
+        await self._write(self._store_config, coll.name, self._config_of(coll))
+
+    def _coll(self, name) -> _Collection:
+        coll = self._collections.get(name)
+        if coll is None:
+            raise ValueError(f"Collection {name} not found")
+        return coll
+
+    # ----- 컬렉션 -----
+
+    async def get_collections(self):
+        return CollectionsResponse(collections=[CollectionDescription(name=n) for n in self._collections])
+
+    async def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    async def get_collection(self, collection_name: str):
+        """CollectionInfo 중 server가 보는 필드만"""
+        coll = self._coll(collection_name)
+        vectors = VectorParams(size=coll.dim, distance=coll.distance) if coll.dim is not None else {}
+        sparse = {
+            n: SparseVectorParams(modifier=Modifier.IDF if coll.sparse_idf.get(n) else None)
+            for n in coll.sparse_names
+        }
+        return SimpleNamespace(
+            points_count=len(coll.id_rows),
+            config=SimpleNamespace(params=SimpleNamespace(vectors=vectors, sparse_vectors=sparse or None)),
+            payload_schema={
+                field: SimpleNamespace(data_type=PayloadSchemaType(schema))
+                for field, schema in coll.payload_schema.items()
+            }
+        )
+
+    async def create_collection(self, collection_name: str, vectors_config=None, sparse_vectors_config=None,
+                                **kwargs) -> bool:
+        # hnsw/quantization/on_disk 옵션은 brute force라 의미 없음 (벡터는 항상 memmap)
+        if collection_name in self._collections:
+            raise ValueError(f"Collection {collection_name} already exists")
+        if isinstance(vectors_config, dict) and vectors_config:
+            raise NotImplementedError("named dense vectors")
+
+        dense = vectors_config if isinstance(vectors_config, VectorParams) else None
+        sparse_vectors_config = sparse_vectors_config or {}
+        config = {
+            "dim": dense.size if dense else None,
+            "distance": dense.distance.value if dense else None,
+            "sparse": list(sparse_vectors_config),
+            "sparse_idf": {n: p.modifier == Modifier.IDF for n, p in sparse_vectors_config.items()},
+        }
+        coll = self._new_collection(collection_name, config, self._vectors_path(collection_name))
+        self._collections[collection_name] = coll
+        await self._save_config(coll)
+        return True
+
+    async def update_collection(self, collection_name: str, **kwargs) -> bool:
+        # 바꿀 수 있는 옵션이 없음 (Qdrant처럼 바뀐 게 없으면 False)
+        self._coll(collection_name)
+        return False
+
+    async def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        coll = self._collections.pop(collection_name, None)
+        if coll is None:
+            return False
+        await self._write(self._apply_drop, coll)
+        return True
+
+    async def create_payload_index(self, collection_name: str, field_name: str, field_schema=None,
+                                   **kwargs) -> UpdateResult:
+        coll = self._coll(collection_name)
+        schema = PayloadSchemaType(field_schema).value if field_schema is not None else PayloadSchemaType.KEYWORD.value
+        await self._write(self._apply_index, coll, field_name, schema)
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    # ----- point 쓰기 -----
+
+    async def upsert(self, collection_name: str, points, wait: bool = True, **kwargs) -> UpdateResult:
+        coll = self._coll(collection_name)
+        parsed = []
+
+        for p in points:
+            dense, sparse = None, {}
+            vector = p.vector
+            if isinstance(vector, dict):
+                for name, v in vector.items():
+                    if name in ("", None):
+                        dense = v
+                    elif isinstance(v, SparseVector):
+                        sparse[name] = dict(zip(v.indices, v.values))
+                    else:
+                        sparse[name] = dict(zip(v["indices"], v["values"]))
+            else:
+                dense = vector
+
+            payload = json.loads(json.dumps(p.payload)) if p.payload is not None else None
+            parsed.append((normalize_id(p.id), dense, sparse, payload))
+
+        await self._write(self._apply_upsert, coll, parsed)
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    async def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs) -> UpdateResult:
+        coll = self._coll(collection_name)
+        await self._write(self._apply_delete, coll, points_selector)
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    # ----- point 읽기 -----
+
+    def _record(self, coll, row, with_payload, with_vectors, order_value=None):
+        return Record(
+            id=coll.ids[row],
+            payload=coll.select_payload(row, with_payload),
+            vector=coll.vector_of(row) if with_vectors else None,
+            order_value=order_value
+        )
+
+    def _retrieve(self, coll, ids, with_payload, with_vectors):
+        rows = [coll.id_rows.get(normalize_id(i)) for i in ids]
+        return [self._record(coll, r, with_payload, with_vectors) for r in rows if r is not None]
+
+    async def retrieve(self, collection_name: str, ids, with_payload=True, with_vectors=False, **kwargs):
+        return await self._read(self._retrieve, self._coll(collection_name), ids, with_payload, with_vectors)
+
+    async def count(self, collection_name: str, count_filter=None, exact: bool = True, **kwargs) -> CountResult:
+        coll = self._coll(collection_name)
+        if count_filter is None:
+            return CountResult(count=len(coll.id_rows))
+        rows = await self._read(coll.match_rows, count_filter)
+        return CountResult(count=len(rows))
+
+    async def scroll(self, collection_name: str, scroll_filter=None, limit: int = 10, order_by=None,
+                     offset=None, with_payload=True, with_vectors=False, **kwargs):
+        return await self._read(
+            self._scroll, self._coll(collection_name), scroll_filter, limit, order_by, offset, with_payload,
+            with_vectors
+        )
+
+    def _scroll(self, coll, scroll_filter, limit, order_by, offset, with_payload, with_vectors):
+        rows = coll.match_rows(scroll_filter)
+
+        if order_by is not None:
+            if isinstance(order_by, str):
+                order_by = OrderBy(key=order_by)
+            keyed = coll.order_rows(rows, order_by.key, order_by.direction == Direction.DESC, limit)
+            return [
+                self._record(coll, r, with_payload, with_vectors, order_value=v)
+                for v, r in keyed
+            ], None
+
+        # offset = 다음 페이지 첫 point id (row 순서)
+        if offset is not None:
+            start = coll.id_rows.get(normalize_id(offset))
+            if start is None:
+                return [], None
+            rows = rows[np.searchsorted(rows, start):]
+
+        page = rows[:limit + 1].tolist()
+        next_offset = coll.ids[page[limit]] if len(page) > limit else None
+        return [self._record(coll, r, with_payload, with_vectors) for r in page[:limit]], next_offset
+
+    def _ranked(self, coll, query, using, prefetch, query_filter, limit, prefetch_limit=None):
+        """(rows, scores) 점수 내림차순 limit개"""
+        rows, scores = self._scores(coll, query, using, prefetch, query_filter, prefetch_limit)
+        if scores is None:
+            return rows[:limit], np.zeros(min(limit, len(rows)), dtype=np.float32)
+        return _top(rows, scores, limit)
+
+    def _scores(self, coll, query, using, prefetch, query_filter, prefetch_limit=None):
+        """
+            후보 전체의 (rows, scores) 정렬 안 한 것, query가 없으면 scores=None (row 순서)
+            prefetch_limit을 주면 prefetch의 limit 대신 씀
+        """
+        rows = coll.match_rows(query_filter)
+
+        if prefetch:
+            prefetch = prefetch if isinstance(prefetch, list) else [prefetch]
+            results = []
+            for p in prefetch:
+                sub_filter = p.filter
+                if query_filter is not None:
+                    sub_filter = Filter(must=[query_filter] + ([p.filter] if p.filter is not None else []))
+                results.append(self._ranked(
+                    coll, p.query, p.using, p.prefetch, sub_filter, prefetch_limit or p.limit or 10, prefetch_limit
+                ))
+
+            if isinstance(query, FusionQuery):
+                if query.fusion != Fusion.RRF:
+                    raise NotImplementedError(f"fusion {query.fusion}")
+                fused = {}
+                for sub_rows, _ in results:
+                    for rank, r in enumerate(sub_rows.tolist()):
+                        fused[r] = fused.get(r, 0.0) + 1.0 / (RRF_K + rank)
+                rows = np.fromiter(fused, dtype=np.int64, count=len(fused))
+                scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+                return rows, scores
+
+            # prefetch 결과 안에서 다시 검색
+            rows = np.unique(np.concatenate([r for r, _ in results])) if results else rows
+
+        if query is None:
+            return rows, None
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+
+        if isinstance(query, SparseVector):
+            return coll.sparse_scores(using, query, rows)
+        if coll.dim is None:
+            raise ValueError(f"Collection {coll.name} has no dense vector")
+        return rows, coll.dense_scores(query, rows)
+
+    def _scored(self, coll, row, score, with_payload, with_vectors):
+        return ScoredPoint(
+            id=coll.ids[row],
+            version=0,
+            score=float(score),
+            payload=coll.select_payload(row, with_payload),
+            vector=coll.vector_of(row) if with_vectors else None
+        )
+
+    async def query_points(self, collection_name: str, query=None, using=None, prefetch=None, query_filter=None,
+                           limit: int = 10, with_payload=True, with_vectors=False, score_threshold=None,
+                           **kwargs) -> QueryResponse:
+        return await self._read(
+            self._query_points, self._coll(collection_name), query, using, prefetch, query_filter, limit,
+            with_payload, with_vectors, score_threshold
+        )
+
+    def _query_points(self, coll, query, using, prefetch, query_filter, limit, with_payload, with_vectors,
+                      score_threshold):
+        rows, scores = self._ranked(coll, query, using, prefetch, query_filter, limit)
+        return QueryResponse(points=[
+            self._scored(coll, r, s, with_payload, with_vectors)
+            for r, s in zip(rows.tolist(), scores.tolist())
+            if score_threshold is None or s >= score_threshold
+        ])
+
+    async def query_points_groups(self, collection_name: str, group_by: str, query=None, using=None, prefetch=None,
+                                  query_filter=None, limit: int = 10, group_size: int = 3, with_payload=True,
+                                  with_vectors=False, **kwargs) -> GroupsResult:
+        return await self._read(
+            self._query_points_groups, self._coll(collection_name), group_by, query, using, prefetch, query_filter,
+            limit, group_size, with_payload, with_vectors
+        )
+
+    def _query_points_groups(self, coll, group_by, query, using, prefetch, query_filter, limit, group_size,
+                             with_payload, with_vectors):
+        # Qdrant처럼 prefetch limit을 늘려서 group이 prefetch 잘림 때문에 덜 차지 않게
+        rows, scores = self._scores(coll, query, using, prefetch, query_filter, len(coll.alive))
+        if scores is None:
+            groups, _ = _fill_groups(coll, rows, np.zeros(len(rows), dtype=np.float32), group_by, limit, group_size)
+        else:
+            # 상위 k개로 group을 채워보고 모자라면 k를 늘림 (보통 한 번에 다 참)
+            k = max(limit * group_size, 1) * 4
+            while True:
+                top_rows, top_scores = _top(rows, scores, k)
+                groups, filled = _fill_groups(coll, top_rows, top_scores, group_by, limit, group_size)
+                if filled or k >= len(rows):
+                    break
+                k *= 4
+
+        return GroupsResult(groups=[
+            PointGroup(id=key, hits=[self._scored(coll, r, s, with_payload, with_vectors) for r, s in hits])
+            for key, hits in groups.items()
+        ])
+
+    async def close(self, **kwargs):
+        if self._writer is None:
+            return
+        await self._write(self._shutdown)
+        self._writer.shutdown()
+        self._writer = None
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns = []
+        self._conn = None
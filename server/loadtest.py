@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import time
+from uuid import uuid5, UUID
+
+# server/main.py 부하 테스트
+#   upsert / file-change / save-file-version / search 요청을 비율대로 섞어서 concurrency개 worker가 계속 보내고
+#   WebSocket 구독자 N개가 broadcast를 받는 동안 endpoint별 p50/p95/p99 latency, throughput을 측정
+#
+#   python -m server.loadtest --concurrency 32 --ws 20 --duration 30 --out loadtest.json
+#
+# 기본은 별도 프로세스로 서버를 띄우고 (VECTOR_STORE=local, :memory:) 임베딩은 hash 벡터 (--embed fake)
+# --url 을 주면 이미 떠 있는 서버에 보냄
+#
+# health probe: 일정 간격으로 /api/health를 따로 호출 (event loop가 막히면 이 latency가 같이 튐)
+
+DEFAULT_MIX = "upsert=40,file-change=20,version=10,search=30"
+DIM = 384
+CHUNKS_PER_FILE = 8
+PROBE_INTERVAL = 0.05  # seconds
+CHUNK_NAMESPACE = UUID("3c9a41f2-7d0e-4b6b-8f1e-52a9d3c0b7aa")
+
+WORDS = (
+    "index vector chunk file path server client embedding query search version diff cache "
+    "batch upload scan watch event queue worker thread process memory disk state hash token "
+    "model score result payload collection point filter range order limit offset page group "
+    "report quarterly revenue customer contract meeting schedule budget review project team "
+    "ECONNRESET timeout retry deadlock latency throughput"
+).split()
+
+def fake_vector(text: str, dim: int = DIM) -> list[float]:
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+class FakeModel:
+    """임베딩 모델 대신 (--embed fake), 서버 프로세스에서 encode 비용 없이 I/O 경로만"""
+
+    def encode(self, texts, **kwargs):
+        import numpy as np
+        return np.asarray([fake_vector(t) for t in texts], dtype=np.float32)
+
+# ----- 서버 프로세스 -----
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def serve(port: int, store: str, store_path: str, embed: str, backend: str):
+    """
+        spawn된 프로세스에서 uvicorn 실행
+        임베딩 캐시(.embedding_cache.db)가 repo 것과 섞이지 않게 임시 디렉터리에서
+    """
+    os.environ["VECTOR_STORE"] = store
+    if store != "qdrant":  # qdrant는 QDRANT_URL / QDRANT_API_KEY 그대로
+        os.environ["VECTOR_STORE_PATH"] = store_path
+    os.environ["EMBED_BACKEND"] = backend
+    root = os.getcwd()
+    sys.path.insert(0, root)
+    os.chdir(tempfile.mkdtemp(prefix="loadtest-server-"))
+
+    import uvicorn
+    import server.main as app_module
+
+    if embed == "fake":
+        app_module.embed_model = FakeModel()
+
+    uvicorn.run(app_module.app, host="127.0.0.1", port=port, log_level="warning")
+
+def start_server(args):
+    port = free_port()
+    ctx = multiprocessing.get_context("spawn")
+    process = ctx.Process(
+        target=serve,
+        args=(port, args.store, args.store_path, args.embed, args.backend),
+        daemon=True
+    )
+    process.start()
+    return process, f"http://127.0.0.1:{port}"
+
+async def wait_ready(http, timeout: float = 120):
+    """init_collections가 백그라운드라 health가 아니라 search가 될 때까지"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            res = await http.get("/api/search", params={"q": "ready"})
+            if res.status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+# ----- 요청 생성 -----
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise ValueError(f"unknown operation: {op} (one of {', '.join(OPERATIONS)})")
+        weights[op] = int(weight or 1)
+    return weights
+
+def words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def chunk_point(path: str, index: int, rng: random.Random) -> dict:
+    from indexer.sparse import sparse_vector
+
+    text = words(rng, rng.randint(60, 200))
+    return {
+        "id": str(uuid5(CHUNK_NAMESPACE, f"{path}#{index}")),
+        "vector": fake_vector(text),
+        "sparse": sparse_vector(f"{os.path.basename(path)}\n{text}"),
+        "payload": {"path": path, "chunk_index": index, "text": text, "start": 0, "end": len(text)},
+    }
+
+class Workload:
+    """인덱서가 보내는 모양 그대로 요청 body를 만듦 (경로는 paths개 안에서 재사용)"""
+
+    def __init__(self, rng: random.Random, paths: int, queries: int):
+        self.rng = rng
+        self.paths = [f"/loadtest/d{i % 16}/file{i:05d}.txt" for i in range(paths)]
+        self.queries = [words(rng, rng.randint(1, 4)) for _ in range(queries)]
+        self.versions = {}
+        self.sent = {}  # path -> 마지막 file-change 보낸 시각 (broadcast 지연 측정)
+
+    def path(self) -> str:
+        return self.rng.choice(self.paths)
+
+    async def upsert(self, http):
+        path = self.path()
+        point = chunk_point(path, self.rng.randrange(CHUNKS_PER_FILE), self.rng)
+        return await http.post("/api/chunks/upsert", json=point)
+
+    async def file_change(self, http):
+        path = self.path()
+        self.sent[path] = time.time()
+        return await http.post("/api/file-change", json={
+            "path": path,
+            "status": self.rng.choice(["added", "modified", "modified", "modified", "deleted"]),
+            "timestamp": time.time(),
+        })
+
+    async def version(self, http):
+        path = self.path()
+        version = self.versions[path] = self.versions.get(path, 0) + 1
+        summary = f"Added {self.rng.randint(1, 40)} lines, removed {self.rng.randint(0, 20)} lines"
+        return await http.post("/api/save-file-version", json={
+            "path": path,
+            "version": version,
+            "diff": [f"+{words(self.rng, 8)}" for _ in range(self.rng.randint(1, 10))],
+            "vector": fake_vector(summary + path),
+            "summary": summary,
+            "hash": hashlib.sha256(f"{path}{version}".encode()).hexdigest(),
+            "change_type": "modified",
+        })
+
+    async def search(self, http):
+        return await http.get("/api/search", params={"q": self.rng.choice(self.queries), "k": 5})
+
+OPERATIONS = {
+    "upsert": ("POST /api/chunks/upsert", Workload.upsert),
+    "file-change": ("POST /api/file-change", Workload.file_change),
+    "version": ("POST /api/save-file-version", Workload.version),
+    "search": ("GET /api/search", Workload.search),
+}
+
+async def preload(http, workload: Workload, files: int):
+    """검색이 빈 컬렉션을 치지 않게 파일 files개 분량의 chunk + 파일 벡터를 미리 넣음"""
+    for path in workload.paths[:files]:
+        points = [chunk_point(path, i, workload.rng) for i in range(CHUNKS_PER_FILE)]
+        (await http.post("/api/chunks/upsert-batch", json={"points": points})).raise_for_status()
+        (await http.post("/api/files/vector", json={"path": path})).raise_for_status()
+
+# ----- 측정 -----
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: v * 1000
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+    }
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name: str, seconds: float, ok: bool):
+        if ok:
+            self.latencies.setdefault(name, []).append(seconds)
+        else:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        names = sorted(set(self.latencies) | set(self.errors))
+        return {name: summarize(self.latencies.get(name, []), self.errors.get(name, 0), elapsed) for name in names}
+
+async def worker(http, workload: Workload, ops: list[str], weights: list[int], recorder: Recorder, stop_at: float):
+    while time.monotonic() < stop_at:
+        op = workload.rng.choices(ops, weights)[0]
+        name, send = OPERATIONS[op]
+        start = time.perf_counter()
+        try:
+            res = await send(workload, http)
+            ok = res.status_code < 400
+        except Exception:
+            ok = False
+        recorder.record(name, time.perf_counter() - start, ok)
+
+async def probe(http, recorder: Recorder, stop_at: float):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            ok = (await http.get("/api/health")).status_code == 200
+        except Exception:
+            ok = False
+        recorder.record("GET /api/health (probe)", time.perf_counter() - start, ok)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+async def subscriber(url: str, sent: dict, stats: dict, stop_at: float):
+    """tree-delta 메시지가 온 시각 - 그 path로 file-change를 보낸 시각 = broadcast 지연"""
+    import websockets
+
+    try:
+        async with websockets.connect(url.replace("http", "ws", 1) + "/ws/file-tree", max_size=None) as ws:
+            stats["connected"] += 1
+            while True:
+                timeout = stop_at - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                stats["messages"] += 1
+                message = json.loads(raw)
+                sent_at = sent.get(message.get("path")) if message.get("type") == "tree-delta" else None
+                if sent_at:
+                    stats["lag"].append(time.time() - sent_at)
+    except Exception as e:
+        stats["errors"] += 1
+        stats["last_error"] = repr(e)
+
+async def run(args, url: str) -> dict:
+    import httpx
+
+    mix = parse_mix(args.mix)
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    rng = random.Random(args.seed)
+    workload = Workload(rng, args.paths, args.queries)
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as http:
+        await wait_ready(http)
+
+        if args.preload:
+            start = time.perf_counter()
+            await preload(http, workload, min(args.preload, len(workload.paths)))
+            print(f"preloaded {args.preload} files in {time.perf_counter() - start:.1f}s", flush=True)
+
+        recorder = Recorder()
+        ws_stats = {"connected": 0, "messages": 0, "errors": 0, "lag": []}
+        stop_at = time.monotonic() + args.duration
+        subscribers = [asyncio.create_task(subscriber(url, workload.sent, ws_stats, stop_at)) for _ in range(args.ws)]
+        await asyncio.sleep(0.5 if args.ws else 0)  # 구독자 접속 먼저
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            probe(http, recorder, stop_at),
+            *(worker(http, workload, ops, weights, recorder, stop_at) for _ in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*subscribers)
+
+        health = (await http.get("/api/health")).json()
+
+    endpoints = recorder.report(elapsed)
+    total = sum(e["requests"] for name, e in endpoints.items() if "(probe)" not in name)
+    lag = summarize(ws_stats.pop("lag"), 0, elapsed)
+    ws_stats["lag_p50_ms"] = lag["p50_ms"]
+    ws_stats["lag_p95_ms"] = lag["p95_ms"]
+    ws_stats["lag_p99_ms"] = lag["p99_ms"]
+    ws_stats["subscribers"] = args.ws
+
+    return {
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints,
+        "websocket": ws_stats,
+        "server_health": health,
+    }
+
+def print_report(report: dict):
+    print(f"{'endpoint':<32} {'req':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, e in report["endpoints"].items():
+        print(
+            f"{name:<32} {e['requests']:>7} {e['errors']:>5} {e['throughput']:>8.1f} "
+            f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['max_ms']:>8.1f}"
+        )
+    ws = report["websocket"]
+    print(
+        f"total {report['throughput']:.1f} req/s  |  ws {ws['connected']}/{ws['subscribers']} connected, "
+        f"{ws['messages']} messages, lag p50 {ws['lag_p50_ms']:.1f} p95 {ws['lag_p95_ms']:.1f} "
+        f"p99 {ws['lag_p99_ms']:.1f} ms",
+        flush=True
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="server load test (repo root에서 python -m server.loadtest)")
+    parser.add_argument("--url", help="이미 떠 있는 서버 (없으면 별도 프로세스로 띄움)")
+    parser.add_argument("--store", choices=["local", "flat", "qdrant"], default="local", help="VECTOR_STORE")
+    parser.add_argument("--store-path", default=":memory:", help="VECTOR_STORE_PATH")
+    parser.add_argument("--embed", choices=["fake", "model"], default="fake",
+                        help="fake: hash 벡터 / model: EMBED_BACKEND 모델 로드")
+    parser.add_argument("--backend", default=os.environ.get("EMBED_BACKEND", "torch"))
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation=비율 ({', '.join(OPERATIONS)})")
+    parser.add_argument("--concurrency", type=int, default=16, help="동시에 요청을 보내는 worker 수")
+    parser.add_argument("--ws", type=int, default=10, help="WebSocket 구독자 수")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--paths", type=int, default=500, help="요청에 쓰는 서로 다른 파일 경로 수")
+    parser.add_argument("--queries", type=int, default=200, help="서로 다른 검색어 수")
+    parser.add_argument("--preload", type=int, default=200, help="시작 전에 chunk를 넣어둘 파일 수")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+
+    try:
+        report = asyncio.run(run(args, url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+
+    report.update({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "args": vars(args),
+        "platform": {
+            "python": platform.python_version(),
+            "system": platform.system(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+    })
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print("saved:", args.out, flush=True)
+
+if __name__ == "__main__":
+    main()
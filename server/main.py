@@ -1,20 +1,35 @@
 import asyncio
+import json
+import os
 import sys
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 from enum import Enum
-from time import time as now
+from time import time as now, perf_counter
 from typing import List
-from uuid import uuid4
+from uuid import uuid4, uuid5, UUID
 from pathlib import Path
 
-from fastapi import FastAPI
+import numpy as np
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from qdrant_client import QdrantClient
 from qdrant_client.http.models import PointStruct
-from qdrant_client.models import VectorParams, Distance
+from qdrant_client.models import VectorParams, Distance, Filter, FieldCondition, MatchValue, IsEmptyCondition, \
+    PayloadField, PayloadSchemaType, OrderBy, Direction, Range, SparseVectorParams, SparseVector, Modifier, Prefetch, \
+    FusionQuery, Fusion, MatchAny, VectorParamsDiff, CollectionParamsDiff
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse
 from starlette.websockets import WebSocketDisconnect, WebSocket
 
+from indexer.embed_cache import EmbeddingCache
+from indexer.embed_runtime import load_model, cache_model_name
+from indexer.sparse import query_sparse_vector
+from indexer import metrics
+from server.query_cache import QueryEmbeddingCache
+from server.batcher import MicroBatcher
+from server.metrics import MetricsMiddleware, InstrumentedStore, observe_encode
+from server.store import open_store, quantization_config, quantization_update, quantization_kind, search_params, \
+    VECTORS_ON_DISK, PAYLOAD_ON_DISK, STORAGE_MIGRATE
+
 # Windows 콘솔 UTF-8 설정
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
@@ -24,143 +39,316 @@ if sys.platform == "win32":
 client = None
 embed_model = None
 
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch | onnx | onnx-int8 (indexer/config.json의 embed_backend와 같게 둬야 캐시를 같이 씀)
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+
+# indexer와 같은 디스크 캐시 파일(.embedding_cache.db)을 공유
+embed_cache = EmbeddingCache(cache_model_name(EMBED_MODEL_NAME, EMBED_BACKEND))
+
+# 검색어 임베딩 캐시 (type-ahead/페이지 이동/새로고침으로 같은 검색어가 반복됨)
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 600  # seconds
+query_cache = QueryEmbeddingCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
 def get_client():
+    # 저장소는 VECTOR_STORE 환경변수로 선택 (server/store.py), 호출 시간은 /api/metrics
     global client
     if client is None:
-        client = QdrantClient(url="https://qdrant.drakedognas.synology.me", port=443, https=True)
+        client = InstrumentedStore(open_store())
     return client
 
 def get_embed_model():
     global embed_model
     if embed_model is None:
-        from sentence_transformers import SentenceTransformer
-        print("[LOAD] Loading embedding model...")
-        embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+        print(f"[LOAD] Loading embedding model ({EMBED_BACKEND})...")
+        embed_model = load_model(EMBED_MODEL_NAME, EMBED_BACKEND)
         print("[OK] Embedding model loaded")
     return embed_model
 
+def model_encode(texts: list[str]) -> list[list[float]]:
+    start = perf_counter()
+    vectors = get_embed_model().encode(texts).tolist()
+    observe_encode(perf_counter() - start, len(texts))
+    return vectors
+
+def encode_texts(texts: list[str]) -> list[list[float]]:
+    """캐시에 없는 텍스트만 모델로 임베딩"""
+    return embed_cache.encode(texts, model_encode)
+
+# 검색 / diff / indexer(/api/embed) 요청을 모아서 모델 하나로 batch encode
+EMBED_MAX_BATCH = 64
+EMBED_MAX_WAIT = 0.005  # seconds
+embed_batcher = MicroBatcher(encode_texts, max_batch=EMBED_MAX_BATCH, max_wait=EMBED_MAX_WAIT)
+
+async def encode_texts_async(texts: list[str]) -> list[list[float]]:
+    """모델 encode / 캐시 sqlite I/O는 event loop 밖(thread)에서, 동시에 온 요청끼리 batch"""
+    return await embed_batcher.submit(texts)
+
+async def encode_query(q: str) -> list[float]:
+    """검색어 임베딩 (같은 검색어면 모델/디스크 캐시까지 가지 않음)"""
+    async def encode(query):
+        return (await encode_texts_async([query]))[0]
+
+    return await query_cache.get(q, encode)
+
+# files 컬렉션의 lexical(BM25) sparse vector 이름
+SPARSE_VECTOR_NAME = "text"
+# fusion 전에 dense / sparse 각각에서 가져올 후보 수
+SEARCH_PREFETCH_LIMIT = 50
+
+# 2단계 검색: 파일 단위 벡터로 후보 파일을 먼저 고르고 그 안의 chunk만 dense 검색
+# (후보 파일 수 = 요청한 파일 수 * SEARCH_CANDIDATE_FACTOR)
+SEARCH_CANDIDATE_FACTOR = 4
+
+# 예전 file_changes는 dummy [0.0] 벡터가 있는 컬렉션 -> 시작 시 확인해서 그때만 dummy 벡터를 넣음
+file_changes_legacy = False
+
+# 기존 dense 전용 files 컬렉션에는 sparse vector를 추가할 수 없음 -> 시작 시 확인해서 dense 검색만
+hybrid_enabled = False
+
+# hybrid_enabled / file_changes_legacy는 init_collections가 끝나야 정해짐
+# -> 그 전에 온 chunk/file-change 쓰기와 이력(diff/version/changed-files) 요청은 끝날 때까지 기다림
+#    (sparse 벡터를 잃지 않고, 없는 컬렉션을 읽지 않게), 너무 오래 걸리면 503
+INIT_WAIT_TIMEOUT = 60  # seconds
+collections_ready = asyncio.Event()
+
+async def wait_collections_ready():
+    if collections_ready.is_set():
+        return
+    try:
+        await asyncio.wait_for(collections_ready.wait(), INIT_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="collections are still initializing")
+
+def chunk_vector(data) -> list[float] | dict:
+    if hybrid_enabled and data.sparse is not None:
+        return {"": data.vector, SPARSE_VECTOR_NAME: SparseVector(**data.sparse.model_dump())}
+    return data.vector
+
+def path_filter(path: str, **fields) -> Filter:
+    return Filter(must=[
+        FieldCondition(key=key, match=MatchValue(value=value))
+        for key, value in {"path": path, **fields}.items()
+    ])
+
+# 클라이언트별 송신 queue 크기 (넘치면 밀린 메시지를 버리고 스냅샷 하나로 대체)
+WS_QUEUE_SIZE = 256
+WS_SEND_TIMEOUT = 10  # seconds
+
+_RESYNC = object()
+
+class ClientConnection:
+    """
+        연결 하나 = bounded 송신 queue + sender task
+        socket에 쓰는 건 sender task 하나뿐 (broadcast는 queue에 넣기만 하고 기다리지 않음)
+    """
+
+    def __init__(self, websocket: WebSocket, snapshot, on_close):
+        self.websocket = websocket
+        self.snapshot = snapshot
+        self.on_close = on_close
+        self.queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.resync_pending = False
+        self.dropped = 0
+        self.task = asyncio.create_task(self._send_loop())
+
+    def send(self, text: str):
+        if self.resync_pending:
+            return  # 어차피 스냅샷을 받을 예정
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self):
+        """밀린 메시지를 버리고 보낼 때 시점의 전체 스냅샷 하나로"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.resync_pending = True
+        self.queue.put_nowait(_RESYNC)
+
+    async def _send_loop(self):
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is _RESYNC:
+                    self.resync_pending = False
+                    item = json.dumps(self.snapshot())
+                await asyncio.wait_for(self.websocket.send_text(item), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not isinstance(e, WebSocketDisconnect):
+                print("WS send error:", e)
+                # 느리거나 끊긴 클라이언트: 소켓을 닫아야 클라이언트가 재접속 후 스냅샷을 받음
+                # (receive 루프도 disconnect를 받고 정리됨)
+                try:
+                    await asyncio.wait_for(self.websocket.close(code=1011), WS_SEND_TIMEOUT)
+                except Exception:
+                    pass
+            self.on_close(self)
+
+    def close(self):
+        self.task.cancel()
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.active_connections: dict[WebSocket, ClientConnection] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        conn = ClientConnection(websocket, self.snapshot, self._closed)
+        self.active_connections[websocket] = conn
+        return conn
+
+    def _closed(self, conn: ClientConnection):
+        self.disconnect(conn.websocket)
 
     def disconnect(self, websocket: WebSocket):
-        try:
-            self.active_connections.remove(websocket)
-        except ValueError:
-            pass
+        conn = self.active_connections.pop(websocket, None)
+        if conn is not None:
+            conn.close()
+
+    def resync_all(self):
+        for conn in list(self.active_connections.values()):
+            conn.resync()
 
     async def broadcast(self, message: dict):
-        dead_connections = []
-
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except WebSocketDisconnect:
-                dead_connections.append(connection)
-            except Exception as e:
-                print("WS send error:", e)
-                dead_connections.append(connection)
+        # 직렬화는 메시지당 한 번, 클라이언트 수와 상관없이 바로 반환
+        text = json.dumps(message)
+        for conn in list(self.active_connections.values()):
+            conn.send(text)
 
-        for dc in dead_connections:
-            self.disconnect(dc)
+PING_MESSAGE = json.dumps({"type": "ping"})
 
-manager = ConnectionManager()
+manager = ConnectionManager(snapshot=lambda: file_tree.snapshot_message())
 
-async def notify_file_change(action: str, path: str, node: dict | None = None):
-    await manager.broadcast({
-        "type": "file-changed",
-        "action": action,
-        "path": path,
-        "node": node
-    })
+metrics.gauge("server_ws_clients", "Connected WebSocket clients", lambda: len(manager.active_connections))
+metrics.gauge("server_embed_queue_depth", "Embed requests waiting for the micro-batcher", embed_batcher.queue_depth)
+metrics.gauge("server_query_cache_entries", "Cached query embeddings", lambda: query_cache.stats()["entries"])
 
-def get_latest_diff(path: str):
+async def get_latest_diff(path: str):
+    await wait_collections_ready()
     client = get_client()
-    points, _ = client.scroll(
+    points, _ = await client.scroll(
         collection_name="file_diffs",
         with_payload=True,
-        scroll_filter={
-            "must": [
-                {
-                    "key": "path",
-                    "match": {"value": path}
-                }
-            ]
-        },
-        limit=50
+        scroll_filter=path_filter(path),
+        order_by=OrderBy(key="timestamp", direction=Direction.DESC),
+        limit=1
     )
 
     if not points:
         return None
 
-    latest = max(points, key=lambda p: p.payload["timestamp"])
-    return latest.payload
+    return points[0].payload
 
-def build_tree(file_changes: list[dict]):
-    root = {}
+def split_path(path: str) -> list[str]:
+    return path.replace("\\", "/").split("/")
 
-    for meta in file_changes:
-        path = meta["path"]
-        status = meta["status"]
+class FileTreeIndex:
+    """
+        path trie (메모리) - 변경 하나 적용이 O(depth)
+        변경마다 seq 증가, 클라이언트는 seq로 빠진 delta를 감지하고 resync 요청
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.seq = 0
 
-        parts = path.replace("\\", "/").split("/")
-        cur = root
+    def set(self, path: str, status: str, overwrite: bool = True) -> bool:
+        parts = split_path(path)
+        cur = self.root
 
         for part in parts[:-1]:
-            cur = cur.setdefault(part, {})
+            nxt = cur.get(part)
+            if nxt is None or "_file" in nxt:
+                nxt = cur[part] = {}
+            cur = nxt
+
+        leaf = cur.get(parts[-1])
+        if leaf is not None and not overwrite:
+            return False
 
         cur[parts[-1]] = {
             "_file": True,
             "status": status,
             "path": path
         }
+        return True
+
+    def apply(self, path: str, status: str) -> dict:
+        """변경 적용 후 브로드캐스트할 delta 반환"""
+        self.set(path, status)
+        self.seq += 1
+        return {
+            "type": "tree-delta",
+            "seq": self.seq,
+            "path": path,
+            "status": status
+        }
+
+    def load(self, file_changes: list[dict]):
+        """
+            시작 시 한 번 로드 (로드 전에 이미 들어온 실시간 변경은 덮어쓰지 않음)
+            트리가 바뀌었으므로 seq 증가 -> 그 전에 접속한 클라이언트는 resync 해야 함
+        """
+        for meta in file_changes:
+            self.set(meta["path"], meta["status"], overwrite=False)
+        self.seq += 1
+
+    def snapshot(self) -> dict:
+        def to_node(name, obj):
+            if "_file" in obj:
+                return {
+                    "name": name,
+                    "type": "file",
+                    "status": obj["status"],
+                    "path": obj["path"]
+                }
 
-    def to_node(name, obj):
-        if "_file" in obj:
             return {
                 "name": name,
-                "type": "file",
-                "status": obj["status"],
-                "path": obj["path"]
+                "type": "dir",
+                "children": [
+                    to_node(k, v) for k, v in obj.items()
+                ]
             }
 
         return {
-            "name": name,
+            "name": "root",
             "type": "dir",
             "children": [
-                to_node(k, v) for k, v in obj.items()
+                to_node(k, v) for k, v in self.root.items()
             ]
         }
 
-    return {
-        "name": "root",
-        "type": "dir",
-        "children": [
-            to_node(k, v) for k, v in root.items()
-        ]
-    }
+    def snapshot_message(self) -> dict:
+        return {
+            "type": "tree",
+            "seq": self.seq,
+            "tree": self.snapshot()
+        }
 
-def build_tree_from_qdrant():
-    client = get_client()
-    records = client.scroll(
-        collection_name="file_changes",
-        with_payload=True,
-        limit=10_000
-    )[0]
+def build_tree(file_changes: list[dict]):
+    tree = FileTreeIndex()
+    for meta in file_changes:
+        tree.set(meta["path"], meta["status"])
+    return tree.snapshot()
 
-    changes = [r.payload for r in records]
-    return build_tree(changes)
+file_tree = FileTreeIndex()
 
-async def notify_tree_update():
-    tree = build_tree_from_qdrant()
-    await manager.broadcast({
-        "type": "tree",
-        "tree": tree
-    })
+async def load_file_tree():
+    file_tree.load(await latest_file_changes())
+    # init 중에 접속한 클라이언트는 빈 트리를 받았으므로 전체 스냅샷 다시
+    manager.resync_all()
+    print("[OK] File tree loaded")
+
+async def notify_tree_delta(path: str, status: str):
+    await manager.broadcast(file_tree.apply(path, status))
 
 class FileStatus(str, Enum):
     added = "added"
@@ -188,72 +376,476 @@ class FileVersionData(BaseModel):
     hash: str
     change_type: str
 
+class SparseData(BaseModel):
+    indices: list[int]
+    values: list[float]
+
 class ChunkData(BaseModel):
     id: str
     vector: list[float]
     payload: dict
+    sparse: SparseData | None = None
+
+class ChunkBatch(BaseModel):
+    points: list[ChunkData]
+
+class EmbedRequest(BaseModel):
+    texts: list[str]
 
 class DiffPayload(BaseModel):
     path: str
     old_text: str
     new_text: str
 
+# 파일 단위 벡터 (file_vectors) - 파일의 chunk 벡터 평균, path당 point 1개
+#   payload에 chunk 벡터 합(sum)과 개수(chunks)를 두고 chunk upsert/delete 때 차이만 더함
+#   (path별 lock으로 chunk 조회 ~ file_vectors 갱신을 묶음 -> 같은 chunk를 두 요청이 같이 세지 않음)
+FILE_VECTOR_NAMESPACE = UUID("0b4e7f55-1c8e-4b5a-9e0d-7a3f2d6c8e41")
+_file_vector_locks = [asyncio.Lock() for _ in range(64)]
+
+def file_vector_id(path: str) -> str:
+    return str(uuid5(FILE_VECTOR_NAMESPACE, path))
+
+def dense_vector(vector) -> list[float]:
+    # sparse vector가 같이 있는 컬렉션이면 {"": dense, "text": sparse}
+    return vector[""] if isinstance(vector, dict) else vector
+
+def unit_vector(vector) -> np.ndarray:
+    # cosine 컬렉션은 저장할 때 정규화하므로 새로 들어온 벡터도 같게 맞춰서 더함
+    v = np.asarray(dense_vector(vector), dtype=np.float64)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+def is_chunk(payload) -> bool:
+    # /api/files/index 로 들어온 예전 파일 단위 point는 chunk가 아님
+    return bool(payload) and "path" in payload and "chunk_index" in payload
+
+def file_vector_point(path: str, total: np.ndarray, count: int) -> PointStruct:
+    mean = total / count
+    norm = np.linalg.norm(mean)
+    return PointStruct(
+        id=file_vector_id(path),
+        vector=(mean / norm if norm else mean).astype(np.float32).tolist(),
+        payload={"path": path, "chunks": count, "sum": total.tolist()}
+    )
+
+def add_chunk_delta(deltas: dict, payload, vector, sign: int):
+    """deltas[path] = [벡터 합 차이, 개수 차이]"""
+    if not is_chunk(payload):
+        return
+    entry = deltas.setdefault(payload["path"], [0.0, 0])
+    entry[0] = entry[0] + sign * unit_vector(vector)
+    entry[1] += sign
+
+def file_vector_stripes(paths) -> list[asyncio.Lock]:
+    # 여러 path를 같이 잡을 때는 항상 같은 순서로 (deadlock 방지)
+    return [_file_vector_locks[i] for i in sorted({hash(p) % len(_file_vector_locks) for p in paths})]
+
+@asynccontextmanager
+async def file_vectors_locked(paths):
+    """paths의 chunk 조회 ~ file_vectors 갱신을 묶어서 (그 사이 같은 chunk를 다른 요청이 세지 않게)"""
+    async with AsyncExitStack() as stack:
+        for lock in file_vector_stripes(paths):
+            await stack.enter_async_context(lock)
+        yield
+
+async def chunk_deltas(ids: list[str]) -> dict:
+    """지금 저장된 chunk들을 빼는 delta (upsert로 덮어쓰거나 delete 하기 전에, file_vectors_locked 안에서)"""
+    deltas = {}
+    if not ids:
+        return deltas
+    existing = await get_client().retrieve(
+        collection_name="files", ids=ids, with_payload=["path", "chunk_index"], with_vectors=True
+    )
+    for p in existing:
+        add_chunk_delta(deltas, p.payload, p.vector, -1)
+    return deltas
+
+async def chunk_paths(ids: list[str]) -> set[str]:
+    """delete 요청은 id만 오므로 lock 잡을 path를 먼저 (벡터 없이)"""
+    existing = await get_client().retrieve(collection_name="files", ids=ids, with_payload=["path", "chunk_index"])
+    return {p.payload["path"] for p in existing if is_chunk(p.payload)}
+
+async def count_chunks(path: str) -> int:
+    result = await get_client().count(
+        collection_name="files",
+        count_filter=Filter(
+            must=path_filter(path).must,
+            must_not=[IsEmptyCondition(is_empty=PayloadField(key="chunk_index"))]
+        ),
+        exact=True
+    )
+    return result.count
+
+async def rebuild_file_vector(path: str) -> tuple[np.ndarray | None, int]:
+    """path의 chunk를 전부 훑어서 (벡터 합, 개수) - sum이 없거나 개수가 안 맞을 때만"""
+    total = None
+    count = 0
+    async for p in scroll_all("files", path_filter(path), with_vectors=True):
+        if not is_chunk(p.payload):
+            continue
+        v = unit_vector(p.vector)
+        total = v if total is None else total + v
+        count += 1
+    return total, count
+
+async def write_file_vectors(changes: dict, expected_counts: dict | None = None) -> dict:
+    """
+        changes[path] = (벡터 합 차이 | None, 개수 차이) 를 file_vectors에 반영 -> {path: 개수}
+        file_vectors_locked(changes) 안에서 호출, 조회/저장/삭제는 path 수와 상관없이 한 번씩
+        저장된 sum이 없거나 expected_counts와 개수가 다르면 chunk를 훑어서 다시 만듦 (이때 delta는 버림)
+    """
+    client = get_client()
+    ids = {file_vector_id(path): path for path in changes}
+    existing = await client.retrieve(collection_name="file_vectors", ids=list(ids), with_payload=True)
+    stored = {ids[str(p.id)]: p.payload for p in existing}
+
+    counts, points, removed = {}, [], []
+    for path, (delta, delta_count) in changes.items():
+        payload = stored.get(path)
+        expected = (expected_counts or {}).get(path)
+
+        if payload and "sum" in payload and (expected is None or payload.get("chunks", 0) == expected):
+            if not delta_count and delta is None:
+                counts[path] = payload.get("chunks", 0)
+                continue
+            total = np.asarray(payload["sum"], dtype=np.float64)
+            if delta is not None:
+                total = total + delta
+            count = payload.get("chunks", 0) + delta_count
+        else:
+            # 이미 반영된 chunk 작업까지 포함해서 다시 셈
+            total, count = await rebuild_file_vector(path)
+
+        if count <= 0 or total is None:
+            counts[path] = 0
+            if payload is not None:
+                removed.append(file_vector_id(path))
+            continue
+
+        counts[path] = count
+        points.append(file_vector_point(path, total, count))
+
+    if points:
+        await client.upsert(collection_name="file_vectors", points=points)
+    if removed:
+        await client.delete(collection_name="file_vectors", points_selector=removed)
+    return counts
+
+async def update_file_vector(path: str, delta=None, delta_count: int = 0) -> int:
+    """file_vectors의 path 항목에 chunk 벡터 합/개수 차이를 반영 (chunk가 없어지면 삭제)"""
+    async with file_vectors_locked([path]):
+        counts = await write_file_vectors({path: (delta, delta_count)})
+    return counts[path]
+
+async def apply_chunk_deltas(deltas: dict):
+    """file_vectors_locked 안에서 호출"""
+    changes = {path: (delta, count) for path, (delta, count) in deltas.items() if count or np.any(delta)}
+    if changes:
+        await write_file_vectors(changes)
+
+async def backfill_file_vectors():
+    """file_vectors를 기존 chunk에서 채움 (완료 표시 전에 죽었으면 다음 시작 때 다시)"""
+    totals = {}
+    counts = {}
+
+    async for p in scroll_all("files", with_vectors=True):
+        if not is_chunk(p.payload):
+            continue
+        path = p.payload["path"]
+        vector = unit_vector(p.vector)
+        totals[path] = totals[path] + vector if path in totals else vector
+        counts[path] = counts.get(path, 0) + 1
+
+    if not totals:
+        return
+
+    client = get_client()
+    points = [file_vector_point(path, total, counts[path]) for path, total in totals.items()]
+    for i in range(0, len(points), 500):
+        await client.upsert(collection_name="file_vectors", points=points[i:i + 500])
+    print(f"[OK] Backfilled 'file_vectors' with {len(points)} paths")
+
+# 한 번만 하는 작업 (backfill)의 완료 표시 - 컬렉션을 만든 뒤 backfill 중에 죽으면 다음 시작 때 다시 함
+META_NAMESPACE = UUID("3c9a6e0b-5d2f-4f8e-b1a4-8e7d2c5f1a96")
+
+def meta_id(key: str) -> str:
+    return str(uuid5(META_NAMESPACE, key))
+
+async def is_done(key: str) -> bool:
+    found = await get_client().retrieve(collection_name="server_meta", ids=[meta_id(key)], with_payload=True)
+    return bool(found) and bool(found[0].payload.get("done"))
+
+async def mark_done(key: str):
+    await get_client().upsert(
+        collection_name="server_meta",
+        points=[PointStruct(id=meta_id(key), vector={}, payload={"key": key, "done": True, "timestamp": now()})]
+    )
+
+# path별 최신 상태 (file_latest) - 히스토리 전체를 훑지 않고 path당 point 1개를 직접 조회
+LATEST_NAMESPACE = UUID("6f1d3c2e-8b1a-4d43-9a57-2f0c6c1e9b7d")
+_latest_locks = [asyncio.Lock() for _ in range(64)]
+
+def latest_id(path: str) -> str:
+    return str(uuid5(LATEST_NAMESPACE, path))
+
+async def update_latest(path: str, fields: dict):
+    """file_latest의 path 항목에 fields를 merge (같은 path 동시 갱신은 lock으로 직렬화)"""
+    client = get_client()
+    point_id = latest_id(path)
+
+    async with _latest_locks[hash(path) % len(_latest_locks)]:
+        existing = await client.retrieve(
+            collection_name="file_latest",
+            ids=[point_id],
+            with_payload=True
+        )
+        payload = dict(existing[0].payload) if existing else {"path": path}
+        payload.update(fields)
+
+        await client.upsert(
+            collection_name="file_latest",
+            points=[PointStruct(id=point_id, vector={}, payload=payload)]
+        )
+
+async def scroll_all(collection_name: str, scroll_filter=None, page_size: int = 1000, with_vectors=False):
+    """offset 커서로 끝까지 페이지 순회"""
+    client = get_client()
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            with_payload=True,
+            with_vectors=with_vectors,
+            limit=page_size,
+            offset=offset
+        )
+        for p in points:
+            yield p
+        if offset is None:
+            break
+
+async def backfill_file_latest():
+    """file_latest를 기존 히스토리에서 채움 (완료 표시 전에 죽었으면 다음 시작 때 다시)"""
+    latest = {}
+
+    async for p in scroll_all("file_changes"):
+        path = p.payload["path"]
+        entry = latest.setdefault(path, {"path": path})
+        if p.payload["timestamp"] >= entry.get("change_timestamp", float("-inf")):
+            entry["status"] = p.payload["status"]
+            entry["change_timestamp"] = p.payload["timestamp"]
+
+    async for p in scroll_all("file_versions"):
+        path = p.payload["path"]
+        entry = latest.setdefault(path, {"path": path})
+        if p.payload["version"] >= entry.get("version", float("-inf")):
+            entry["version"] = p.payload["version"]
+            entry["version_timestamp"] = p.payload["timestamp"]
+
+    if not latest:
+        return
+
+    client = get_client()
+    payloads = list(latest.values())
+    for i in range(0, len(payloads), 500):
+        await client.upsert(
+            collection_name="file_latest",
+            points=[
+                PointStruct(id=latest_id(payload["path"]), vector={}, payload=payload)
+                for payload in payloads[i:i + 500]
+            ]
+        )
+    print(f"[OK] Backfilled 'file_latest' with {len(payloads)} paths")
+
+# 히스토리 조회용 payload index (path 필터 + version/timestamp 정렬)
+PAYLOAD_INDEXES = {
+    "files": {"path": PayloadSchemaType.KEYWORD},
+    "file_changes": {"path": PayloadSchemaType.KEYWORD, "timestamp": PayloadSchemaType.FLOAT},
+    "file_diffs": {"path": PayloadSchemaType.KEYWORD, "timestamp": PayloadSchemaType.FLOAT},
+    "file_versions": {
+        "path": PayloadSchemaType.KEYWORD,
+        "version": PayloadSchemaType.INTEGER,
+        "timestamp": PayloadSchemaType.FLOAT,
+    },
+    "file_latest": {"path": PayloadSchemaType.KEYWORD},
+    "file_vectors": {"path": PayloadSchemaType.KEYWORD},
+}
+
+async def ensure_payload_indexes():
+    """없는 index만 생성 (재시작해도 다시 만들지 않음)"""
+    client = get_client()
+
+    for collection_name, fields in PAYLOAD_INDEXES.items():
+        info = await client.get_collection(collection_name)
+        existing = info.payload_schema or {}
+
+        for field_name, schema in fields.items():
+            if field_name in existing:
+                continue
+            await client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema,
+                wait=True
+            )
+            print(f"[OK] Created payload index '{collection_name}.{field_name}'")
+
+# 양자화 / on-disk 옵션을 적용하는 컬렉션 (server/store.py 환경변수로 설정)
+DENSE_COLLECTIONS = ["files", "file_versions", "file_diffs"]
+
+def dense_collection_options() -> dict:
+    return {
+        "vectors_config": VectorParams(size=384, distance=Distance.COSINE, on_disk=VECTORS_ON_DISK),
+        "quantization_config": quantization_config(),
+        "on_disk_payload": PAYLOAD_ON_DISK,
+    }
+
+async def apply_storage_options(collection_name: str):
+    """
+        이미 있는 컬렉션의 양자화 / on-disk 설정이 현재 설정과 다르면
+        VECTOR_STORAGE_MIGRATE=1일 때만 갱신 (Qdrant가 백그라운드에서 재구성), 아니면 뭐가 다른지 로그만
+    """
+    client = get_client()
+    info = await client.get_collection(collection_name)
+    config = info.config
+    vectors = config.params.vectors
+
+    current_quantization = getattr(config, "quantization_config", None)
+    changes = []
+    if current_quantization != quantization_config():
+        changes.append(f"quantization {quantization_kind(current_quantization)} -> {quantization_kind(quantization_config())}")
+    if bool(getattr(vectors, "on_disk", False)) != VECTORS_ON_DISK:
+        changes.append(f"vectors on_disk -> {VECTORS_ON_DISK}")
+    if bool(getattr(config.params, "on_disk_payload", False)) != PAYLOAD_ON_DISK:
+        changes.append(f"payload on_disk -> {PAYLOAD_ON_DISK}")
+    if not changes:
+        return
+
+    if not STORAGE_MIGRATE:
+        print(
+            f"[WARN] '{collection_name}' storage options differ from settings ({', '.join(changes)}) "
+            "- set VECTOR_STORAGE_MIGRATE=1 to update the existing collection"
+        )
+        return
+
+    updated = await client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=VECTORS_ON_DISK)},
+        quantization_config=quantization_update(),
+        collection_params=CollectionParamsDiff(on_disk_payload=PAYLOAD_ON_DISK)
+    )
+    # 로컬 저장소(flat / qdrant 내장 모드)는 옵션을 쓰지 않아서 False
+    if updated:
+        print(f"[OK] Updated storage options for '{collection_name}' ({', '.join(changes)})")
+
 # 🔥 백그라운드 초기화 태스크
 async def init_collections():
     """백그라운드에서 컬렉션 초기화"""
     print("[INFO] Initializing Qdrant collections...")
     client = get_client()
 
-    collections = client.get_collections().collections
+    collections = (await client.get_collections()).collections
     names = {c.name for c in collections}
 
+    global hybrid_enabled, file_changes_legacy
     if "files" not in names:
-        client.create_collection(
+        await client.create_collection(
             collection_name="files",
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+            sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)},
+            **dense_collection_options()
         )
         print("[OK] Created 'files' collection")
 
+    sparse_vectors = (await client.get_collection("files")).config.params.sparse_vectors or {}
+    hybrid_enabled = SPARSE_VECTOR_NAME in sparse_vectors
+    if not hybrid_enabled:
+        print("[WARN] 'files' has no sparse vector - dense-only search (recreate the collection and reindex for hybrid search)")
+
     if "file_changes" not in names:
-        client.create_collection(
+        # 이벤트 기록만 하는 컬렉션이라 벡터 없음
+        await client.create_collection(
             collection_name="file_changes",
-            vectors_config=VectorParams(size=1, distance=Distance.COSINE)
-            # vectors_config=None
+            vectors_config={}
         )
         print("[OK] Created 'file_changes' collection")
 
+    file_changes_legacy = bool((await client.get_collection("file_changes")).config.params.vectors)
+
     if "file_diffs" not in names:
-        client.create_collection(
+        await client.create_collection(
             collection_name="file_diffs",
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+            **dense_collection_options()
         )
         print("[OK] Created 'file_diffs' collection")
 
     if "file_versions" not in names:
-        client.create_collection(
+        await client.create_collection(
             collection_name="file_versions",
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+            **dense_collection_options()
         )
         print("[OK] Created 'file_versions' collection")
 
+    for name in DENSE_COLLECTIONS:
+        await apply_storage_options(name)
+
+    if "server_meta" not in names:
+        # backfill 완료 표시 (payload만, 벡터 없음)
+        await client.create_collection(
+            collection_name="server_meta",
+            vectors_config={}
+        )
+        print("[OK] Created 'server_meta' collection")
+
+    if "file_latest" not in names:
+        # path당 1개 point (payload만, 벡터 없음)
+        await client.create_collection(
+            collection_name="file_latest",
+            vectors_config={}
+        )
+        print("[OK] Created 'file_latest' collection")
+
+    if "file_vectors" not in names:
+        await client.create_collection(
+            collection_name="file_vectors",
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+        )
+        print("[OK] Created 'file_vectors' collection")
+
+    # 완료 표시가 있을 때만 건너뜀 (컬렉션만 만들고 backfill 전에 죽은 경우도 다시 채움)
+    await ensure_payload_indexes()
+    for key, backfill in (("backfill:file_latest", backfill_file_latest),
+                          ("backfill:file_vectors", backfill_file_vectors)):
+        if not await is_done(key):
+            await backfill()
+            await mark_done(key)
+
+    collections_ready.set()
     print("[OK] Qdrant collections ready")
 
 async def warmup_model():
     """백그라운드에서 임베딩 모델 로드"""
     await asyncio.sleep(0.1)  # 서버 시작 우선순위
-    get_embed_model()
+    await asyncio.to_thread(get_embed_model)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("[START] Server starting...")
 
+    async def init():
+        await init_collections()
+        await load_file_tree()
+
     # 백그라운드 태스크로 실행 (블로킹 안 함)
-    asyncio.create_task(init_collections())
+    asyncio.create_task(init())
     asyncio.create_task(warmup_model())
 
     print("[READY] Server ready (background tasks running)")
     yield
     print("[STOP] Server shutting down")
+    # 이미 받은 임베딩 요청은 끝내고 종료
+    await embed_batcher.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -264,15 +856,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/api/health")
-def health():
+async def health():
     return {
         "status": "ok",
         "embed_model_loaded": embed_model is not None,
-        "client_initialized": client is not None
+        "client_initialized": client is not None,
+        "collections_ready": collections_ready.is_set(),
+        "embed_cache": embed_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "embed_batcher": embed_batcher.stats()
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    # Prometheus text format (gauge 값은 이때 읽음)
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 WATCH_PATHS = []
 class PathData(BaseModel):
     path: str
@@ -293,130 +895,232 @@ def set_watch_path(path: PathData):
 
 
 @app.get("/api/watch-paths")
-def get_watch_path():
+async def get_watch_path():
     return WATCH_PATHS
 
+def latest_file_entry(point) -> dict:
+    return {
+        "path": point.payload["path"],
+        "version": point.payload["version"],
+        "timestamp": point.payload["version_timestamp"],
+    }
+
 @app.get("/api/files")
-def list_files():
-    points, _ = client.scroll(
-        collection_name="file_versions",
+async def list_files(limit: int | None = None, cursor: str | None = None):
+    """
+        파일별 최신 버전 목록 (예전처럼 전체 list)
+        limit/cursor를 주면 한 페이지씩 {"files", "next_cursor"} (다음 페이지는 cursor=next_cursor)
+    """
+    await wait_collections_ready()
+    has_version = Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="version"))])
+
+    if limit is None and cursor is None:
+        return [latest_file_entry(p) async for p in scroll_all("file_latest", has_version)]
+
+    points, next_cursor = await get_client().scroll(
+        collection_name="file_latest",
+        scroll_filter=has_version,
         with_payload=True,
         with_vectors=False,
-        limit=10_000
+        limit=limit or 1000,
+        offset=cursor
     )
-
-    latest = {}
-
-    for p in points:
-        path = p.payload["path"]
-        v = p.payload["version"]
-
-        if path not in latest or v > latest[path]["version"]:
-            latest[path] = {
-                "path": path,
-                "version": v,
-                "timestamp": p.payload["timestamp"],
-            }
-
-    return list(latest.values())
+    return {"files": [latest_file_entry(p) for p in points], "next_cursor": next_cursor}
 
 @app.post("/api/files/index")
-def index_file(data: FileData):
-    client = get_client()
-    client.upsert(
-        collection_name="files",
-        points=[
-            {
-                "id": data.hash,
-                "vector": data.embedding,
-                "payload": {"path": data.path, "summary": data.summary}
-            }
-        ]
-    )
+async def index_file(data: FileData):
+    # 예전 indexer 호환용 - 파일 단위 벡터는 chunk에서 계산하므로 file_vectors의 running sum을 덮어쓰지 않음
     return {"status": "ok"}
 
+@app.post("/api/files/vector")
+async def refresh_file_vector(data: PathData):
+    """
+        indexer가 파일의 chunk를 올리고/지운 뒤 호출
+        chunk upsert/delete가 이미 반영하므로 보통은 개수만 맞춰봄
+        (sum이 없는 예전 point거나 실제 chunk 개수와 다르면 다시 계산)
+    """
+    await wait_collections_ready()
+    async with file_vectors_locked([data.path]):
+        expected = await count_chunks(data.path)
+        counts = await write_file_vectors({data.path: (None, 0)}, {data.path: expected})
+    return {"ok": True, "chunks": counts[data.path]}
+
 @app.get("/api/files/versions")
-def list_file_versions(path: str):
-    points, _ = client.scroll(
+async def list_file_versions(path: str, limit: int = 100, before: int | None = None):
+    """최신 버전부터 limit개 (다음 페이지는 before=마지막 version)"""
+    await wait_collections_ready()
+    client = get_client()
+    scroll_filter = path_filter(path)
+    if before is not None:
+        scroll_filter.must.append(FieldCondition(key="version", range=Range(lt=before)))
+
+    points, _ = await client.scroll(
         collection_name="file_versions",
-        scroll_filter={
-            "must": [
-                {"key": "path", "match": {"value": path}}
-            ]
-        },
+        scroll_filter=scroll_filter,
+        order_by=OrderBy(key="version", direction=Direction.DESC),
         with_payload=True,
         with_vectors=False,
-        limit=100
+        limit=limit
     )
 
-    return sorted(
-        [
-            {
-                "version": p.payload["version"],
-                "timestamp": p.payload["timestamp"],
-                "change_type": p.payload["change_type"],
-                "summary": p.payload["summary"],
-            }
-            for p in points
-        ],
-        key=lambda x: x["version"],
-        reverse=True
+    return [
+        {
+            "version": p.payload["version"],
+            "timestamp": p.payload["timestamp"],
+            "change_type": p.payload["change_type"],
+            "summary": p.payload["summary"],
+        }
+        for p in points
+    ]
+
+async def candidate_paths(query_emb: list[float], limit: int) -> list[str]:
+    """1단계: 파일 단위 벡터로 후보 파일"""
+    client = get_client()
+    result = await client.query_points(
+        collection_name="file_vectors",
+        query=query_emb,
+        with_payload=["path"],
+        limit=limit
     )
+    return [p.payload["path"] for p in result.points]
 
 @app.get("/api/search")
-def search(q: str):
+async def search(q: str, k: int = 5, page: int = 0, chunks_per_file: int = 3):
+    """
+        파일 단위로 묶은 검색 결과 (k개 파일씩 page)
+
+        1단계: file_vectors에서 후보 파일
+        2단계: 후보 파일 안의 chunk dense 검색 + 전체 chunk lexical 검색 -> RRF -> path로 group
+    """
     client = get_client()
-    model = get_embed_model()  # 🔥 lazy loading
+    k = max(1, k)
+    page = max(0, page)
+    groups_needed = (page + 1) * k
 
-    query_emb = model.encode(q).tolist()
+    query_emb = await encode_query(q)  # 🔥 lazy loading (캐시 miss일 때만 모델 로드)
+    query_sparse = query_sparse_vector(q)
 
-    result = client.query_points(
-        collection_name="files",
-        prefetch=[],
-        query=query_emb,
-        limit=5
-    )
+    candidates = await candidate_paths(query_emb, groups_needed * SEARCH_CANDIDATE_FACTOR)
+    # file_vectors가 아직 비어 있으면 전체 chunk에서
+    dense_filter = Filter(must=[FieldCondition(key="path", match=MatchAny(any=candidates))]) if candidates else None
+    prefetch_limit = max(SEARCH_PREFETCH_LIMIT, groups_needed * chunks_per_file)
 
-    return [
-        {
-            "score": point.score,
-            "path": point.payload.get("path"),
-            "summary": point.payload.get("summary")
-        }
-        for point in result.points
-    ]
+    if hybrid_enabled and query_sparse["indices"]:
+        # 정확한 식별자/에러코드는 파일 벡터에 묻힐 수 있어서 lexical은 후보 제한 없이
+        result = await client.query_points_groups(
+            collection_name="files",
+            prefetch=[
+                Prefetch(query=query_emb, filter=dense_filter, params=search_params(), limit=prefetch_limit),
+                Prefetch(
+                    query=SparseVector(**query_sparse),
+                    using=SPARSE_VECTOR_NAME,
+                    limit=prefetch_limit
+                ),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            group_by="path",
+            group_size=chunks_per_file,
+            limit=groups_needed
+        )
+    else:
+        result = await client.query_points_groups(
+            collection_name="files",
+            query=query_emb,
+            query_filter=dense_filter,
+            search_params=search_params(),
+            group_by="path",
+            group_size=chunks_per_file,
+            limit=groups_needed
+        )
+
+    return {
+        "page": page,
+        "k": k,
+        "files": [
+            {
+                "path": group.id,
+                "score": group.hits[0].score,
+                "chunks": [
+                    {
+                        "score": hit.score,
+                        "chunk_index": hit.payload.get("chunk_index"),
+                        "text": hit.payload.get("text"),
+                        "start": hit.payload.get("start"),
+                        "end": hit.payload.get("end"),
+                    }
+                    for hit in group.hits
+                ]
+            }
+            for group in result.groups[page * k:groups_needed]
+        ]
+    }
 
 @app.post("/api/delete")
-def delete_points(ids: List[str]):
+async def delete_points(ids: List[str]):
+    await wait_collections_ready()
     client = get_client()
-    client.delete(
-        collection_name="files",
-        points_selector=ids
-    )
+    async with file_vectors_locked(await chunk_paths(ids)):
+        deltas = await chunk_deltas(ids)
+        await client.delete(
+            collection_name="files",
+            points_selector=ids
+        )
+        await apply_chunk_deltas(deltas)
     return {"deleted": len(ids)}
 
 @app.post("/api/chunks/upsert")
-def upsert_chunk(data: ChunkData):
+async def upsert_chunk(data: ChunkData):
+    await wait_collections_ready()
     client = get_client()
-    client.upsert(
-        collection_name="files",
-        points=[{
-            "id": data.id,
-            "vector": data.vector,
-            "payload": data.payload
-        }]
-    )
+    # chunk id는 path 기준이라 덮어쓰는 chunk도 같은 path
+    async with file_vectors_locked([data.payload.get("path", "")]):
+        deltas = await chunk_deltas([data.id])
+        await client.upsert(
+            collection_name="files",
+            points=[PointStruct(id=data.id, vector=chunk_vector(data), payload=data.payload)]
+        )
+        add_chunk_delta(deltas, data.payload, data.vector, 1)
+        await apply_chunk_deltas(deltas)
     return {"ok": True}
 
+@app.post("/api/chunks/upsert-batch")
+async def upsert_chunks(data: ChunkBatch):
+    if not data.points:
+        return {"ok": True, "count": 0}
+
+    await wait_collections_ready()
+    client = get_client()
+    async with file_vectors_locked({p.payload.get("path", "") for p in data.points}):
+        deltas = await chunk_deltas([p.id for p in data.points])
+        await client.upsert(
+            collection_name="files",
+            points=[
+                PointStruct(id=p.id, vector=chunk_vector(p), payload=p.payload)
+                for p in data.points
+            ]
+        )
+        for p in data.points:
+            add_chunk_delta(deltas, p.payload, p.vector, 1)
+        await apply_chunk_deltas(deltas)
+    return {"ok": True, "count": len(data.points)}
+
+@app.post("/api/embed")
+async def embed(data: EmbedRequest):
+    """indexer가 모델을 따로 올리지 않고 서버 모델을 같이 씀 (embed_mode: server)"""
+    vectors = await encode_texts_async(data.texts)
+    return {
+        "model": embed_cache.model_name,
+        "vectors": vectors
+    }
+
 @app.post("/api/diff")
-def save_diff(payload: DiffPayload):
-    global client
+async def save_diff(payload: DiffPayload):
+    await wait_collections_ready()
     client = get_client()
 
-    model = get_embed_model()
     text = payload.old_text + "\n" + payload.new_text
-    vector = model.encode(text).tolist()
-    client.upsert(
+    vector = (await encode_texts_async([text]))[0]
+    await client.upsert(
         collection_name="file_diffs",
         points=[PointStruct(
             id=str(uuid4()),
@@ -432,8 +1136,8 @@ def save_diff(payload: DiffPayload):
     return {"ok": True}
 
 @app.get("/api/diff")
-def get_diff(path: str):
-    diff = get_latest_diff(path)
+async def get_diff(path: str):
+    diff = await get_latest_diff(path)
     if not diff:
         return {"path": path, "old_text": "", "new_text": ""}
 
@@ -445,15 +1149,12 @@ def get_diff(path: str):
     }
 
 @app.get("/api/files/version/diff")
-def get_version_diff(path: str, version: int):
-    points, _ = client.scroll(
+async def get_version_diff(path: str, version: int):
+    await wait_collections_ready()
+    client = get_client()
+    points, _ = await client.scroll(
         collection_name="file_versions",
-        scroll_filter={
-            "must": [
-                {"key": "path", "match": {"value": path}},
-                {"key": "version", "match": {"value": version}},
-            ]
-        },
+        scroll_filter=path_filter(path, version=version),
         with_payload=True,
         with_vectors=False,
         limit=1
@@ -468,107 +1169,117 @@ def get_version_diff(path: str, version: int):
 
 @app.post("/api/file-change")
 async def record_file_change(payload: FileChangePayload):
+    await wait_collections_ready()
     client = get_client()
     point = PointStruct(
         id=str(uuid4()),
-        vector=[0.0],
+        vector=[0.0] if file_changes_legacy else {},
         payload={
             "path": payload.path,
             "status": payload.status,
             "timestamp": payload.timestamp,
         }
     )
-    client.upsert(
+    await client.upsert(
         collection_name="file_changes",
         points=[point]
     )
-    await notify_file_change(
-        payload.status,
-        payload.path,
-        payload.node
-    )
-    await notify_tree_update()
+    await update_latest(payload.path, {
+        "status": payload.status.value,
+        "change_timestamp": payload.timestamp,
+    })
+    if payload.status == FileStatus.deleted:
+        await client.delete(collection_name="file_vectors", points_selector=[file_vector_id(payload.path)])
+    await notify_tree_delta(payload.path, payload.status.value)
 
     return {"ok": True}
 
 @app.get("/api/changed-files")
-def get_changed_files():
-    client = get_client()
-    points, _ = client.scroll(
-        collection_name="file_changes",
-        limit=100,
-        with_payload=True
-    )
-
-    return sorted(
-        [p.payload for p in points],
-        key=lambda x: x["timestamp"],
-        reverse=True
-    )
-
-def latest_file_changes():
+async def get_changed_files(limit: int = 100):
+    await wait_collections_ready()
     client = get_client()
-    points, _ = client.scroll(
+    points, _ = await client.scroll(
         collection_name="file_changes",
+        order_by=OrderBy(key="timestamp", direction=Direction.DESC),
+        limit=limit,
         with_payload=True,
-        limit=1000
+        with_vectors=False
     )
 
-    latest = {}
-    for p in points:
-        path = p.payload["path"]
-        ts = p.payload["timestamp"]
+    return [p.payload for p in points]
 
-        if path not in latest or ts > latest[path]["timestamp"]:
-            latest[path] = p.payload
-
-    return list(latest.values())
+async def latest_file_changes():
+    return [
+        {
+            "path": p.payload["path"],
+            "status": p.payload["status"],
+            "timestamp": p.payload["change_timestamp"],
+        }
+        async for p in scroll_all(
+            "file_latest",
+            Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="status"))])
+        )
+    ]
 
 @app.get("/api/changed-files/tree")
-def get_changed_files_tree():
-    file_changes = latest_file_changes()
+async def get_changed_files_tree():
+    await wait_collections_ready()
+    file_changes = await latest_file_changes()
     return build_tree(file_changes)
 
 @app.post("/api/save-file-version")
-def save_file_version(
+async def save_file_version(
     data: FileVersionData
 ):
-    client.upsert(
+    await wait_collections_ready()
+    client = get_client()
+    timestamp = now()
+    await client.upsert(
         collection_name="file_versions",
-        points=[{
-            # "id": f"file::{data.path}::v{data.version}",
-            "id": str(uuid4()),
-            "vector": list(map(float, data.vector)),
-            "payload": {
+        points=[PointStruct(
+            # id=f"file::{data.path}::v{data.version}",
+            id=str(uuid4()),
+            vector=list(map(float, data.vector)),
+            payload={
                 "path": data.path,
                 "version": data.version,
                 "hash": data.hash,
-                "timestamp": now(),
+                "timestamp": timestamp,
                 "change_type": data.change_type,
                 "diff": data.diff,
                 "summary": data.summary,
             }
-        }]
+        )]
     )
+    await update_latest(data.path, {
+        "version": data.version,
+        "version_timestamp": timestamp,
+        "hash": data.hash,
+        "change_type": data.change_type,
+    })
 
 @app.websocket("/ws/file-tree")
 async def websocket_file_tree(websocket: WebSocket):
-    await manager.connect(websocket)
+    conn = await manager.connect(websocket)
+
+    async def ping():
+        while True:
+            await asyncio.sleep(30)
+            conn.send(PING_MESSAGE)
+
+    ping_task = asyncio.create_task(ping())
     try:
-        tree = build_tree_from_qdrant()
-        await websocket.send_json({
-            "type": "tree",
-            "tree": tree
-        })
+        # 접속 시 전체 스냅샷 한 번, 이후로는 delta만
+        conn.resync()
 
         while True:
-            try:
-                await websocket.send_json({"type": "ping"})
-                await asyncio.sleep(30)
-            except WebSocketDisconnect:
-                break
+            message = await websocket.receive_json()
+            if message.get("type") == "resync":
+                conn.resync()
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         print("ws error:", e)
-        manager.disconnect(websocket)
\ No newline at end of file
+    finally:
+        ping_task.cancel()
+        manager.disconnect(websocket)
@@ -0,0 +1,78 @@
+import inspect
+import time
+
+from indexer import metrics
+
+# 서버 쪽 지표 (GET /api/metrics 에서 Prometheus text로)
+#   - endpoint별 요청 수 / latency (route 템플릿 기준이라 path 값마다 label이 늘지 않음)
+#   - 벡터 저장소(Qdrant / flat) 호출별 latency
+#   - 모델 encode 시간
+
+REQUESTS = metrics.counter("server_requests_total", "HTTP requests", ("method", "route", "status"))
+REQUEST_SECONDS = metrics.histogram("server_request_seconds", "HTTP request latency", ("method", "route"))
+STORE_SECONDS = metrics.histogram("server_store_seconds", "Vector store call latency", ("op", "collection"))
+STORE_ERRORS = metrics.counter("server_store_errors_total", "Vector store calls that raised", ("op",))
+ENCODE_SECONDS = metrics.histogram("server_embed_encode_seconds", "Model encode latency per batch")
+ENCODED_TEXTS = metrics.counter("server_embed_texts_total", "Texts encoded by the model (cache misses)")
+
+class MetricsMiddleware:
+    """
+        pure ASGI middleware (BaseHTTPMiddleware는 요청마다 task를 하나 더 만듦)
+        websocket은 그대로 통과
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route).observe(elapsed)
+            REQUESTS.labels(scope["method"], route, status).inc()
+
+class InstrumentedStore:
+    """
+        open_store() 객체를 감싸서 async 메서드 호출 시간을 op/collection별로 기록
+        나머지 속성은 그대로 위임
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            collection = kwargs.get("collection_name") or (args[0] if args and isinstance(args[0], str) else "")
+            start = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            except Exception:
+                STORE_ERRORS.labels(name).inc()
+                raise
+            finally:
+                STORE_SECONDS.labels(name, collection).observe(time.perf_counter() - start)
+
+        return call
+
+def observe_encode(seconds: float, texts: int):
+    ENCODE_SECONDS.observe(seconds)
+    ENCODED_TEXTS.inc(texts)
@@ -0,0 +1,93 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+_SPACE_RE = re.compile(r"\s+")
+
+def normalize_query(q: str) -> str:
+    """
+        앞뒤 공백 제거 + 연속 공백 하나로 + 소문자
+        (all-MiniLM-L6-v2 tokenizer가 uncased라 대소문자가 달라도 벡터가 같음)
+    """
+    return _SPACE_RE.sub(" ", q).strip().lower()
+
+class QueryEmbeddingCache:
+    """
+        검색어 -> 벡터 메모리 캐시 (LRU + TTL)
+
+        - 같은 검색어가 동시에 여러 번 들어오면 encode는 한 번만 (나머지는 같은 task를 기다림)
+        - encode 실패는 캐시하지 않음 (다음 요청이 다시 시도)
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # query -> (저장 시각, vector)
+        self._inflight = {}            # query -> encode task
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored, vector = entry
+        if time.monotonic() - stored > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return vector
+
+    def _store(self, key, vector):
+        self._entries[key] = (time.monotonic(), vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, q: str, encode) -> list[float]:
+        """
+            encode: async (query) -> vector, 캐시에 없을 때만 호출
+        """
+        key = normalize_query(q)
+
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # 요청 하나가 취소돼도 같은 검색어를 기다리는 다른 요청은 계속 받도록 별도 task로 실행
+            self.misses += 1
+            task = asyncio.ensure_future(encode(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,78 @@
+import os
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, \
+    BinaryQuantizationConfig, Disabled, SearchParams, QuantizationSearchParams
+
+from server.flat_store import FlatVectorStore
+
+# VECTOR_STORE 환경변수로 저장소 선택
+#   qdrant : 원격 Qdrant 서버 (QDRANT_URL)
+#   local  : qdrant_client 내장 모드 (VECTOR_STORE_PATH 디렉터리, 없으면 :memory:)
+#   flat   : NumPy/memmap 로컬 저장소 (VECTOR_STORE_PATH 디렉터리, 없으면 메모리)
+DEFAULT_STORE = "qdrant"
+DEFAULT_QDRANT_URL = "https://qdrant.drakedognas.synology.me:443"
+
+# 벡터 저장 옵션 (files / file_versions / file_diffs)
+#   VECTOR_QUANTIZATION : scalar(int8) | binary | none
+#   VECTOR_OVERSAMPLING : 양자화 벡터로 limit * oversampling 개 뽑고 원본 벡터로 rescore
+#   VECTORS_ON_DISK / PAYLOAD_ON_DISK : 원본 벡터 / payload를 디스크에 (양자화 벡터는 RAM)
+#   VECTOR_STORAGE_MIGRATE : 1이면 이미 있는 컬렉션도 위 설정으로 바꿈 (기본은 새 컬렉션에만, 다르면 로그만)
+QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "scalar").lower()
+OVERSAMPLING = float(os.environ.get("VECTOR_OVERSAMPLING", "2.0"))
+VECTORS_ON_DISK = os.environ.get("VECTORS_ON_DISK", "1") == "1"
+PAYLOAD_ON_DISK = os.environ.get("PAYLOAD_ON_DISK", "1") == "1"
+STORAGE_MIGRATE = os.environ.get("VECTOR_STORAGE_MIGRATE", "0") == "1"
+
+def quantization_config(kind: str = QUANTIZATION):
+    if kind == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if kind == "none":
+        return None
+    raise ValueError(f"unknown VECTOR_QUANTIZATION: {kind}")
+
+def quantization_kind(config) -> str:
+    """quantization_config -> VECTOR_QUANTIZATION 이름 (로그용)"""
+    if isinstance(config, ScalarQuantization):
+        return "scalar"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return "none" if config in (None, Disabled.DISABLED) else type(config).__name__
+
+def search_params() -> SearchParams | None:
+    """양자화된 컬렉션 검색 시 oversampling + 원본 벡터 rescore"""
+    if quantization_config() is None:
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=OVERSAMPLING))
+
+def quantization_update():
+    # update_collection 에서 양자화를 끌 때는 Disabled
+    return quantization_config() or Disabled.DISABLED
+
+def open_store(kind: str | None = None, location: str | None = None):
+    """
+        server/main.py가 쓰는 AsyncQdrantClient 메서드
+        (get_collections, get_collection, create_collection, create_payload_index,
+         upsert, retrieve, scroll, query_points, query_points_groups, delete)
+        를 같은 시그니처로 가진 객체 반환
+    """
+    kind = (kind or os.environ.get("VECTOR_STORE") or DEFAULT_STORE).lower()
+    location = location if location is not None else os.environ.get("VECTOR_STORE_PATH")
+
+    if kind == "qdrant":
+        url = location or os.environ.get("QDRANT_URL") or DEFAULT_QDRANT_URL
+        return AsyncQdrantClient(url=url, api_key=os.environ.get("QDRANT_API_KEY"))
+
+    if kind == "local":
+        if not location or location == ":memory:":
+            return AsyncQdrantClient(location=":memory:")
+        return AsyncQdrantClient(path=location)
+
+    if kind == "flat":
+        return FlatVectorStore(None if location == ":memory:" else location)
+
+    raise ValueError(f"unknown VECTOR_STORE: {kind}")
@@ -0,0 +1,21 @@
+import json
+import os
+import sys
+import tempfile
+
+# indexer 모듈은 import 할 때 cwd/indexer/config.json을 읽고 state db / 임베딩 캐시를 cwd에 만듦
+# -> 임시 디렉터리로 옮겨서 repo 쪽 파일을 건드리지 않게
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "indexer"))
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+_workdir = tempfile.mkdtemp(prefix="indexer-test-")
+os.makedirs(os.path.join(_workdir, "indexer"))
+with open(os.path.join(ROOT, "indexer", "config.json")) as f:
+    _config = json.load(f)
+_config["metrics_port"] = 0
+with open(os.path.join(_workdir, "indexer", "config.json"), "w") as f:
+    json.dump(_config, f)
+os.chdir(_workdir)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+from server.batcher import MicroBatcher
+
+class Encoder:
+    """encode 호출마다 받은 텍스트 기록, release 전까지 막아둘 수 있음"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, texts):
+        self.release.wait(5)
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [[float(len(t))] for t in texts]
+
+def test_concurrent_requests_share_one_encode():
+    encode = Encoder()
+    batcher = MicroBatcher(encode, max_batch=8, max_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit([f"t{i}", "xx"]) for i in range(3)))
+
+    results = asyncio.run(run())
+    assert results == [[[2.0], [2.0]]] * 3
+    assert len(encode.batches) == 1 and len(encode.batches[0]) == 6
+    assert batcher.stats()["avg_batch_size"] == 6.0
+
+def test_encode_error_reaches_every_waiting_request():
+    batcher = MicroBatcher(Encoder(fail=True), max_wait=0.05)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.submit(["a"]) for _ in range(2)), return_exceptions=True)
+        # 실패한 뒤에도 batch task는 계속 동작
+        batcher.encode.fail = False
+        return results, await batcher.submit(["abc"])
+
+    results, after = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert after == [[3.0]]
+
+def test_close_drains_queued_requests():
+    encode = Encoder()
+    batcher = MicroBatcher(encode, max_batch=2, max_wait=0.0)
+
+    async def run():
+        encode.release.clear()
+        first = asyncio.create_task(batcher.submit(["a", "b"]))
+        await asyncio.sleep(0.05)  # 첫 batch encode 중
+        queued = [asyncio.create_task(batcher.submit([t])) for t in ("cc", "ddd", "eeee")]
+        await asyncio.sleep(0.01)
+
+        closing = asyncio.create_task(batcher.close())
+        await asyncio.sleep(0.01)
+        assert not closing.done()
+        encode.release.set()
+        await closing
+        return await first, [q.result() for q in queued], batcher._task.done()
+
+    first, queued, stopped = asyncio.run(run())
+    assert first == [[1.0], [1.0]]
+    assert queued == [[[2.0]], [[3.0]], [[4.0]]]
+    assert stopped
+    assert [len(b) for b in encode.batches] == [2, 2, 1]
@@ -0,0 +1,36 @@
+import os
+
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+import chunker
+
+def reset_tokenizer(monkeypatch):
+    monkeypatch.setattr(chunker, "_tokenizer", None)
+    monkeypatch.setattr(chunker, "_tokenizer_loaded", False)
+
+def test_tokenizer_is_loaded_from_local_model_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reset_tokenizer(monkeypatch)
+    target = os.path.join(chunker.model_dir(chunker.MODEL_NAME), "tokenizer.json")
+    os.makedirs(os.path.dirname(target))
+    tok = Tokenizer(WordLevel({"[UNK]": 0, "hello": 1, "world": 2}, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    tok.save(target)
+
+    assert chunker._tokenizer_file() == target
+    loaded = chunker.get_tokenizer()
+    assert loaded is not None
+    assert loaded.encode("hello world", add_special_tokens=False).ids == [1, 2]
+
+def test_fallback_chunks_stay_under_half_the_token_budget(monkeypatch):
+    reset_tokenizer(monkeypatch)
+    monkeypatch.setattr(chunker, "_tokenizer_file", lambda: None)
+
+    text = " ".join(f"word{i}" for i in range(5000))
+    chunks = chunker.chunk_text(text)
+    assert chunker.get_tokenizer() is None
+    assert max(len(c.split()) for c in chunks) <= chunker.MAX_TOKENS // chunker.FALLBACK_TOKENS_PER_WORD
+    # 프로세스/실행마다 같은 경계 (hash()가 아니라 crc32)
+    assert chunker.chunk_text(text) == chunks
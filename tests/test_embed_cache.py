@@ -0,0 +1,35 @@
+import numpy as np
+
+import embed_cache
+from embed_cache import EmbeddingCache
+
+def test_memory_lru_keeps_float32_arrays(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path / "cache.db"), memory_size=2)
+    assert cache.encode(["a", "b", "a"], lambda texts: [[0.5, 2.0] for _ in texts]) == [[0.5, 2.0]] * 3
+
+    stored = cache._memory[cache.key("a")]
+    assert isinstance(stored, np.ndarray) and stored.dtype == np.float32
+    assert cache.get_many(["a", "b", "c"]) == [[0.5, 2.0], [0.5, 2.0], None]
+
+    reopened = EmbeddingCache("m", cache.path)
+    assert reopened.get_many(["b"]) == [[0.5, 2.0]]
+    assert reopened._memory[reopened.key("b")].dtype == np.float32
+
+def test_disk_eviction_trims_to_90_percent_by_last_use(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(embed_cache.time, "time", lambda: float(next(clock)))
+    cache = EmbeddingCache("m", str(tmp_path / "cache.db"), memory_size=1, max_entries=10)
+
+    for i in range(10):
+        cache.put_many([f"t{i}"], [[float(i)]])
+    assert cache.evictions == 0
+    # 디스크에서 읽으면 마지막 사용 시각이 갱신됨 -> 오래된 t0도 남음
+    assert cache.get_many(["t0"]) == [[0.0]]
+
+    cache.put_many(["t10"], [[10.0]])
+    assert cache.evictions == 2
+    assert cache.stats()["disk_entries"] == 9
+
+    fresh = EmbeddingCache("m", cache.path, memory_size=1)
+    found = fresh.get_many([f"t{i}" for i in range(11)])
+    assert [i for i, v in enumerate(found) if v is None] == [1, 2]
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import uuid
+
+import numpy as np
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import VectorParams, Distance, SparseVectorParams, Modifier, PointStruct, SparseVector, \
+    Prefetch, FusionQuery, Fusion, Filter, FieldCondition, MatchAny, MatchValue, Range, OrderBy, Direction, \
+    IsEmptyCondition, PayloadField, PayloadSchemaType, HasIdCondition
+
+import server.flat_store as flat_store
+from server.flat_store import FlatVectorStore
+
+def point_id(i):
+    return str(uuid.UUID(int=i))
+
+async def fill(client, n=200):
+    await client.create_collection(
+        "f",
+        vectors_config=VectorParams(size=8, distance=Distance.COSINE),
+        sparse_vectors_config={"text": SparseVectorParams(modifier=Modifier.IDF)}
+    )
+    rng = np.random.default_rng(1)
+    points = []
+    for i in range(n):
+        idx = sorted(set(rng.integers(0, 30, 5).tolist()))
+        points.append(PointStruct(
+            id=point_id(i),
+            vector={"": rng.normal(size=8).tolist(), "text": SparseVector(indices=idx, values=rng.random(len(idx)).tolist())},
+            payload={"path": f"p{i % 17}", "i": i, "text": f"chunk {i} " + "x" * (i % 3) * 200}
+        ))
+    await client.upsert("f", points)
+
+async def run_queries(client):
+    q = np.random.default_rng(5).normal(size=8).tolist()
+    sq = SparseVector(indices=[1, 3, 7], values=[1.0, 1.0, 1.0])
+    hybrid = [Prefetch(query=q, limit=20), Prefetch(query=sq, using="text", limit=20)]
+    in_paths = Filter(must=[FieldCondition(key="path", match=MatchAny(any=["p1", "p2", "p3"]))])
+
+    results = [
+        await client.query_points("f", query=q, limit=5),
+        await client.query_points("f", query=sq, using="text", limit=5),
+        await client.query_points("f", prefetch=hybrid, query=FusionQuery(fusion=Fusion.RRF), limit=5),
+        await client.query_points("f", query=q, query_filter=in_paths, limit=5),
+    ]
+    out = [[(p.payload["i"], round(p.score, 4)) for p in r.points] for r in results]
+
+    groups = [
+        await client.query_points_groups("f", query=q, group_by="path", group_size=2, limit=3),
+        await client.query_points_groups(
+            "f",
+            prefetch=[Prefetch(query=q, filter=in_paths, limit=20), Prefetch(query=sq, using="text", limit=20)],
+            query=FusionQuery(fusion=Fusion.RRF),
+            group_by="path",
+            group_size=2,
+            limit=3
+        ),
+    ]
+    out += [[(g.id, [(h.payload["i"], round(h.score, 3)) for h in g.hits]) for g in r.groups] for r in groups]
+
+    records, _ = await client.scroll(
+        "f",
+        scroll_filter=Filter(must=[FieldCondition(key="i", range=Range(gte=100))]),
+        limit=3,
+        order_by=OrderBy(key="i", direction=Direction.DESC)
+    )
+    out.append([(r.payload["i"], r.payload["text"]) for r in records])
+    out.append((await client.count("f", count_filter=Filter(must=[FieldCondition(key="path", match=MatchValue(value="p1"))]))).count)
+    return out
+
+def test_matches_qdrant_local():
+    async def run():
+        qdrant, flat = AsyncQdrantClient(location=":memory:"), FlatVectorStore()
+        await fill(qdrant)
+        await fill(flat)
+        return await run_queries(qdrant), await run_queries(flat)
+
+    expected, actual = asyncio.run(run())
+    assert actual == expected
+
+def test_reopen_compacts_and_keeps_long_payloads(tmp_path):
+    path = str(tmp_path / "store")
+
+    async def run():
+        store = FlatVectorStore(path)
+        await fill(store)
+        await store.create_payload_index("f", "path", PayloadSchemaType.KEYWORD)
+        await store.delete("f", [point_id(i) for i in range(0, 200, 3)])
+        # 긴 text는 메모리에 두지 않음
+        coll = store._collections["f"]
+        assert coll.payloads[coll.id_rows[point_id(2)]]["text"] is flat_store._LAZY
+        before = await run_queries(store)
+        await store.close()
+
+        reopened = FlatVectorStore(path)
+        coll = reopened._collections["f"]
+        after = await run_queries(reopened)
+        has_text = await reopened.count("f", count_filter=Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="text"))]))
+        await reopened.close()
+        return before, after, coll, has_text.count
+
+    before, after, coll, has_text = asyncio.run(run())
+    assert after == before
+    assert coll.size == len(coll.id_rows) == 133
+    assert has_text == 133
+    assert not os.path.exists(os.path.join(path, "f.f32.tmp"))
+
+def test_interrupted_compaction_is_finished_on_next_open(tmp_path, monkeypatch):
+    path = str(tmp_path / "store")
+
+    async def prepare():
+        store = FlatVectorStore(path)
+        await fill(store, n=50)
+        await store.delete("f", [point_id(i) for i in range(0, 50, 2)])
+        expected = await store.query_points("f", query=[1.0] * 8, limit=5)
+        await store.close()
+        return [p.id for p in expected.points]
+
+    expected = asyncio.run(prepare())
+
+    # row 번호 commit 직후, 파일 교체 전에 죽은 것처럼
+    def crash(src, dst):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(flat_store.os, "replace", crash)
+    with pytest.raises(KeyboardInterrupt):
+        FlatVectorStore(path)
+    monkeypatch.undo()
+
+    async def reopen():
+        store = FlatVectorStore(path)
+        found = await store.query_points("f", query=[1.0] * 8, limit=5)
+        await store.close()
+        return [p.id for p in found.points]
+
+    assert asyncio.run(reopen()) == expected
+    assert not os.path.exists(os.path.join(path, "f.f32.tmp"))
+
+def test_indexed_filters_match_row_checks():
+    filters = [
+        Filter(must=[FieldCondition(key="path", match=MatchAny(any=["p1", "p2"]))]),
+        Filter(must=[FieldCondition(key="i", range=Range(gte=20, lt=90))], must_not=[FieldCondition(key="path", match=MatchValue(value="p3"))]),
+        Filter(should=[FieldCondition(key="path", match=MatchValue(value="p4")), FieldCondition(key="i", range=Range(lte=5))]),
+        Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="i"))]),
+        Filter(must=[HasIdCondition(has_id=[point_id(i) for i in range(0, 40, 3)])], must_not=[FieldCondition(key="i", range=Range(gt=30))]),
+        # 인덱스 없는 필드가 섞이면 나머지만 row 단위로
+        Filter(must=[FieldCondition(key="path", match=MatchAny(any=["p5", "p6"])), FieldCondition(key="text", match=MatchAny(any=[f"chunk {i} " for i in range(0, 200, 3)]))]),
+    ]
+
+    async def run():
+        plain, indexed = FlatVectorStore(), FlatVectorStore()
+        await fill(plain)
+        await fill(indexed)
+        await indexed.create_payload_index("f", "path", PayloadSchemaType.KEYWORD)
+        await indexed.create_payload_index("f", "i", PayloadSchemaType.INTEGER)
+        coll = indexed._collections["f"]
+        assert all(coll._mask(c) is not None for f in filters[:5] for c in f.must or f.should)
+        return [
+            [(await s.count("f", count_filter=f)).count for f in filters]
+            for s in (plain, indexed)
+        ]
+
+    expected, actual = asyncio.run(run())
+    assert actual == expected
+    assert expected[0] > 0 and expected[3] == 0
+
+def test_group_walk_stops_when_groups_are_full(monkeypatch):
+    seen = []
+    fill_groups = flat_store._fill_groups
+
+    def spy(coll, rows, scores, *args):
+        seen.append(len(rows))
+        return fill_groups(coll, rows, scores, *args)
+    monkeypatch.setattr(flat_store, "_fill_groups", spy)
+
+    async def run():
+        store = FlatVectorStore()
+        await fill(store, n=2000)
+        return await store.query_points_groups("f", query=[1.0] * 8, group_by="path", group_size=2, limit=3)
+
+    result = asyncio.run(run())
+    assert [len(g.hits) for g in result.groups] == [2, 2, 2]
+    # 전체 2000개가 아니라 상위 k개만
+    assert seen == [3 * 2 * 4]
+
+def test_queries_run_off_the_event_loop_during_upserts():
+    async def run():
+        store = FlatVectorStore()
+        await fill(store, n=50)
+        rng = np.random.default_rng(2)
+        batches = [
+            [PointStruct(id=point_id(1000 + b * 100 + i), vector={"": rng.normal(size=8).tolist()}, payload={"path": "new", "i": i})
+             for i in range(100)]
+            for b in range(20)
+        ]
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        tick_task = asyncio.create_task(ticker())
+        upserts = asyncio.gather(*(store.upsert("f", b) for b in batches))
+        found = await asyncio.gather(*(store.query_points("f", query=[1.0] * 8, limit=5) for _ in range(20)))
+        await upserts
+        tick_task.cancel()
+        total = await store.count("f")
+        await store.close()
+        return found, total.count, ticks
+
+    found, total, ticks = asyncio.run(run())
+    assert all(len(r.points) == 5 for r in found)
+    assert total == 50 + 2000
+    assert ticks > 0
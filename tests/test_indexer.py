@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+import main
+import state
+
+SERVER_CALLS = ["upload_chunks", "delete_chunks", "update_file_vector", "send_file_change", "save_file_change",
+                "send_diff"]
+
+@pytest.fixture
+def calls(monkeypatch):
+    """서버로 나가는 호출은 기록만"""
+    recorded = []
+    for name in SERVER_CALLS:
+        monkeypatch.setattr(main, name, lambda *args, _name=name, **kwargs: recorded.append((_name, args)))
+    monkeypatch.setattr(main, "get_embeddings", lambda texts, *args, **kwargs: [[0.0] * 384 for _ in texts])
+    return recorded
+
+def test_streamed_file_shrinking_below_threshold(tmp_path, calls):
+    # streaming 경로로 인덱싱된 파일은 state에 text가 None
+    path = tmp_path / "app.log"
+    path.write_text("")
+    main.update_state(str(path), "old-hash", ["old-chunk"], os.stat(path), None, version=1)
+
+    path.write_text("rotated log line\n" * 20)
+    main.index_file(str(path))
+
+    state = main.get_state(str(path))
+    assert state["version"] == 2
+    assert state["text"] == path.read_text()
+    assert ("delete_chunks", (["old-chunk"],)) in calls
+    assert str(path) not in main.INFLIGHT
+
+def test_large_file_emptied_deletes_old_chunks(tmp_path, calls):
+    path = tmp_path / "big.log"
+    path.write_text("")
+    main.update_state(str(path), "old-hash", ["a", "b"], os.stat(path), None, version=3)
+
+    main.index_large_file(str(path), os.stat(path), "old-hash")
+
+    deleted = [args[0] for name, args in calls if name == "delete_chunks"]
+    assert sorted(deleted[0]) == ["a", "b"]
+    assert main.get_state(str(path))["chunks"] == []
+
+def test_small_file_emptied_deletes_old_chunks(tmp_path, calls):
+    path = tmp_path / "notes.txt"
+    path.write_text("some notes\n" * 10)
+    main.index_file(str(path))
+    chunks = main.get_state(str(path))["chunks"]
+    assert chunks
+    calls.clear()
+
+    path.write_text("")
+    main.index_file(str(path))
+
+    deleted = [args[0] for name, args in calls if name == "delete_chunks"]
+    assert deleted == [chunks]
+    assert ("update_file_vector", (str(path),)) in calls
+    state = main.get_state(str(path))
+    assert state["chunks"] == [] and state["version"] == 1
+    assert main.claim_file(str(path)) is None
+    assert str(path) not in main.INFLIGHT
+
+def test_empty_and_unsupported_files_are_not_reread(tmp_path, calls, monkeypatch):
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+    binary = tmp_path / "image.png"
+    binary.write_bytes(b"\x89PNG" * 10)
+
+    hashed = []
+    with monkeypatch.context() as m:
+        m.setattr(main, "extract_file", lambda path, prev_hash=None: hashed.append(path) or ("h", "", []))
+        main.index_file(str(empty))
+        main.index_file(str(binary))
+
+    # 빈 파일은 fingerprint만 남기고, 지원하지 않는 확장자는 hash도 안 함
+    assert hashed == [str(empty)]
+    assert main.get_state(str(empty))["chunks"] == []
+    assert main.get_state(str(binary)) is None
+    assert main.claim_file(str(empty)) is None
+    assert not calls
+
+    # 나중에 내용이 생기면 처음 버전으로
+    empty.write_text("now it has text\n")
+    main.index_file(str(empty))
+    assert ("send_file_change", (str(empty), "added")) in calls
+    assert main.get_state(str(empty))["version"] == 1
+
+def test_state_batch_only_defers_its_own_threads(tmp_path):
+    import sqlite3
+    import threading
+
+    def committed(path):
+        with sqlite3.connect(state.STATE_DB) as conn:
+            return conn.execute("SELECT 1 FROM file_state WHERE path = ?", (path,)).fetchone() is not None
+
+    def write(path):
+        main.update_state(path, "h", [], os.stat(tmp_path), None)
+
+    def in_thread(fn):
+        t = threading.Thread(target=fn)
+        t.start()
+        t.join()
+
+    scanned, joined, watched = (str(tmp_path / n) for n in ("scan.txt", "worker.txt", "watch.txt"))
+    with main.state_batch() as batch:
+        write(scanned)
+        in_thread(lambda: (batch.join(), write(joined)))
+        assert not committed(scanned) and not committed(joined)
+        # scan과 상관없는 스레드(watchdog)의 쓰기는 바로 commit
+        in_thread(lambda: write(watched))
+        assert committed(watched)
+        write(scanned + ".2")
+        assert not committed(scanned + ".2")
+
+    assert committed(scanned) and committed(joined)
+
+def test_failed_upload_does_not_write_state(tmp_path, calls, monkeypatch):
+    path = tmp_path / "notes.md"
+    path.write_text("# notes\n" + "line\n" * 20)
+
+    def failing_upload(points):
+        raise RuntimeError("503 from /api/chunks/upsert-batch")
+    monkeypatch.setattr(main, "upload_chunks", failing_upload)
+
+    with pytest.raises(RuntimeError):
+        main.index_file(str(path))
+    assert main.get_state(str(path)) is None
+    assert str(path) not in main.INFLIGHT
+    # 다음 이벤트 / scan에서 다시 대상
+    assert main.claim_file(str(path)) is not None
+    main.release_inflight(str(path))
@@ -0,0 +1,50 @@
+import os
+import threading
+
+import pipeline
+
+ORIGINAL_EXTRACT = pipeline.extract_file_timed
+
+def crashing_extract(path, prev_hash=None):
+    # 워커 프로세스가 죽는 경우 (segfault / OOM 흉내)
+    if path.endswith("crash.txt"):
+        os._exit(1)
+    return ORIGINAL_EXTRACT(path, prev_hash)
+
+def test_scan_finishes_when_worker_dies(tmp_path, monkeypatch):
+    for i in range(6):
+        (tmp_path / f"f{i}.txt").write_text(f"file {i} " * 50)
+    (tmp_path / "crash.txt").write_text("boom")
+    monkeypatch.setattr(pipeline, "extract_file_timed", crashing_extract)
+
+    claimed, released = set(), set()
+    lock = threading.Lock()
+
+    def claim(path):
+        with lock:
+            claimed.add(path)
+        return os.stat(path), None
+
+    def release(path):
+        with lock:
+            released.add(path)
+
+    scan = pipeline.ScanPipeline(
+        claim=claim,
+        build_job=lambda path, stat, h, text, chunks: {"path": path, "texts": [text]},
+        job_texts=lambda job: job["texts"],
+        embed=lambda texts: [[0.0] for _ in texts],
+        finish=lambda job, vectors: None,
+        release=release,
+    )
+    runner = threading.Thread(target=scan.run, args=(str(tmp_path),), daemon=True)
+    runner.start()
+    runner.join(timeout=120)
+
+    assert not runner.is_alive()
+    assert released == claimed
+
+    # 깨진 pool은 버려지고 다음 scan은 새 pool로
+    future, _ = pipeline.submit_extract(str(tmp_path / "f0.txt"), None)
+    (current_hash, text, _), _ = future.result(timeout=60)
+    assert text.startswith("file 0")
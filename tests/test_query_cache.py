@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from server.query_cache import QueryEmbeddingCache
+
+class Encoder:
+    def __init__(self):
+        self.calls = []
+        self.release = None
+
+    async def __call__(self, q):
+        self.calls.append(q)
+        if self.release is not None:
+            await self.release.wait()
+        return [float(len(q))]
+
+def test_entries_expire_after_ttl():
+    cache, encode = QueryEmbeddingCache(ttl=0.05), Encoder()
+
+    async def run():
+        await cache.get("Hello  World", encode)
+        await cache.get("hello world", encode)  # 정규화 후 같은 검색어
+        time.sleep(0.1)
+        await cache.get("hello world", encode)
+
+    asyncio.run(run())
+    assert encode.calls == ["hello world", "hello world"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["expired"] == 1
+
+def test_lru_keeps_recently_used_queries():
+    cache, encode = QueryEmbeddingCache(max_size=2), Encoder()
+
+    async def run():
+        for q in ["a", "b", "a", "c", "a", "b"]:
+            await cache.get(q, encode)
+
+    asyncio.run(run())
+    # c가 들어올 때 가장 오래 안 쓴 b가 빠짐
+    assert encode.calls == ["a", "b", "c", "b"]
+    assert cache.stats()["entries"] == 2
+
+def test_shared_encode_survives_cancelled_caller():
+    cache, encode = QueryEmbeddingCache(), Encoder()
+
+    async def run():
+        encode.release = asyncio.Event()
+        first = asyncio.create_task(cache.get("q", encode))
+        second = asyncio.create_task(cache.get("q", encode))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        encode.release.set()
+
+        result = await second
+        cached = await cache.get("q", encode)
+        return first.cancelled(), result, cached
+
+    cancelled, result, cached = asyncio.run(run())
+    assert cancelled
+    assert result == cached == [1.0]
+    assert encode.calls == ["q"]
+    assert cache.stats()["coalesced"] == 1 and cache.stats()["inflight"] == 0
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from scheduler import EventScheduler
+
+class Recorder:
+    """handler 호출 기록 (같은 path 동시 실행 수도)"""
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.calls = []
+        self.active = {}
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, path, action):
+        with self.lock:
+            self.calls.append((path, action, time.monotonic()))
+            self.active[path] = self.active.get(path, 0) + 1
+            self.max_active = max(self.max_active, self.active[path])
+        time.sleep(self.duration)
+        with self.lock:
+            self.active[path] -= 1
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_events_for_a_path_are_coalesced():
+    handler = Recorder()
+    scheduler = EventScheduler(handler)
+    for _ in range(5):
+        scheduler.schedule("/a", "index", 0.05)
+
+    wait_for(lambda: handler.calls)
+    time.sleep(0.1)
+    assert [(p, a) for p, a, _ in handler.calls] == [("/a", "index")]
+
+def test_create_replaces_pending_delete():
+    handler = Recorder()
+    scheduler = EventScheduler(handler)
+    scheduler.schedule("/a", "delete", 0.2)
+    scheduler.schedule("/a", "index", 0.05)
+
+    wait_for(lambda: handler.calls)
+    time.sleep(0.3)
+    assert [(p, a) for p, a, _ in handler.calls] == [("/a", "index")]
+
+def test_event_during_run_reruns_without_overlap():
+    handler = Recorder(duration=0.15)
+    scheduler = EventScheduler(handler, workers=4)
+    scheduler.schedule("/a", "index", 0.0)
+    wait_for(lambda: handler.calls)
+
+    # 실행 중에 들어온 이벤트는 끝난 뒤 한 번 더, 동시에 두 번 돌지 않음
+    scheduler.schedule("/a", "index", 0.0)
+    scheduler.schedule("/a", "index", 0.0)
+    wait_for(lambda: len(handler.calls) == 2)
+    wait_for(lambda: scheduler.running_count() == 0 and scheduler.pending_count() == 0)
+    assert handler.max_active == 1
+    assert handler.calls[1][2] - handler.calls[0][2] >= 0.15
+
+def test_continuous_events_run_within_max_delay():
+    handler = Recorder()
+    scheduler = EventScheduler(handler, max_delay=0.2)
+    start = time.monotonic()
+    # debounce(0.1)보다 자주 바뀌는 파일
+    while time.monotonic() - start < 0.6:
+        scheduler.schedule("/a", "index", 0.1)
+        time.sleep(0.02)
+
+    assert handler.calls
+    assert handler.calls[0][2] - start < 0.35
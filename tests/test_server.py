@@ -0,0 +1,270 @@
+import asyncio
+import json
+import uuid
+
+import numpy as np
+
+import server.main as app_module
+
+class StuckSocket:
+    """send가 끝나지 않는 (느린) 클라이언트"""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await asyncio.sleep(3600)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+def test_slow_ws_client_is_closed(monkeypatch):
+    monkeypatch.setattr(app_module, "WS_SEND_TIMEOUT", 0.05)
+
+    async def run():
+        socket = StuckSocket()
+        closed = []
+        conn = app_module.ClientConnection(socket, lambda: {"type": "tree"}, closed.append)
+        conn.send("hello")
+        await asyncio.sleep(0.3)
+        return socket, closed, conn
+
+    socket, closed, conn = asyncio.run(run())
+    assert socket.closed_with == 1011
+    assert closed == [conn]
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+def test_tree_load_resyncs_early_clients(monkeypatch):
+    tree = app_module.FileTreeIndex()
+    manager = app_module.ConnectionManager(snapshot=tree.snapshot_message)
+    monkeypatch.setattr(app_module, "file_tree", tree)
+    monkeypatch.setattr(app_module, "manager", manager)
+
+    async def latest_file_changes():
+        return [{"path": "/d/a.txt", "status": "added", "timestamp": 1.0}]
+    monkeypatch.setattr(app_module, "latest_file_changes", latest_file_changes)
+
+    async def run():
+        socket = RecordingSocket()
+        conn = app_module.ClientConnection(socket, manager.snapshot, lambda c: None)
+        manager.active_connections[socket] = conn
+        conn.resync()  # init 전에 접속 -> 빈 트리
+        await asyncio.sleep(0.05)
+
+        await app_module.load_file_tree()
+        await asyncio.sleep(0.05)
+        conn.close()
+        return socket.sent
+
+    sent = asyncio.run(run())
+    assert [m["seq"] for m in sent] == [0, 1]
+    assert sent[1]["tree"]["children"]
+
+def test_file_vector_running_sum_matches_recompute(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    monkeypatch.setattr(app_module, "client", FlatVectorStore())
+    rng = np.random.default_rng(0)
+
+    def chunk(i, path):
+        return app_module.ChunkData(
+            id=str(uuid.UUID(int=i)),
+            vector=rng.normal(size=384).tolist(),
+            payload={"path": path, "chunk_index": i, "text": f"chunk {i}"}
+        )
+
+    async def stored(path):
+        found = await app_module.get_client().retrieve(
+            "file_vectors", [app_module.file_vector_id(path)], with_payload=True, with_vectors=True
+        )
+        return found[0] if found else None
+
+    async def run():
+        await app_module.init_collections()
+        assert await app_module.is_done("backfill:file_vectors")
+
+        await app_module.upsert_chunks(app_module.ChunkBatch(points=[chunk(i, f"/d/{i % 2}") for i in range(6)]))
+        await app_module.upsert_chunk(chunk(0, "/d/0"))  # 같은 id 덮어쓰기
+        await app_module.delete_points([str(uuid.UUID(int=2))])
+
+        point = await stored("/d/0")
+        total, count = await app_module.rebuild_file_vector("/d/0")
+        expected = app_module.file_vector_point("/d/0", total, count)
+        assert point.payload["chunks"] == count == 2
+        assert np.allclose(point.vector, expected.vector, atol=1e-5)
+        assert np.allclose(point.payload["sum"], total)
+
+        await app_module.delete_points([str(uuid.UUID(int=i)) for i in (1, 3, 5)])
+        assert await stored("/d/1") is None
+        assert (await app_module.refresh_file_vector(app_module.PathData(path="/d/0")))["chunks"] == 2
+
+    asyncio.run(run())
+
+def test_file_vector_counts_stay_exact_under_concurrent_writes(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    monkeypatch.setattr(app_module, "client", FlatVectorStore())
+
+    def chunk(i):
+        return app_module.ChunkData(
+            id=str(uuid.UUID(int=i)),
+            vector=[float(i + 1)] + [0.0] * 383,
+            payload={"path": "/d/a", "chunk_index": i, "text": f"chunk {i}"}
+        )
+
+    async def stored_count():
+        found = await app_module.get_client().retrieve("file_vectors", [app_module.file_vector_id("/d/a")])
+        return found[0].payload["chunks"] if found else 0
+
+    async def run():
+        await app_module.init_collections()
+        # 같은 chunk를 동시에 올리고 지워도 한 번씩만 셈
+        await asyncio.gather(*(app_module.upsert_chunk(chunk(i % 3)) for i in range(12)))
+        after_upserts = await stored_count()
+        await asyncio.gather(*(app_module.delete_points([str(uuid.UUID(int=0))]) for _ in range(4)))
+        after_deletes = await stored_count()
+
+        # 예전 /api/files/index 는 running sum을 덮어쓰지 않음
+        await app_module.index_file(app_module.FileData(path="/d/a", summary="s", embedding=[0.0] * 384, hash="h"))
+        assert await stored_count() == after_deletes
+
+        # 저장된 개수가 실제와 다르면 refresh 때 다시 계산
+        point = app_module.file_vector_point("/d/a", np.ones(384), 7)
+        await app_module.get_client().upsert("file_vectors", [point])
+        refreshed = await app_module.refresh_file_vector(app_module.PathData(path="/d/a"))
+        return after_upserts, after_deletes, refreshed["chunks"], await stored_count()
+
+    assert asyncio.run(run()) == (3, 2, 2, 2)
+
+def test_backfill_reruns_until_marked_done(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    store = FlatVectorStore()
+    monkeypatch.setattr(app_module, "client", store)
+    calls = []
+
+    async def crashing_backfill():
+        calls.append("crash")
+        raise RuntimeError("killed during backfill")
+
+    async def run():
+        monkeypatch.setattr(app_module, "backfill_file_vectors", crashing_backfill)
+        try:
+            await app_module.init_collections()
+        except RuntimeError:
+            pass
+        # 컬렉션은 이미 있지만 완료 표시가 없으니 다음 시작 때 다시 채움
+        assert await store.collection_exists("file_vectors")
+        assert not await app_module.is_done("backfill:file_vectors")
+
+        async def backfill():
+            calls.append("ok")
+        monkeypatch.setattr(app_module, "backfill_file_vectors", backfill)
+        await app_module.init_collections()
+        await app_module.init_collections()
+        return await app_module.is_done("backfill:file_vectors")
+
+    assert asyncio.run(run())
+    assert calls == ["crash", "ok"]
+
+def test_chunk_upsert_waits_for_init_and_keeps_sparse_vector(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    store = FlatVectorStore()
+    monkeypatch.setattr(app_module, "client", store)
+    monkeypatch.setattr(app_module, "hybrid_enabled", False)
+
+    async def run():
+        monkeypatch.setattr(app_module, "collections_ready", asyncio.Event())
+        data = app_module.ChunkData(
+            id=str(uuid.UUID(int=1)),
+            vector=[1.0] * 384,
+            payload={"path": "/d/a.txt", "chunk_index": 0, "text": "ERR_42"},
+            sparse=app_module.SparseData(indices=[3, 9], values=[1.0, 0.5])
+        )
+        early = asyncio.create_task(app_module.upsert_chunk(data))  # init 전에 들어온 요청
+        await asyncio.sleep(0.05)
+        assert not early.done()
+
+        await app_module.init_collections()
+        await early
+        found = await store.retrieve("files", [data.id], with_vectors=True)
+        return found[0].vector
+
+    vector = asyncio.run(run())
+    assert set(vector) == {"", app_module.SPARSE_VECTOR_NAME}
+
+def test_storage_options_only_migrate_when_enabled(monkeypatch, capsys):
+    from types import SimpleNamespace
+    from server.store import quantization_config
+    updates = []
+
+    class OldCollection:
+        async def get_collection(self, name):
+            params = SimpleNamespace(vectors=SimpleNamespace(on_disk=False), on_disk_payload=False)
+            return SimpleNamespace(config=SimpleNamespace(params=params, quantization_config=None))
+
+        async def update_collection(self, **kwargs):
+            updates.append(kwargs["collection_name"])
+            return True
+
+    monkeypatch.setattr(app_module, "client", OldCollection())
+    monkeypatch.setattr(app_module, "VECTORS_ON_DISK", True)
+    monkeypatch.setattr(app_module, "PAYLOAD_ON_DISK", True)
+    monkeypatch.setattr(app_module, "quantization_config", lambda: quantization_config("scalar"))
+
+    asyncio.run(app_module.apply_storage_options("files"))
+    assert updates == []
+    assert "quantization none -> scalar" in capsys.readouterr().out
+
+    monkeypatch.setattr(app_module, "STORAGE_MIGRATE", True)
+    asyncio.run(app_module.apply_storage_options("files"))
+    assert updates == ["files"]
+
+def test_history_endpoints_wait_for_init(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    store = FlatVectorStore()
+    monkeypatch.setattr(app_module, "client", store)
+
+    async def fake_encode(texts):
+        return [[1.0] * 384 for _ in texts]
+    monkeypatch.setattr(app_module, "encode_texts_async", fake_encode)
+
+    async def run():
+        monkeypatch.setattr(app_module, "collections_ready", asyncio.Event())
+        early = [
+            asyncio.create_task(app_module.save_diff(app_module.DiffPayload(path="/d/a", old_text="a", new_text="b"))),
+            asyncio.create_task(app_module.list_file_versions("/d/a")),
+            asyncio.create_task(app_module.get_changed_files()),
+        ]
+        await asyncio.sleep(0.05)
+        assert not any(t.done() for t in early)
+
+        await app_module.init_collections()
+        await asyncio.gather(*early)
+        return await app_module.get_diff("/d/a")
+
+    assert asyncio.run(run())["new_text"] == "b"
+
+def test_list_files_keeps_list_shape_unless_paged(monkeypatch):
+    from server.flat_store import FlatVectorStore
+    monkeypatch.setattr(app_module, "client", FlatVectorStore())
+
+    async def run():
+        await app_module.init_collections()
+        for i in range(5):
+            await app_module.update_latest(f"/d/{i}", {"version": 1, "version_timestamp": float(i)})
+        everything = await app_module.list_files()
+        first = await app_module.list_files(limit=3)
+        second = await app_module.list_files(cursor=first["next_cursor"])
+        return everything, first, second
+
+    everything, first, second = asyncio.run(run())
+    assert isinstance(everything, list) and len(everything) == 5
+    assert len(first["files"]) == 3 and second["next_cursor"] is None
+    assert sorted(f["path"] for f in first["files"] + second["files"]) == sorted(f["path"] for f in everything)
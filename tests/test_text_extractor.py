@@ -0,0 +1,19 @@
+from text_extractor import iter_plain, extract_code
+
+def test_iter_plain_caps_carry_without_whitespace(tmp_path):
+    path = tmp_path / "min.log"
+    path.write_text("x" * 100 + " tail")
+
+    parts = list(iter_plain(str(path), block_size=8, max_carry=32))
+
+    assert "".join(parts) == "x" * 100 + " tail"
+    assert max(len(p) for p in parts) <= 32 + 8
+
+def test_extract_code_matches_split_lines(tmp_path):
+    code = "import os\n" + "def f():\n    return 1\n" * 30
+    path = tmp_path / "a.py"
+    path.write_text(code)
+
+    lines = code.split("\n")
+    funcs = [l for l in lines if "def " in l or "function" in l]
+    assert extract_code(str(path)) == "\n".join(funcs + lines[:50])
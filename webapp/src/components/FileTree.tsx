@@ -1,30 +1,44 @@
 import {Tree} from "antd";
 import type {DataNode} from "antd/es/tree";
-import {useEffect, useRef, useState} from "react";
-import {applyFileChange} from "./tree.ts";
+import {useEffect, useMemo, useRef, useState} from "react";
+import {applyTreeDelta, type ServerTreeNode} from "./tree.ts";
 
 type Props = {
     onSelectFile: (path: string) => void;
 };
 
-function convertToTree(node: any): DataNode {
-    if (node.type === "file") {
-        return {
-            title: `${node.name} (${node.status})`,
-            key: node.path,
-            isLeaf: true,
-        };
-    }
+// applyTreeDelta는 바뀐 경로의 노드만 새 객체로 만듦 -> 그대로인 subtree는 변환 결과도 재사용
+const converted = new WeakMap<ServerTreeNode, DataNode>();
+
+function convertToTree(node: ServerTreeNode): DataNode {
+    const cached = converted.get(node);
+    if (cached) return cached;
 
-    return {
-        title: node.name,
-        key: node.name,
-        children: node.children?.map(convertToTree),
-    };
+    const result: DataNode =
+        node.type === "file"
+            ? {
+                  title: `${node.name} (${node.status})`,
+                  key: node.path ?? node.name,
+                  isLeaf: true,
+              }
+            : {
+                  title: node.name,
+                  key: node.name,
+                  children: node.children?.map((child) => convertToTree(child)),
+              };
+    converted.set(node, result);
+    return result;
 }
 
 export default function FileTree({ onSelectFile }: Props) {
-    const [treeData, setTreeData] = useState<DataNode[]>([]);
+    const [serverTree, setServerTree] = useState<ServerTreeNode | null>(null);
+    const seqRef = useRef<number>(0);
+    const resyncingRef = useRef<boolean>(false);
+
+    const treeData = useMemo<DataNode[]>(
+        () => serverTree?.children?.map((child) => convertToTree(child)) ?? [],
+        [serverTree]
+    );
 
     // useEffect(() => {
     //     fetchFileTree().then((data) => {
@@ -48,11 +62,24 @@ export default function FileTree({ onSelectFile }: Props) {
             const data = JSON.parse(e.data);
             if (data.type === "ping") return;
 
-            if (data.type === "file-changed") {
-                setTreeData((prev) => applyFileChange(prev, data));
-            }
             if (data.type === "tree") {
-                setTreeData(data.tree.children.map(convertToTree));
+                // 접속 시 / resync 응답으로 오는 전체 스냅샷
+                seqRef.current = data.seq ?? 0;
+                resyncingRef.current = false;
+                setServerTree(data.tree);
+            }
+            if (data.type === "tree-delta") {
+                if (data.seq <= seqRef.current) return; // 스냅샷에 이미 반영됨
+                if (data.seq !== seqRef.current + 1) {
+                    // 중간 delta가 빠짐 -> 전체 다시 받기
+                    if (!resyncingRef.current) {
+                        resyncingRef.current = true;
+                        ws.send(JSON.stringify({ type: "resync" }));
+                    }
+                    return;
+                }
+                seqRef.current = data.seq;
+                setServerTree((prev) => prev && applyTreeDelta(prev, data));
             }
         };
 
@@ -1,91 +1,60 @@
-export interface TreeNode {
+// 서버 /ws/file-tree 스냅샷/델타 형식 (server/main.py FileTreeIndex)
+export interface ServerTreeNode {
     name: string;
-    path: string;
-    type: "file" | "directory";
-    children?: TreeNode[];
+    type: "file" | "dir";
+    status?: string;
+    path?: string;
+    children?: ServerTreeNode[];
 }
 
-interface FileChangeEvent {
-    type: "file-changed";
-    action: "created" | "modified" | "deleted";
+export interface TreeDelta {
+    type: "tree-delta";
+    seq: number;
     path: string;
-    node?: TreeNode; // created일 때만
+    status: string;
 }
 
-const splitPath = (path: string) =>
-    path.replace(/^\/+/, "").split("/");
-
-const cloneNode = (node: TreeNode): TreeNode => ({
-    ...node,
-    children: node.children ? [...node.children] : undefined,
-});
+const splitServerPath = (path: string) =>
+    path.replace(/\\/g, "/").split("/");
 
-function applyRecursively(
-    nodes: TreeNode[],
+function upsertPath(
+    node: ServerTreeNode,
     segments: string[],
-    event: FileChangeEvent,
-    depth: number
-): TreeNode[] {
-    return nodes.map((node) => {
-        if (node.name !== segments[depth]) {
-            return node;
-        }
-
-        const cloned = cloneNode(node);
-
-        // 마지막 segment = 파일 자체
-        if (depth === segments.length - 1) {
-            if (event.action === "deleted") {
-                return null as any; // 나중에 filter
-            }
-
-            if (event.action === "modified") {
-                // 보통 트리 구조 변화 없음 → 그대로
-                return cloned;
-            }
-        }
-
-        // 중간 디렉토리
-        if (cloned.children) {
-            cloned.children = applyRecursively(
-                cloned.children,
-                segments,
-                event,
-                depth + 1
-            ).filter(Boolean);
-        }
-
-        return cloned;
-    })
-        .filter(Boolean)
-        .flatMap((node) => {
-            // created 처리: 부모 디렉토리에서 추가
-            if (
-                event.action === "created" &&
-                depth === segments.length - 2 &&
-                node.name === segments[depth]
-            ) {
-                if (!node.children) node.children = [];
-
-                const exists = node.children.some(
-                    (c) => c.name === segments[segments.length - 1]
-                );
-
-                if (!exists && event.node) {
-                    node.children.push(event.node);
-                }
-            }
-
-            return [node];
-        });
+    depth: number,
+    delta: TreeDelta
+): ServerTreeNode {
+    const name = segments[depth];
+    const children = node.children ? [...node.children] : [];
+    const idx = children.findIndex((c) => c.name === name);
+
+    if (depth === segments.length - 1) {
+        const leaf: ServerTreeNode = {
+            name,
+            type: "file",
+            status: delta.status,
+            path: delta.path,
+        };
+        if (idx >= 0) children[idx] = leaf;
+        else children.push(leaf);
+        return { ...node, children };
+    }
+
+    const existing = idx >= 0 ? children[idx] : undefined;
+    const dir: ServerTreeNode =
+        existing && existing.type === "dir"
+            ? existing
+            : { name, type: "dir", children: [] };
+    const updated = upsertPath(dir, segments, depth + 1, delta);
+
+    if (idx >= 0) children[idx] = updated;
+    else children.push(updated);
+    return { ...node, children };
 }
 
-
-export function applyFileChange(
-    tree: TreeNode[],
-    event: FileChangeEvent
-): TreeNode[] {
-    const segments = splitPath(event.path);
-
-    return applyRecursively(tree, segments, event, 0);
+// 변경된 경로만 복사 (O(depth))
+export function applyTreeDelta(
+    tree: ServerTreeNode,
+    delta: TreeDelta
+): ServerTreeNode {
+    return upsertPath(tree, splitServerPath(delta.path), 0, delta);
 }